@@ -1,49 +1,83 @@
+import argparse
 import subprocess
 import sys
-import time
 import os
+import json
 
-def main():
-    print("=========================================")
-    print("   NYC Congestion Pricing Audit Runner   ")
-    print("=========================================")
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PIPELINE_DIR = os.path.join(BASE_DIR, "pipeline")
+sys.path.insert(0, PIPELINE_DIR)
 
-    # 1. Run Data Ingestion (WebScraping)
-    print(f"\n[1/5] Running Data Ingestion (WebScraping)...")
-    try:
-        subprocess.run([sys.executable, os.path.join("pipeline", "WebScraping.py")], check=True)
-    except subprocess.CalledProcessError:
-        print("Error encountered in WebScraping.py. Stopping.")
-        return
+from stages import STAGES_NAME, Stage, StageRunner
 
-    # 2. Run Pipeline
-    print(f"\n[2/5] Running ETL Pipeline...")
-    try:
-        subprocess.run([sys.executable, os.path.join("pipeline", "pipeline.py")], check=True)
-    except subprocess.CalledProcessError:
-        print("Error encountered in pipeline.py. Stopping.")
-        return
+METRICS_FILE = os.path.join(BASE_DIR, "output", "app_metrics.json")
+STATE_FILE = os.path.join(BASE_DIR, "cache", STAGES_NAME)
 
-    # 3. Generate Report
-    print(f"\n[3/5] Generating PDF Report...")
-    try:
-        subprocess.run([sys.executable, os.path.join("pipeline", "generate_report.py")], check=True)
-    except subprocess.CalledProcessError:
-        print("Error encountered in generate_report.py. Stopping.")
-        return
+RAW_TRIPS = "data_downloads/20*/*/*.parquet"
+# Modules whose code changes the ETL outputs
+ETL_CODE = tuple(f"pipeline/{name}.py" for name in (
+    "pipeline", "catalog", "compaction", "dataset", "ghost_rules", "imputation",
+    "incremental", "selection", "trip_cube", "trip_schema", "zones",
+))
+
+# Downloads always run (conditional requests: only the TLC knows what changed);
+# everything else is skipped while its inputs are unchanged. The ETL also
+# downloads the months it needs, so after a TLC republication use --force etl.
+STAGES = [
+    Stage("download", "WebScraping:download_all", always=True),
+    Stage("unify", "WebScraping:unify_all",
+          inputs=(RAW_TRIPS, "pipeline/WebScraping.py", "pipeline/trip_schema.py"),
+          outputs=("data_downloads/unified",), after=("download",), exclusive=True),
+    Stage("etl", "pipeline:main", args=((),),
+          inputs=(RAW_TRIPS, "data_downloads/taxi_zone_lookup.csv", *ETL_CODE),
+          outputs=("output/ghost_trip_audit.parquet", "output/impact_stats.json"),
+          after=("download",), env=("AUDIT_",), exclusive=True),
+    Stage("report", "generate_report:generate_pdf",
+          inputs=("output/impact_stats.json", "output/ghost_trip_audit.parquet", "output/elasticity.txt",
+                  "pipeline/generate_report.py", "pipeline/ghost_rules.py"),
+          outputs=("output/audit_report.pdf",), after=("etl",)),
+    Stage("blogs", "generate_blogs:generate_blog_files",
+          inputs=("pipeline/generate_blogs.py",),
+          outputs=("output/medium_article.md", "output/linkedin_post.md", "output/twitter_thread.md",
+                   "output/linkedin_carousel.json", "output/BLOG_README.md")),
+]
+
+def save_step_timings(steps):
+    # Per-phase/per-query detail for the ETL step is in output/run_metrics.json
+    os.makedirs(os.path.dirname(METRICS_FILE), exist_ok=True)
+    with open(METRICS_FILE, "w") as f:
+        json.dump({"steps": steps}, f, indent=2)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Runs the audit stages that are out of date, then the dashboard.")
+    parser.add_argument("--jobs", type=int, default=2, help="Independent stages run side by side (default 2).")
+    parser.add_argument("--force", nargs="+", default=[], choices=[s.name for s in STAGES] + ["all"],
+                        help="Run these stages even if their inputs are unchanged.")
+    parser.add_argument("--no-dashboard", action="store_true", help="Stop after the stages.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    print("=========================================")
+    print("   NYC Congestion Pricing Audit Runner   ")
+    print("=========================================")
 
-    # 4. Generate Blogs
-    print(f"\n[4/5] Generating Blog Content...")
+    runner = StageRunner(STAGES, BASE_DIR, STATE_FILE, jobs=args.jobs, force=args.force)
     try:
-        subprocess.run([sys.executable, os.path.join("pipeline", "generate_blogs.py")], check=True)
-    except subprocess.CalledProcessError:
-        print("Error encountered in generate_blogs.py. Stopping.")
-        return
+        ok = runner.run()
+    finally:
+        save_step_timings(runner.results)
+    if not ok:
+        failed = [r["step"] for r in runner.results if r["status"] in ("error", "blocked")]
+        print(f"\nStages failed or blocked: {', '.join(failed)}. Stopping.")
+        return 1
+    if args.no_dashboard:
+        return 0
 
-    # 5. Launch Dashboard
-    print(f"\n[5/5] Launching Streamlit Dashboard...")
+    # Launch Dashboard
+    print(f"\nLaunching Streamlit Dashboard...")
     print("Press Ctrl+C to stop the dashboard server.")
-    dashboard_path = os.path.join("pipeline", "dashboard.py")
+    dashboard_path = os.path.join(PIPELINE_DIR, "dashboard.py")
     try:
         # Use python -m streamlit to ensure we use the correct environment
         subprocess.run([sys.executable, "-m", "streamlit", "run", dashboard_path], check=True)
@@ -51,6 +85,7 @@ def main():
         print("\nDashboard stopped by user.")
     except Exception as e:
         print(f"Error launching dashboard: {e}")
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
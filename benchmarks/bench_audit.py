@@ -0,0 +1,103 @@
+"""
+Benchmark: Ghost-Trip Audit, Legacy vs Single-Pass
+==================================================
+Times the original three-query audit (flag -> CSV, COUNT(*) over the CSV,
+vendor top-5 over the CSV again) against pipeline.run_ghost_trip_audit on the
+same data, and checks both flag the same trips under the three original rules.
+
+Usage:
+    python benchmarks/bench_audit.py --data-dir data_downloads
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PIPELINE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pipeline")
+sys.path.insert(0, PIPELINE_DIR)
+
+import pipeline  # noqa: E402
+from ghost_rules import (  # noqa: E402
+    GHOST_I_STATIONARY_DIST, GHOST_I_TELEPORTER_FARE, GHOST_I_TELEPORTER_TIME, GHOST_SPEED_LIMIT, active_rules,
+)
+
+LEGACY_RULES = ("Impossible Physics", "Teleporter", "Stationary Ride")
+
+
+def legacy_audit(conn, audit_file):
+    """The audit as it was before the single-pass rewrite."""
+    conn.execute(f"""
+    COPY (
+        SELECT
+            *,
+            date_diff('minute', pickup_time, dropoff_time) as duration_min,
+            CASE
+                WHEN date_diff('minute', pickup_time, dropoff_time) <= 0 THEN 0
+                ELSE (trip_distance / (date_diff('minute', pickup_time, dropoff_time) / 60.0))
+            END as speed_mph,
+            CASE
+                WHEN (trip_distance / (GREATEST(date_diff('minute', pickup_time, dropoff_time), 0.1) / 60.0)) > {GHOST_SPEED_LIMIT} THEN 'Impossible Physics'
+                WHEN date_diff('minute', pickup_time, dropoff_time) < {GHOST_I_TELEPORTER_TIME} AND fare > {GHOST_I_TELEPORTER_FARE} THEN 'Teleporter'
+                WHEN trip_distance = {GHOST_I_STATIONARY_DIST} AND fare > 0 THEN 'Stationary Ride'
+                ELSE 'OK'
+            END as fraud_flag
+        FROM all_trips_2025
+        WHERE
+            (trip_distance / (GREATEST(date_diff('minute', pickup_time, dropoff_time), 0.1) / 60.0)) > {GHOST_SPEED_LIMIT}
+            OR (date_diff('minute', pickup_time, dropoff_time) < {GHOST_I_TELEPORTER_TIME} AND fare > {GHOST_I_TELEPORTER_FARE})
+            OR (trip_distance = {GHOST_I_STATIONARY_DIST} AND fare > 0)
+    ) TO '{audit_file}' (HEADER, FORMAT CSV)
+    """)
+    count = conn.execute(f"SELECT COUNT(*) FROM '{audit_file}'").fetchone()[0]
+    vendors = conn.execute(f"""
+    SELECT VendorID, COUNT(*) as ghost_count
+    FROM '{audit_file}'
+    GROUP BY VendorID
+    ORDER BY ghost_count DESC
+    LIMIT 5
+    """).fetchall()
+    return count, vendors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=str(pipeline.DATA_DIR))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pipeline.DATA_DIR = Path(args.data_dir)
+    with tempfile.TemporaryDirectory(prefix="bench_audit_") as out_dir:
+        pipeline.OUTPUT_DIR = Path(out_dir)
+        conn = pipeline.get_duckdb_conn()
+        pipeline.create_trips_view(conn)
+        rows = conn.execute("SELECT COUNT(*) FROM all_trips_2025").fetchone()[0]
+
+        timings = {"legacy": [], "single-pass": []}
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            legacy_count, _ = legacy_audit(conn, f"{out_dir}/legacy_audit.csv")
+            timings["legacy"].append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            pipeline.run_ghost_trip_audit(conn)
+            timings["single-pass"].append(time.perf_counter() - t0)
+
+        # Compare on the three original rules only; newer rules flag extra trips.
+        legacy_bits = sum(bit for bit, rule in active_rules() if rule.name in LEGACY_RULES)
+        count = conn.execute(f"SELECT COUNT(*) FROM ghost_trips WHERE rule_mask & {legacy_bits} <> 0").fetchone()[0]
+        conn.close()
+
+    print(f"\nGhost-trip audit benchmark ({rows:,} trips, best of {args.repeat})")
+    best = {k: min(v) for k, v in timings.items()}
+    for name, seconds in best.items():
+        print(f"  {name:<12} {seconds:8.3f} s  ({rows / seconds:,.0f} rows/s)")
+    print(f"  speed-up     {best['legacy'] / best['single-pass']:8.2f}x")
+    print(f"  flagged      legacy={legacy_count:,}  single-pass={count:,}  "
+          f"{'MATCH' if legacy_count == count else 'MISMATCH'}")
+
+
+if __name__ == "__main__":
+    main()
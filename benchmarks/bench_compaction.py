@@ -0,0 +1,173 @@
+"""
+Benchmark: Leakage Query on Raw vs Time-Sorted Compacted Files
+===============================================================
+Compacts the 2025 months (compaction.py) into a temporary directory, once
+sorted by pickup time and once clustered by pickup day and zone, then runs
+the pipeline's leakage filter (pickup_time >= start date, in_cbd() pickup
+outside / drop-off inside the zone) over the raw files and over each
+compacted copy. Reports wall time, how many row groups two filters can
+skip from their footer min/max statistics - the leakage date filter and a
+single pickup zone (--zone, JFK by default) - and that all three return the
+same rows.
+
+Pruning only shows once a month spans many row groups, so by default the
+row-group size is derived from the data (about ROW_GROUPS_PER_MONTH per
+month, never below DuckDB's 2,048-row vector) and, without --data-dir, a
+synthetic Q1 (synthetic_tlc.py, --rows trips) is generated to run on.
+Exits 1 when the layouts return different rows, when sorting skips no more
+row groups by date than the raw files, or when zone clustering skips no
+more row groups by zone than either other layout.
+
+Usage:
+    python benchmarks/bench_compaction.py
+    python benchmarks/bench_compaction.py --data-dir data_downloads --row-group-size 100000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PIPELINE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pipeline")
+sys.path.insert(0, PIPELINE_DIR)
+
+import duckdb  # noqa: E402
+import pyarrow.parquet as pq  # noqa: E402
+from compaction import compact_shards  # noqa: E402
+from dataset import resolve_shards, shard_source_sql  # noqa: E402
+from incremental import Watermarks  # noqa: E402
+from zones import load_zones  # noqa: E402
+
+START_DATE = '2025-01-05'
+ROW_GROUPS_PER_MONTH = 124  # ~4 per day, so a day-then-zone clustering splits each day's zones
+MIN_ROW_GROUP_ROWS = 2048   # DuckDB writes at least one vector per row group
+DEFAULT_ZONE = 132          # JFK Airport
+SYNTHETIC_MONTHS = [1, 2, 3]
+
+
+def leakage_query(source):
+    return f"""
+    SELECT
+        pickup_loc,
+        COUNT(*) as total_trips,
+        SUM(CASE WHEN congestion_surcharge > 0 THEN 1 ELSE 0 END) as compliant_trips
+    FROM ({source})
+    WHERE pickup_time >= '{START_DATE}'
+      AND NOT in_cbd(pickup_loc)
+      AND in_cbd(dropoff_loc)
+    GROUP BY pickup_loc
+    ORDER BY pickup_loc
+    """
+
+
+def skippable_row_groups(shards, column, skippable):
+    """(row groups whose footer (min, max) of `column` satisfy `skippable`, total row groups)."""
+    skipped = total = 0
+    for shard in shards:
+        meta = pq.read_metadata(shard.path)
+        index = meta.schema.names.index(column)
+        for i in range(meta.num_row_groups):
+            stats = meta.row_group(i).column(index).statistics
+            total += 1
+            if stats is not None and stats.has_min_max and skippable(stats.min, stats.max):
+                skipped += 1
+    return skipped, total
+
+
+def pruning(shards, time_col, zone_col, zone):
+    """{'date': (skipped, total), 'zone': (skipped, total)} for the leakage date filter and pickup_loc = zone."""
+    date = zone_skip = (0, 0)
+    for shard in shards:
+        date = tuple(map(sum, zip(date, skippable_row_groups(
+            [shard], time_col(shard), lambda lo, hi: str(hi) < START_DATE))))
+        zone_skip = tuple(map(sum, zip(zone_skip, skippable_row_groups(
+            [shard], zone_col(shard), lambda lo, hi: not lo <= zone <= hi))))
+    return {"date": date, "zone": zone_skip}
+
+
+def auto_row_group_size(shards):
+    largest = max(pq.read_metadata(s.path).num_rows for s in shards)
+    return max(MIN_ROW_GROUP_ROWS, largest // ROW_GROUPS_PER_MONTH)
+
+
+def union_sql(conn, shards):
+    return "\nUNION ALL\n".join(shard_source_sql(conn, s) for s in shards)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", help="TLC files to compact (default: a generated synthetic Q1).")
+    parser.add_argument("--rows", type=int, default=3_000_000, help="Synthetic trips to generate without --data-dir.")
+    parser.add_argument("--year", type=int, default=2025)
+    parser.add_argument("--row-group-size", type=int, default=0,
+                        help=f"Rows per compacted row group (default: ~{ROW_GROUPS_PER_MONTH} per month).")
+    parser.add_argument("--zone", type=int, default=DEFAULT_ZONE, help="Pickup zone for the zone-pruning count.")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    conn = duckdb.connect()
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench_compaction_") as tmp:
+        data_dir = args.data_dir
+        if data_dir is None:
+            import synthetic_tlc
+            data_dir = Path(tmp) / "data"
+            print(f"Generating {args.rows:,} synthetic trips in {data_dir}...")
+            synthetic_tlc.generate(data_dir, args.rows, {args.year: SYNTHETIC_MONTHS})
+        raw = resolve_shards(data_dir, [args.year], ["yellow", "green"])
+        if not raw:
+            sys.exit(f"No {args.year} files under {data_dir}")
+        load_zones(conn, Path(data_dir) / "taxi_zone_lookup.csv")
+        row_group_size = args.row_group_size or auto_row_group_size(raw)
+
+        sources = {"raw": union_sql(conn, raw)}
+        pickup_col = {"yellow": "tpep_pickup_datetime", "green": "lpep_pickup_datetime"}
+        row_groups = {"raw": pruning(raw, lambda s: pickup_col[s.taxi], lambda s: "PULocationID", args.zone)}
+        for name, cluster in (("sorted", False), ("zone-clustered", True)):
+            out_dir = Path(tmp) / name
+            t0 = time.perf_counter()
+            compact_shards(conn, raw, shard_source_sql, out_dir, Watermarks(out_dir / "wm.json"),
+                           row_group_size, cluster_by_zone=cluster)
+            print(f"  compacted ({name}) in {time.perf_counter() - t0:.2f} s")
+            compacted = resolve_shards(out_dir, [args.year], ["yellow", "green"], layout="hive")
+            sources[name] = union_sql(conn, compacted)
+            row_groups[name] = pruning(compacted, lambda s: "pickup_time", lambda s: "pickup_loc", args.zone)
+
+        for name, source in sources.items():
+            timings = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                rows = conn.execute(leakage_query(source)).fetchall()
+                timings.append(time.perf_counter() - t0)
+            results[name] = (min(timings), rows)
+    conn.close()
+
+    print(f"\nLeakage query, {args.year} ({len(raw)} monthly files, best of {args.repeat}, "
+          f"{row_group_size:,}-row compacted row groups)")
+    print(f"  {'layout':<15} {'seconds':>8}  row groups skippable by date / by zone {args.zone}")
+    base_rows = results["raw"][1]
+    failures = []
+    for name, (seconds, rows) in results.items():
+        (date_skipped, total), (zone_skipped, _) = row_groups[name]["date"], row_groups[name]["zone"]
+        print(f"  {name:<15} {seconds:8.3f}  {date_skipped:>6} / {zone_skipped:>6} of {total:<6} "
+              f"{'MATCH' if rows == base_rows else 'MISMATCH'}")
+        if rows != base_rows:
+            failures.append(f"{name} returns different rows than raw")
+
+    skipped = {name: {f: counts[f][0] for f in counts} for name, counts in row_groups.items()}
+    if skipped["sorted"]["date"] <= skipped["raw"]["date"]:
+        failures.append("sorting skips no more row groups by date than the raw files")
+    for other in ("raw", "sorted"):
+        if skipped["zone-clustered"]["zone"] <= skipped[other]["zone"]:
+            failures.append(f"zone clustering skips no more row groups by zone than {other}")
+    if failures:
+        print(f"\n{len(failures)} problem(s):")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
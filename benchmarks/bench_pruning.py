@@ -0,0 +1,113 @@
+"""
+Benchmark: Whole-Year Globs vs Month-Pruned File Lists
+======================================================
+Runs the Q1 volume, velocity and border-effect scans over the raw TLC files
+twice: over a whole-year glob filtered with `month(t) IN (1, 2, 3)` (as the
+pipeline used to), and over the Q1 file list (Q1_SOURCE_MONTHS) from
+dataset.resolve_shards.
+Reports files opened, bytes read (DuckDB's total_bytes_read profiling metric)
+and wall time for each.
+
+Usage:
+    python benchmarks/bench_pruning.py --data-dir data_downloads
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+PIPELINE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pipeline")
+sys.path.insert(0, PIPELINE_DIR)
+
+import duckdb  # noqa: E402
+from dataset import Q1_SOURCE_MONTHS, files_sql, resolve_shards  # noqa: E402
+from zones import CONGESTION_ZONE_IDS  # noqa: E402
+
+YEARS = (2024, 2025)
+
+
+def queries(source_for):
+    """The three Q1 scans; source_for(year, taxi) returns a read_parquet(...) call."""
+    zones = ', '.join(map(str, CONGESTION_ZONE_IDS))
+    speed = ("(trip_distance / (GREATEST(date_diff('minute', tpep_pickup_datetime, "
+             "tpep_dropoff_datetime), 1) / 60.0))")
+    out = {}
+    for year in YEARS:
+        out[f"q1_volume_{year}"] = f"""
+        SELECT COUNT(*) FROM (
+            SELECT tpep_dropoff_datetime as t, DOLocationID as loc FROM {source_for(year, 'yellow')}
+            UNION ALL
+            SELECT lpep_dropoff_datetime as t, DOLocationID as loc FROM {source_for(year, 'green')}
+        )
+        WHERE month(t) IN (1, 2, 3) AND t >= '{year}-01-01' AND t < '{year}-04-01' AND loc IN ({zones})
+        """
+        out[f"velocity_{year}"] = f"""
+        SELECT dayofweek(tpep_pickup_datetime), hour(tpep_pickup_datetime), AVG({speed})
+        FROM {source_for(year, 'yellow')}
+        WHERE month(tpep_pickup_datetime) IN (1, 2, 3) AND DOLocationID IN ({zones})
+          AND date_diff('minute', tpep_pickup_datetime, tpep_dropoff_datetime) > 1
+          AND trip_distance > 0.1 AND {speed} < 100
+        GROUP BY 1, 2
+        """
+        out[f"border_{year}"] = f"""
+        SELECT DOLocationID, COUNT(*) FROM {source_for(year, 'yellow')}
+        WHERE month(tpep_dropoff_datetime) IN (1, 2, 3)
+        GROUP BY 1
+        """
+    return out
+
+
+def profiled(conn, sql, profile_file):
+    conn.execute(f"PRAGMA profiling_output='{profile_file}'")
+    t0 = time.perf_counter()
+    conn.execute(sql).fetchall()
+    seconds = time.perf_counter() - t0
+    with open(profile_file) as f:
+        return json.load(f).get("total_bytes_read", 0), seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=os.path.join(os.path.dirname(PIPELINE_DIR), "data_downloads"))
+    args = parser.parse_args()
+    data = args.data_dir.replace("\\", "/")
+
+    def whole_year(year, taxi):
+        return f"read_parquet('{data}/{year}/{taxi}/*.parquet', union_by_name=True)"
+
+    def pruned(year, taxi):
+        return f"read_parquet({files_sql(resolve_shards(data, [year], [taxi], Q1_SOURCE_MONTHS))}, union_by_name=True)"
+
+    files = {
+        "whole-year": len(resolve_shards(data, YEARS, ["yellow", "green"])),
+        "pruned": len(resolve_shards(data, YEARS, ["yellow", "green"], Q1_SOURCE_MONTHS)),
+    }
+
+    conn = duckdb.connect()
+    # Count every read from disk, not hits in DuckDB's cache of earlier reads
+    conn.execute("SET enable_external_file_cache=false")
+    conn.execute("PRAGMA enable_profiling='json'")
+    conn.execute("""SET custom_profiling_settings='{"TOTAL_BYTES_READ": "true"}'""")
+    totals = {}
+    with tempfile.TemporaryDirectory(prefix="bench_pruning_") as tmp:
+        profile_file = os.path.join(tmp, "profile.json").replace("\\", "/")
+        for mode, source_for in (("whole-year", whole_year), ("pruned", pruned)):
+            read, seconds = 0, 0.0
+            for sql in queries(source_for).values():
+                b, s = profiled(conn, sql, profile_file)
+                read, seconds = read + b, seconds + s
+            totals[mode] = (read, seconds)
+    conn.close()
+
+    print(f"\nQ1 scans (Q1 volume, velocity, border) for {', '.join(map(str, YEARS))}")
+    for mode, (read, seconds) in totals.items():
+        print(f"  {mode:<11} files={files[mode]:>3}  bytes read={read / 1e6:10.2f} MB  time={seconds:7.3f} s")
+    if totals["pruned"][0]:
+        print(f"  bytes read reduced {totals['whole-year'][0] / totals['pruned'][0]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
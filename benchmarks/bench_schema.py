@@ -0,0 +1,111 @@
+"""
+Benchmark: Legacy vs Canonical Trip Schema
+==========================================
+Unifies one full year of one taxi type twice - with the legacy wide schema
+(Int64 zones, Float64 amounts) and with the canonical narrow schema from
+trip_schema.py - and reports, for each:
+
+- on-disk bytes per row of the unified Parquet output,
+- in-memory bytes per row once the year is loaded,
+- scan time (full-year load + a typical aggregation),
+- peak RSS of the process doing the work.
+
+Each schema runs in its own subprocess so peak RSS figures are independent.
+
+Usage:
+    python benchmarks/bench_schema.py --year 2025 --taxi yellow
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+PIPELINE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pipeline")
+sys.path.insert(0, PIPELINE_DIR)
+
+
+def run_worker(schema_name, year, taxi, data_dir, out_dir):
+    import polars as pl
+    import WebScraping
+    from trip_schema import CANONICAL_SCHEMA, LEGACY_SCHEMA
+
+    schema = CANONICAL_SCHEMA if schema_name == "canonical" else LEGACY_SCHEMA
+    WebScraping.OUTPUT_DIR = data_dir
+    WebScraping.UNIFIED_DIR = out_dir
+
+    t0 = time.perf_counter()
+    WebScraping.process_and_unify(year, taxi, schema=schema)
+    unify_s = time.perf_counter() - t0
+
+    files = [
+        os.path.join(root, f)
+        for root, _, names in os.walk(out_dir)
+        for f in names if f.endswith(".parquet")
+    ]
+    disk_bytes = sum(os.path.getsize(f) for f in files)
+
+    t0 = time.perf_counter()
+    df = pl.scan_parquet(files).collect()
+    summary = df.group_by("pickup_loc").agg(
+        pl.len(), pl.col("fare").sum(), pl.col("congestion_surcharge").sum()
+    )
+    scan_s = time.perf_counter() - t0
+
+    rows = df.height
+    result = {
+        "schema": schema_name,
+        "rows": rows,
+        "disk_bytes_per_row": disk_bytes / rows if rows else 0,
+        "memory_bytes_per_row": df.estimated_size() / rows if rows else 0,
+        "unify_s": unify_s,
+        "scan_s": scan_s,
+        "groups": summary.height,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--year", type=int, default=2025)
+    parser.add_argument("--taxi", default="yellow", choices=["yellow", "green"])
+    parser.add_argument("--data-dir", default=os.path.join(os.path.dirname(PIPELINE_DIR), "data_downloads"))
+    parser.add_argument("--worker", choices=["legacy", "canonical"], help=argparse.SUPPRESS)
+    parser.add_argument("--out-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.year, args.taxi, args.data_dir, args.out_dir)
+        return
+
+    results = []
+    for schema_name in ("legacy", "canonical"):
+        with tempfile.TemporaryDirectory(prefix=f"bench_schema_{schema_name}_") as out_dir:
+            proc = subprocess.run(
+                [sys.executable, __file__, "--worker", schema_name, "--year", str(args.year),
+                 "--taxi", args.taxi, "--data-dir", args.data_dir, "--out-dir", out_dir],
+                check=True, capture_output=True, text=True,
+            )
+            results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    print(f"\nSchema benchmark: {args.year} {args.taxi} ({results[0]['rows']:,} rows)")
+    print(f"{'metric':<24}{'legacy':>14}{'canonical':>14}{'change':>10}")
+    for key, label in [
+        ("disk_bytes_per_row", "disk bytes/row"),
+        ("memory_bytes_per_row", "memory bytes/row"),
+        ("unify_s", "unify time (s)"),
+        ("scan_s", "scan time (s)"),
+        ("peak_rss_mb", "peak RSS (MB)"),
+    ]:
+        before, after = results[0][key], results[1][key]
+        change = (after - before) / before * 100 if before else 0
+        print(f"{label:<24}{before:>14.2f}{after:>14.2f}{change:>9.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark: Startup and Import Time
+==================================
+Times how long the entry points take to start, each in a fresh interpreter
+run with `python -X importtime`:
+
+    import pipeline       what every ETL/benchmark process pays first
+    import WebScraping    download-only and unify runs
+    import stages         app.py before its first stage
+    cli status            `python -m pipeline status`, end to end
+    cli help              `python -m pipeline -h`
+
+Reported per entry point: wall time (best of --repeat), total import time,
+and the slowest modules the entry point's imports pull in, so a new eager
+import of pandas, scipy or polars shows up by name. Also checks that
+importing the modules creates none of data_downloads/, output/ or cache/.
+Exits 1 when an entry point is slower than --budget seconds or an import
+has side effects.
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 5 --budget 0.5 --top 5
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+PIPELINE_DIR = os.path.join(REPO_DIR, "pipeline")
+
+ENTRY_POINTS = {
+    "import pipeline": ["-c", "import pipeline"],
+    "import WebScraping": ["-c", "import WebScraping"],
+    "import stages": ["-c", "import stages"],
+    "cli status": ["-m", "pipeline", "status"],
+    "cli help": ["-m", "pipeline", "-h"],
+}
+RUN_DIRS = ("data_downloads", "output", "cache")
+DEFAULT_BUDGET = 1.0
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_importtime(stderr):
+    """
+    From -X importtime output: the total import time (seconds) and
+    {module: cumulative seconds} for the modules the entry point's own
+    imports pulled in (pandas under pipeline, say).
+    """
+    modules, total = {}, 0.0
+    for line in stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if not match:
+            continue
+        cumulative = int(match.group(2)) / 1e6
+        depth = (len(match.group(3)) + 1) // 2
+        if depth == 1:
+            total += cumulative
+        elif depth == 2:
+            modules[match.group(4)] = max(cumulative, modules.get(match.group(4), 0.0))
+    return total, modules
+
+
+def measure(args, repeat):
+    """Best-of-`repeat` (wall s, import s, {module: s}) for one entry point."""
+    # `-c` snippets import the flat modules from pipeline/; `-m pipeline` runs from the repository
+    cwd = PIPELINE_DIR if args[0] == "-c" else REPO_DIR
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=cwd, capture_output=True, text=True)
+        wall = time.perf_counter() - t0
+        if proc.returncode != 0:
+            raise RuntimeError(f"{' '.join(args)} failed (exit {proc.returncode}):\n{proc.stderr[-2000:]}")
+        total, modules = parse_importtime(proc.stderr)
+        if best is None or wall < best[0]:
+            best = (wall, total, modules)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per entry point; the fastest is kept.")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET,
+                        help="Wall-time budget per entry point in seconds (default 1.0).")
+    parser.add_argument("--top", type=int, default=3, help="Slowest imports listed per entry point.")
+    args = parser.parse_args()
+
+    existed = {name for name in RUN_DIRS if os.path.exists(os.path.join(REPO_DIR, name))}
+    failures = []
+    print(f"{'entry point':<20} {'wall s':>8} {'imports s':>10}   slowest imports")
+    for name, entry_args in ENTRY_POINTS.items():
+        wall, total, modules = measure(entry_args, args.repeat)
+        slowest = sorted(modules.items(), key=lambda m: m[1], reverse=True)[:args.top]
+        print(f"{name:<20} {wall:8.3f} {total:10.3f}   "
+              + ", ".join(f"{module} {seconds:.3f}" for module, seconds in slowest))
+        if wall > args.budget:
+            failures.append(f"{name}: {wall:.3f} s > {args.budget:.3f} s budget")
+
+    created = sorted(name for name in RUN_DIRS if os.path.exists(os.path.join(REPO_DIR, name)))
+    created = [name for name in created if name not in existed]
+    if created:
+        failures.append(f"importing created {', '.join(created)}/ (directories belong to the run path)")
+
+    if failures:
+        print(f"\n{len(failures)} problem(s):")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Parity Check: Trip Cube vs Full-Scan Phase 3/4 Queries
+======================================================
+Computes every Phase 3/4 output twice on the same data - with the original
+per-output SQL over the raw Parquet files, and with run_impact_analysis /
+fetch_weather_and_analyze, which derive them from the trip cube - then diffs
+the CSVs and impact_stats.json (floats to a relative 1e-6) and reports the
+time each side took.
+
+Exits non-zero on any mismatch.
+
+Usage:
+    python benchmarks/check_cube_parity.py --data-dir data_downloads
+"""
+
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PIPELINE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pipeline")
+sys.path.insert(0, PIPELINE_DIR)
+
+import pipeline  # noqa: E402
+from zones import CONGESTION_ZONE_IDS  # noqa: E402
+
+OUTPUTS = [
+    "leakage_analysis.csv", "velocity_2024.csv", "velocity_2025.csv",
+    "border_effect.csv", "daily_trips_2025.csv", "tips_economics.csv",
+]
+REL_TOL = 1e-6
+
+
+def legacy_outputs(conn, out_dir):
+    """The Phase 3/4 outputs as computed before the trip cube (one scan each)."""
+    p = pipeline
+    out = Path(out_dir).as_posix()
+    zones = ', '.join(map(str, CONGESTION_ZONE_IDS))
+    start_date = p.SURCHARGE_START_DATE
+    p.create_trips_view(conn)
+
+    def year_glob(year, taxi):
+        return f"'{p.DATA_DIR.as_posix()}/{year}/{taxi}/*.parquet'"
+
+    revenue = conn.execute(f"""
+        SELECT SUM(congestion_surcharge) FROM all_trips_2025
+        WHERE pickup_time >= '{start_date}'
+        AND (pickup_loc IN ({zones}) OR dropoff_loc IN ({zones}))
+    """).fetchone()[0] or 0.0
+
+    conn.execute(f"""
+    COPY (
+        SELECT
+            pickup_loc,
+            COUNT(*) as total_trips,
+            SUM(CASE WHEN congestion_surcharge > 0 THEN 1 ELSE 0 END) as compliant_trips,
+            CAST(SUM(CASE WHEN congestion_surcharge > 0 THEN 1 ELSE 0 END) AS FLOAT) / COUNT(*) as compliance_rate,
+            1.0 - (CAST(SUM(CASE WHEN congestion_surcharge > 0 THEN 1 ELSE 0 END) AS FLOAT) / COUNT(*)) as leakage_rate
+        FROM all_trips_2025
+        WHERE pickup_time >= '{start_date}'
+          AND pickup_loc NOT IN ({zones})
+          AND dropoff_loc IN ({zones})
+        GROUP BY pickup_loc
+        HAVING COUNT(*) > 100
+        ORDER BY leakage_rate DESC
+        LIMIT 20
+    ) TO '{out}/leakage_analysis.csv' (HEADER, FORMAT CSV)
+    """)
+
+    def q1_count(year):
+        return conn.execute(f"""
+        SELECT COUNT(*)
+        FROM (
+            SELECT tpep_dropoff_datetime as t, DOLocationID as loc FROM read_parquet({year_glob(year, 'yellow')}, union_by_name=True)
+            UNION ALL
+            SELECT lpep_dropoff_datetime as t, DOLocationID as loc FROM read_parquet({year_glob(year, 'green')}, union_by_name=True)
+        )
+        WHERE month(t) IN (1, 2, 3)
+          AND t >= '{year}-01-01' AND t < '{year}-04-01'
+          AND loc IN ({zones})
+        """).fetchone()[0]
+
+    q1_2024, q1_2025 = q1_count(2024), q1_count(2025)
+
+    for year in (2024, 2025):
+        conn.execute(f"""
+        COPY (
+            SELECT
+                dayofweek(tpep_pickup_datetime) as dow,
+                hour(tpep_pickup_datetime) as hour,
+                AVG(trip_distance / (GREATEST(date_diff('minute', tpep_pickup_datetime, tpep_dropoff_datetime), 1) / 60.0)) as avg_speed
+            FROM read_parquet({year_glob(year, 'yellow')}, union_by_name=True)
+            WHERE month(tpep_pickup_datetime) IN (1, 2, 3)
+              AND DOLocationID IN ({zones})
+              AND date_diff('minute', tpep_pickup_datetime, tpep_dropoff_datetime) > 1
+              AND trip_distance > 0.1
+              AND (trip_distance / (GREATEST(date_diff('minute', tpep_pickup_datetime, tpep_dropoff_datetime), 1) / 60.0)) < 100
+            GROUP BY 1, 2
+        ) TO '{out}/velocity_{year}.csv' (HEADER, FORMAT CSV)
+        """)
+
+    conn.execute(f"""
+    COPY (
+        WITH q1_2024 AS (
+            SELECT DOLocationID as loc, COUNT(*) as cnt
+            FROM read_parquet({year_glob(2024, 'yellow')}, union_by_name=True)
+            WHERE month(tpep_dropoff_datetime) IN (1,2,3)
+            GROUP BY 1
+        ),
+        q1_2025 AS (
+            SELECT DOLocationID as loc, COUNT(*) as cnt
+            FROM read_parquet({year_glob(2025, 'yellow')}, union_by_name=True)
+            WHERE month(tpep_dropoff_datetime) IN (1,2,3)
+            GROUP BY 1
+        )
+        SELECT
+            COALESCE(a.loc, b.loc) as location_id,
+            COALESCE(a.cnt, 0) as count_2024,
+            COALESCE(b.cnt, 0) as count_2025,
+            (COALESCE(b.cnt, 0) - COALESCE(a.cnt, 0)) as diff,
+            CASE WHEN COALESCE(a.cnt, 0) > 0
+                 THEN (COALESCE(b.cnt, 0) - COALESCE(a.cnt, 0)) * 100.0 / a.cnt
+                 ELSE 0 END as pct_change
+        FROM q1_2024 a
+        FULL OUTER JOIN q1_2025 b ON a.loc = b.loc
+    ) TO '{out}/border_effect.csv' (HEADER, FORMAT CSV)
+    """)
+
+    conn.execute(f"""
+    COPY (
+        SELECT CAST(pickup_time AS DATE) as date, COUNT(*) as trips
+        FROM all_trips_2025
+        GROUP BY 1
+        ORDER BY 1
+    ) TO '{out}/daily_trips_2025.csv' (HEADER, FORMAT CSV)
+    """)
+
+    conn.execute(f"""
+    COPY (
+        SELECT
+            month(pickup_time) as month,
+            AVG(congestion_surcharge) as avg_surcharge,
+            AVG(CASE WHEN fare > 0 THEN (total_amount - fare)/fare ELSE 0 END) * 100 as avg_tip_pct
+        FROM all_trips_2025
+        GROUP BY 1
+        ORDER BY 1
+    ) TO '{out}/tips_economics.csv' (HEADER, FORMAT CSV)
+    """)
+
+    return {"revenue_2025": revenue, "q1_2024_vol": q1_2024, "q1_2025_vol": q1_2025}
+
+
+def same_value(a, b):
+    if a == b:
+        return True
+    try:
+        return math.isclose(float(a), float(b), rel_tol=REL_TOL, abs_tol=1e-9)
+    except ValueError:
+        return False
+
+
+def read_rows(path, columns=None):
+    with open(path, newline="") as f:
+        rows = list(csv.reader(f))
+    header, rows = rows[0], rows[1:]
+    if columns is not None:
+        # Newer outputs append columns (e.g. zone names); compare the original ones
+        idx = [header.index(c) for c in columns if c in header]
+        header, rows = [header[i] for i in idx], [[r[i] for i in idx] for r in rows]
+    # Row order is only defined for ORDER BY outputs; compare as sorted sets
+    return header, sorted(rows)
+
+
+def compare_csv(name, legacy_dir, cube_dir):
+    legacy_header, legacy = read_rows(os.path.join(legacy_dir, name))
+    cube_header, cube = read_rows(os.path.join(cube_dir, name), legacy_header)
+    if legacy_header != cube_header:
+        return f"header {legacy_header} != {cube_header}"
+    if len(legacy) != len(cube):
+        return f"{len(legacy)} rows != {len(cube)} rows"
+    for a, b in zip(legacy, cube):
+        if not all(same_value(x, y) for x, y in zip(a, b)):
+            return f"row {a} != {b}"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=str(pipeline.DATA_DIR))
+    args = parser.parse_args()
+
+    pipeline.DATA_DIR = Path(args.data_dir)
+    with tempfile.TemporaryDirectory(prefix="cube_parity_") as tmp:
+        legacy_dir, cube_dir, cache_dir = (Path(tmp) / d for d in ("legacy", "cube", "cache"))
+        for d in (legacy_dir, cube_dir, cache_dir):
+            d.mkdir()
+        pipeline.CACHE_DIR = cache_dir
+        # Header-only weather file: Phase 4 skips the download and the regression
+        (cache_dir / "weather_2025.csv").write_text("date,precipitation\n")
+
+        conn = pipeline.get_duckdb_conn()
+        t0 = time.perf_counter()
+        legacy_stats = legacy_outputs(conn, legacy_dir)
+        legacy_s = time.perf_counter() - t0
+
+        pipeline.OUTPUT_DIR = cube_dir
+        t0 = time.perf_counter()
+        pipeline.refresh_trip_cube(conn)
+        build_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        pipeline.run_impact_analysis(conn, 0, [])
+        pipeline.fetch_weather_and_analyze(conn)
+        derive_s = time.perf_counter() - t0
+        conn.close()
+
+        failures = {}
+        for name in OUTPUTS:
+            error = compare_csv(name, legacy_dir, cube_dir)
+            if error:
+                failures[name] = error
+        with open(cube_dir / "impact_stats.json") as f:
+            cube_stats = json.load(f)
+        for key, value in legacy_stats.items():
+            if not same_value(value, cube_stats[key]):
+                failures[f"impact_stats.json:{key}"] = f"{value} != {cube_stats[key]}"
+
+    print("\nTrip cube parity check")
+    for name in OUTPUTS + [f"impact_stats.json:{k}" for k in legacy_stats]:
+        print(f"  {name:<36} {'MISMATCH: ' + failures[name] if name in failures else 'OK'}")
+    print(f"  full-scan queries  {legacy_s:8.3f} s")
+    print(f"  cube build         {build_s:8.3f} s  (once per changed month)")
+    print(f"  derive from cube   {derive_s:8.3f} s")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+Check: Downloader Against a Local HTTP Server
+=============================================
+Serves fixture Parquet files from a local `http.server` (ETag,
+Last-Modified, Range/If-Range, conditional GET) and points downloader.py
+at it through `base_url`, then checks, in order:
+
+    fresh          every file downloads and is recorded in the manifest
+    interrupted    a connection dropped mid-body leaves only `<name>.part`;
+                   the destination never exists half-written
+    resume         the next call sends `Range: bytes=<part size>-` with
+                   If-Range, gets a 206 and the file matches byte for byte
+    revalidate     an unchanged file costs one conditional GET answered 304
+                   and is not marked as changed
+    changed        a new ETag upstream is re-downloaded and marked changed
+    truncated      a file cut short on disk is fetched again in full, with
+                   and without a manifest entry for it
+
+Exits non-zero on any failed check.
+
+Usage:
+    python benchmarks/check_downloader.py
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+PIPELINE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pipeline")
+sys.path.insert(0, PIPELINE_DIR)
+
+import duckdb  # noqa: E402
+from downloader import PART_SUFFIX, download_file, download_many, make_session, tlc_jobs  # noqa: E402
+from manifest import Manifest  # noqa: E402
+
+FIXTURE_MONTHS = [(2025, 1, "yellow"), (2025, 1, "green"), (2025, 2, "yellow")]
+FIXTURE_ROWS = 50_000
+CHUNK_SIZE = 4096  # Small, so an interrupted body leaves a partial .part file
+LAST_MODIFIED = "Wed, 01 Jan 2025 00:00:00 GMT"
+
+
+# ============================================================================
+# FIXTURE SERVER
+# ============================================================================
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.respond(body=False)
+
+    def do_GET(self):
+        self.respond(body=True)
+
+    def respond(self, body):
+        server = self.server
+        name = self.path.rsplit("/", 1)[-1]
+        with server.lock:
+            server.log.append((self.command, name, dict(self.headers)))
+            fixture = server.files.get(name)
+            cut = server.cut_after.pop(name, None) if body else None
+        if fixture is None:
+            self.send_error(404)
+            return
+        data, etag = fixture
+
+        if self.command == "GET" and (self.headers.get("If-None-Match") == etag
+                                      or (self.headers.get("If-Modified-Since") == LAST_MODIFIED
+                                          and "If-None-Match" not in self.headers)):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range", etag) == etag:
+            start = int(range_header.split("=", 1)[1].split("-", 1)[0])
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+        self.send_response(206 if start else 200)
+        self.send_header("Content-Length", str(len(data) - start))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        self.send_header("Accept-Ranges", "bytes")
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+        self.end_headers()
+        if not body:
+            return
+        if cut is not None:
+            # Drop the connection mid-body, as a flaky network would
+            self.wfile.write(data[start:start + cut])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(data[start:])
+
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FixtureHandler)
+        self.lock = threading.Lock()
+        self.files = {}      # name -> (bytes, etag)
+        self.cut_after = {}  # name -> bytes sent before the next GET is dropped
+        self.log = []        # (method, name, request headers)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/trip-data"
+
+    def publish(self, name, data, version=1):
+        with self.lock:
+            self.files[name] = (data, f'"{name}-v{version}"')
+
+    def requests_for(self, name):
+        with self.lock:
+            return [(method, headers) for method, n, headers in self.log if n == name]
+
+    def clear_log(self):
+        with self.lock:
+            self.log.clear()
+
+
+def write_fixture(path, seed):
+    conn = duckdb.connect()
+    conn.execute(f"""
+        COPY (
+            SELECT range AS trip_id, hash(range + {seed}) % 1000 AS fare_cents
+            FROM range({FIXTURE_ROWS})
+        ) TO '{path.as_posix()}' (FORMAT PARQUET)
+    """)
+    conn.close()
+    return path.read_bytes()
+
+
+# ============================================================================
+# CHECKS
+# ============================================================================
+
+def main():
+    failures = []
+
+    def check(name, ok, detail=""):
+        print(f"  {name:<52} {'OK' if ok else 'FAILED ' + detail}")
+        if not ok:
+            failures.append(name)
+
+    tmp = Path(tempfile.mkdtemp(prefix="check_downloader_"))
+    server = FixtureServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    session = make_session(4)
+    try:
+        data_dir = tmp / "data_downloads"
+        jobs = tlc_jobs(FIXTURE_MONTHS, data_dir, base_url=server.base_url)
+        fixtures = {}
+        for i, (url, dest) in enumerate(jobs):
+            fixtures[dest.name] = write_fixture(tmp / f"fixture_{i}.parquet", seed=i)
+            server.publish(dest.name, fixtures[dest.name])
+        manifest = Manifest.for_data_dir(data_dir)
+
+        print("fresh")
+        results = download_many(jobs, workers=3, chunk_size=CHUNK_SIZE, session=session, manifest=manifest)
+        check("all files downloaded", all(results.values()))
+        check("content matches the server",
+              all(dest.read_bytes() == fixtures[dest.name] for _, dest in jobs))
+        check("no .part files left", not list(data_dir.rglob(f"*{PART_SUFFIX}")))
+        check("every file recorded in the manifest",
+              all(manifest.is_intact(dest) and manifest.fingerprint(dest) for _, dest in jobs))
+
+        url, dest = jobs[0]
+        part = dest.with_name(dest.name + PART_SUFFIX)
+        data = fixtures[dest.name]
+
+        print("interrupted")
+        dest.unlink()
+        manifest.forget(dest)
+        cut = len(data) // 2
+        server.cut_after[dest.name] = cut
+        ok = download_file(url, dest, session, CHUNK_SIZE, manifest=manifest)
+        check("download reports the failure", not ok)
+        check("destination never written half-way", not dest.exists())
+        part_size = part.stat().st_size if part.exists() else 0
+        check(".part keeps the bytes received", 0 < part_size <= cut, f"({part_size:,} of {cut:,} B)")
+
+        print("resume")
+        server.clear_log()
+        ok = download_file(url, dest, session, CHUNK_SIZE, manifest=manifest)
+        gets = [headers for method, headers in server.requests_for(dest.name) if method == "GET"]
+        check("resumed download succeeds", ok)
+        check("request continues from the .part size",
+              bool(gets) and gets[0].get("Range") == f"bytes={part_size}-", str(gets[:1]))
+        check("request is guarded by If-Range", bool(gets) and bool(gets[0].get("If-Range")))
+        check("file matches byte for byte", dest.exists() and dest.read_bytes() == data)
+        check(".part renamed into place", not part.exists())
+
+        print("revalidate")
+        manifest.changed.clear()
+        mtime = dest.stat().st_mtime_ns
+        server.clear_log()
+        ok = download_file(url, dest, session, CHUNK_SIZE, manifest=manifest)
+        requests_made = server.requests_for(dest.name)
+        check("revalidation succeeds", ok)
+        check("one conditional GET",
+              len(requests_made) == 1 and requests_made[0][1].get("If-None-Match") is not None,
+              str(requests_made))
+        check("file untouched after 304", dest.stat().st_mtime_ns == mtime)
+        check("not marked as changed", manifest.key(dest) not in manifest.changed)
+
+        print("changed")
+        new_data = write_fixture(tmp / "fixture_changed.parquet", seed=99)
+        server.publish(dest.name, new_data, version=2)
+        ok = download_file(url, dest, session, CHUNK_SIZE, manifest=manifest)
+        check("changed file re-downloaded", ok and dest.read_bytes() == new_data)
+        check("marked as changed", manifest.key(dest) in manifest.changed)
+
+        print("truncated")
+        for tracked in (True, False):
+            url, dest = jobs[1 if tracked else 2]
+            data = fixtures[dest.name]
+            if not tracked:
+                manifest.forget(dest)
+            with open(dest, "r+b") as f:
+                f.truncate(len(data) // 3)
+            server.clear_log()
+            ok = download_file(url, dest, session, CHUNK_SIZE, manifest=manifest)
+            gets = [headers for method, headers in server.requests_for(dest.name) if method == "GET"]
+            label = "with" if tracked else "without"
+            check(f"truncated file ({label} manifest entry) re-fetched",
+                  ok and dest.read_bytes() == data)
+            check(f"re-fetch ({label} manifest entry) is a full GET",
+                  len(gets) == 1 and "Range" not in gets[0], str(gets))
+        manifest.save()
+        check("manifest saved", Manifest.for_data_dir(data_dir).is_intact(jobs[0][1]))
+    finally:
+        session.close()
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"\n{len(failures)} check(s) failed." if failures else "\nAll downloader checks passed.")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
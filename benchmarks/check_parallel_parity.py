@@ -0,0 +1,120 @@
+"""
+Parity Check: Sequential vs Process-Pool Shard Builds
+=====================================================
+Runs Phases 2-4 twice on the same data, each with a fresh cache - once with
+every month built on the main connection (AUDIT_WORKERS=1), once with the
+months built in a process pool (--workers) - then diffs the audit Parquet
+file (row for row), every CSV and impact_stats.json, and reports the time
+each run took.
+
+Counts and integer-cents sums must match exactly. DOUBLE aggregates (speeds,
+tip ratios) are compared to a relative 1e-12: DuckDB sums floats in thread
+order, so they can differ in the last bit even between two sequential runs.
+
+Exits non-zero on any mismatch.
+
+Usage:
+    python benchmarks/check_parallel_parity.py --data-dir data_downloads --workers 4
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PIPELINE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pipeline")
+sys.path.insert(0, PIPELINE_DIR)
+
+import check_cube_parity  # noqa: E402
+import duckdb  # noqa: E402
+import pipeline  # noqa: E402
+from check_cube_parity import OUTPUTS, read_rows, same_value  # noqa: E402
+
+# Tighter than the cube check: both sides run the same SQL
+check_cube_parity.REL_TOL = 1e-12
+
+
+def run(workers, out_dir, cache_dir):
+    pipeline.SHARD_WORKERS = workers
+    pipeline.OUTPUT_DIR, pipeline.CACHE_DIR = out_dir, cache_dir
+    # Header-only weather file: Phase 4 skips the download and the regression
+    (cache_dir / "weather_2025.csv").write_text("date,precipitation\n")
+    conn = pipeline.get_duckdb_conn()
+    t0 = time.perf_counter()
+    count, vendors, rule_counts = pipeline.run_ghost_trip_audit(conn)
+    pipeline.run_impact_analysis(conn, count, vendors, rule_counts)
+    pipeline.fetch_weather_and_analyze(conn)
+    conn.close()
+    return time.perf_counter() - t0
+
+
+def compare_audit(seq_dir, par_dir):
+    a = (seq_dir / "ghost_trip_audit.parquet").as_posix()
+    b = (par_dir / "ghost_trip_audit.parquet").as_posix()
+    conn = duckdb.connect()
+    only_a = conn.execute(f"SELECT COUNT(*) FROM (FROM '{a}' EXCEPT ALL FROM '{b}')").fetchone()[0]
+    only_b = conn.execute(f"SELECT COUNT(*) FROM (FROM '{b}' EXCEPT ALL FROM '{a}')").fetchone()[0]
+    conn.close()
+    return f"{only_a} rows only in sequential, {only_b} only in parallel" if only_a or only_b else None
+
+
+def compare_csv(name, seq_dir, par_dir):
+    seq_header, seq = read_rows(seq_dir / name)
+    par_header, par = read_rows(par_dir / name)
+    if seq_header != par_header:
+        return f"header {seq_header} != {par_header}"
+    if len(seq) != len(par):
+        return f"{len(seq)} rows != {len(par)} rows"
+    for a, b in zip(seq, par):
+        if not all(same_value(x, y) for x, y in zip(a, b)):
+            return f"row {a} != {b}"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=str(pipeline.DATA_DIR))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    pipeline.DATA_DIR = Path(args.data_dir)
+    with tempfile.TemporaryDirectory(prefix="parallel_parity_") as tmp:
+        dirs = {}
+        for mode in ("sequential", "parallel"):
+            dirs[mode] = (Path(tmp) / mode / "output", Path(tmp) / mode / "cache")
+            for d in dirs[mode]:
+                d.mkdir(parents=True)
+        seq_s = run(1, *dirs["sequential"])
+        par_s = run(max(args.workers, 2), *dirs["parallel"])
+        seq_dir, par_dir = dirs["sequential"][0], dirs["parallel"][0]
+
+        failures = {}
+        error = compare_audit(seq_dir, par_dir)
+        if error:
+            failures["ghost_trip_audit.parquet"] = error
+        for name in OUTPUTS:
+            error = compare_csv(name, seq_dir, par_dir)
+            if error:
+                failures[name] = error
+        with open(seq_dir / "impact_stats.json") as f:
+            seq_stats = json.load(f)
+        with open(par_dir / "impact_stats.json") as f:
+            par_stats = json.load(f)
+        for key in sorted(seq_stats.keys() | par_stats.keys()):
+            if key not in seq_stats or key not in par_stats or not same_value(seq_stats[key], par_stats[key]):
+                failures[f"impact_stats.json:{key}"] = f"{seq_stats.get(key)} != {par_stats.get(key)}"
+
+    print(f"\nParallel parity check ({max(args.workers, 2)} workers)")
+    for name in ["ghost_trip_audit.parquet"] + OUTPUTS + ["impact_stats.json"]:
+        errors = [f"{k}: {v}" for k, v in failures.items() if k == name or k.startswith(name + ":")]
+        print(f"  {name:<28} {'MISMATCH: ' + '; '.join(errors) if errors else 'OK'}")
+    print(f"  sequential  {seq_s:8.3f} s")
+    print(f"  parallel    {par_s:8.3f} s")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Benchmark Suite: Every Phase at Several Data Scales
+===================================================
+Generates synthetic TLC datasets (synthetic_tlc.py) at each requested scale
+- Q1 2024 plus Jan-Nov 2025, the months the analysis reads - and times each
+pipeline phase on them from a cold cache:
+
+    unify    WebScraping.process_and_unify for 2025 (Polars, both taxi types)
+    audit    pipeline.run_ghost_trip_audit
+    impact   pipeline.run_impact_analysis (includes building the trip cube)
+    weather  pipeline.fetch_weather_and_analyze (cube already built)
+
+Each phase runs in its own process, so its peak RSS is its own. Reported per
+(scale, phase): wall time (best of --repeat), input rows, rows/s and peak
+RSS. Results are stored in benchmarks/results/<commit>.json (merged across
+runs of the same commit) and compared with a baseline: a phase regresses
+when its wall time or peak memory grows by more than --threshold.
+
+Datasets are kept in --work-dir and reused while their row count and seed
+match.
+
+Usage:
+    python benchmarks/run_benchmarks.py --scales 1M 10M
+    python benchmarks/run_benchmarks.py --scales 1M --save-baseline
+    python benchmarks/run_benchmarks.py --scales 1M --baseline 1a2b3c4 --threshold 0.15
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+PIPELINE_DIR = os.path.join(REPO_DIR, "pipeline")
+sys.path.insert(0, PIPELINE_DIR)
+
+RESULTS_DIR = Path(BENCH_DIR) / "results"
+BASELINE_NAME = "baseline.json"
+PHASES = ("unify", "audit", "impact", "weather")
+BENCH_MONTHS = {2024: [1, 2, 3], 2025: list(range(1, 12))}
+RESULT_MARKER = "BENCH_RESULT "
+DEFAULT_THRESHOLD = 0.10
+
+
+def parse_scale(text):
+    """'1M' -> 1_000_000, '500k' -> 500_000, '100M' -> 100_000_000."""
+    text = text.strip().upper()
+    scale = {"K": 10**3, "M": 10**6, "B": 10**9}.get(text[-1])
+    return int(float(text[:-1]) * scale) if scale else int(text)
+
+
+def git_commit():
+    """(short commit hash, working tree dirty?) or ('unknown', False) outside git."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        return commit, bool(status)
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+def ensure_dataset(work_dir, label, rows, seed):
+    """Generates (or reuses) the synthetic dataset for one scale; returns its directory."""
+    import synthetic_tlc
+    data_dir = Path(work_dir) / f"data_{label}"
+    truth_file = data_dir / synthetic_tlc.TRUTH_NAME
+    if truth_file.exists():
+        with open(truth_file) as f:
+            truth = json.load(f)
+        if truth.get("total_rows") == rows and truth.get("seed") == seed:
+            return data_dir
+        shutil.rmtree(data_dir)
+    print(f"Generating {label} dataset ({rows:,} rows) in {data_dir}...")
+    t0 = time.perf_counter()
+    synthetic_tlc.generate(data_dir, rows, BENCH_MONTHS, seed=seed)
+    print(f"  generated in {time.perf_counter() - t0:.1f} s")
+    return data_dir
+
+
+# ============================================================================
+# PHASE WORKER (runs in a child process)
+# ============================================================================
+
+def _parquet_rows(paths):
+    import pyarrow.parquet as pq
+    return sum(pq.read_metadata(p).num_rows for p in paths)
+
+
+def run_phase(phase, data_dir, scratch):
+    """Runs one phase from a cold cache; returns (seconds, input rows)."""
+    scratch = Path(scratch)
+    if phase == "unify":
+        import WebScraping
+        WebScraping.OUTPUT_DIR = str(data_dir)
+        WebScraping.UNIFIED_DIR = str(scratch / "unified")
+        rows = _parquet_rows(sorted(Path(data_dir).glob("2025/*/*.parquet")))
+        t0 = time.perf_counter()
+        for taxi in WebScraping.TAXI_TYPES:
+            WebScraping.process_and_unify(2025, taxi)
+        return time.perf_counter() - t0, rows
+
+    import pipeline
+    pipeline.DATA_DIR = Path(data_dir)
+    pipeline.OUTPUT_DIR, pipeline.CACHE_DIR = scratch / "output", scratch / "cache"
+    pipeline.OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    pipeline.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # Header-only weather file: Phase 4 never goes to the network
+    (pipeline.CACHE_DIR / "weather_2025.csv").write_text("date,precipitation\n")
+    conn = pipeline.get_duckdb_conn()
+    try:
+        if phase == "audit":
+            rows = _parquet_rows(s.path for s in pipeline.get_shards([2025]))
+            t0 = time.perf_counter()
+            pipeline.run_ghost_trip_audit(conn)
+        else:
+            shards = pipeline.get_shards(pipeline.ANALYSIS_YEARS, months=pipeline.ANALYSIS_MONTHS)
+            rows = _parquet_rows(s.path for s in shards)
+            if phase == "weather":
+                pipeline.refresh_trip_cube(conn)
+                t0 = time.perf_counter()
+                pipeline.fetch_weather_and_analyze(conn)
+            else:
+                t0 = time.perf_counter()
+                pipeline.run_impact_analysis(conn, 0, [])
+        return time.perf_counter() - t0, rows
+    finally:
+        conn.close()
+
+
+def phase_worker(phase, data_dir, scratch):
+    from metrics import peak_rss_bytes
+    seconds, rows = run_phase(phase, data_dir, scratch)
+    print(RESULT_MARKER + json.dumps({"wall_s": seconds, "rows": rows, "peak_rss_bytes": peak_rss_bytes()}))
+
+
+# ============================================================================
+# DRIVER
+# ============================================================================
+
+def measure(phase, data_dir, repeat, verbose=False):
+    """Best-of-`repeat` result for one phase, each run in a fresh process and scratch dir."""
+    best = None
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory(prefix=f"bench_{phase}_") as scratch:
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--phase-worker", phase,
+                 "--data-dir", str(data_dir), "--scratch", scratch],
+                capture_output=True, text=True, cwd=scratch,
+            )
+        if verbose or proc.returncode != 0:
+            print(proc.stdout[-4000:], proc.stderr[-4000:])
+        lines = [line for line in proc.stdout.splitlines() if line.startswith(RESULT_MARKER)]
+        if proc.returncode != 0 or not lines:
+            raise RuntimeError(f"{phase} failed (exit {proc.returncode})")
+        result = json.loads(lines[-1][len(RESULT_MARKER):])
+        if best is None or result["wall_s"] < best["wall_s"]:
+            best = result
+    best["rows_per_s"] = best["rows"] / best["wall_s"] if best["wall_s"] else None
+    return best
+
+
+def load_results(path):
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def resolve_baseline(name):
+    """A results file path, a commit id under benchmarks/results, or the saved baseline."""
+    if name is None:
+        return load_results(RESULTS_DIR / BASELINE_NAME)
+    if os.path.exists(name):
+        return load_results(name)
+    return load_results(RESULTS_DIR / f"{name}.json")
+
+
+def compare(current, baseline, threshold):
+    """Prints current vs baseline per (scale, phase); returns the regressions found."""
+    regressions = []
+    print(f"\n{'scale':<7} {'phase':<8} {'wall s':>9} {'rows/s':>12} {'peak MB':>9}   vs baseline")
+    for label, phases in current["results"].items():
+        for phase, result in phases.items():
+            base = ((baseline or {}).get("results", {}).get(label, {}) or {}).get(phase)
+            line = (f"{label:<7} {phase:<8} {result['wall_s']:9.3f} {result['rows_per_s'] or 0:12,.0f} "
+                    f"{(result['peak_rss_bytes'] or 0) / 2**20:9.1f}")
+            if base:
+                time_ratio = result["wall_s"] / base["wall_s"] if base["wall_s"] else 1.0
+                mem_ratio = ((result["peak_rss_bytes"] or 0) / base["peak_rss_bytes"]
+                             if base.get("peak_rss_bytes") else 1.0)
+                flags = []
+                if time_ratio > 1 + threshold:
+                    flags.append("SLOWER")
+                if mem_ratio > 1 + threshold:
+                    flags.append("MORE MEMORY")
+                if flags:
+                    regressions.append((label, phase, flags))
+                line += f"   time x{time_ratio:.2f}  mem x{mem_ratio:.2f}  {' '.join(flags) or 'ok'}"
+            else:
+                line += "   (no baseline)"
+            print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", nargs="+", default=["1M"], help="Dataset sizes, e.g. 1M 10M 100M.")
+    parser.add_argument("--phases", nargs="+", default=list(PHASES), choices=PHASES)
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per phase; the fastest is kept.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "nyc_audit_bench"))
+    parser.add_argument("--baseline", help="Results file or commit to compare with (default: results/baseline.json).")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed relative growth in wall time / peak memory (0.10 = 10%%).")
+    parser.add_argument("--save-baseline", action="store_true", help="Also store these results as the baseline.")
+    parser.add_argument("--verbose", action="store_true", help="Show the phases' own output.")
+    parser.add_argument("--phase-worker", choices=PHASES, help=argparse.SUPPRESS)
+    parser.add_argument("--data-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--scratch", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.phase_worker:
+        phase_worker(args.phase_worker, args.data_dir, args.scratch)
+        return
+
+    import duckdb
+    commit, dirty = git_commit()
+    key = f"{commit}-dirty" if dirty else commit
+    RESULTS_DIR.mkdir(exist_ok=True)
+    results_file = RESULTS_DIR / f"{key}.json"
+    current = load_results(results_file) or {"commit": commit, "dirty": dirty, "results": {}}
+    current.update({
+        "run_at": datetime.now().isoformat(timespec="seconds"),
+        "machine": {"python": platform.python_version(), "duckdb": duckdb.__version__,
+                    "cpus": os.cpu_count(), "platform": platform.platform()},
+    })
+
+    for label in args.scales:
+        data_dir = ensure_dataset(args.work_dir, label, parse_scale(label), args.seed)
+        for phase in args.phases:
+            print(f"  {label} {phase}...", flush=True)
+            current["results"].setdefault(label, {})[phase] = measure(phase, data_dir, args.repeat, args.verbose)
+
+    with open(results_file, "w") as f:
+        json.dump(current, f, indent=2)
+    print(f"\nResults saved to {results_file}")
+    if args.save_baseline:
+        shutil.copyfile(results_file, RESULTS_DIR / BASELINE_NAME)
+        print(f"Baseline saved to {RESULTS_DIR / BASELINE_NAME}")
+
+    baseline = None if args.save_baseline else resolve_baseline(args.baseline)
+    regressions = compare(current, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        for label, phase, flags in regressions:
+            print(f"  {label} {phase}: {', '.join(flags)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
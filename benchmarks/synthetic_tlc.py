@@ -0,0 +1,365 @@
+"""
+Synthetic TLC Trip Data Generator
+=================================
+Writes realistic yellow/green trip Parquet files into the layout
+ensure_data_available() expects, so the pipeline, the benchmarks and parity
+checks run without downloading anything:
+
+    <out>/{year}/{taxi}/{taxi}_tripdata_{yyyy}-{mm}.parquet
+    <out>/taxi_zone_lookup.csv
+    <out>/manifest.json          (files recorded with source "synthetic")
+    <out>/synthetic_truth.json   (rows and injected ghost trips per file)
+
+Because every file is in the manifest with no ETag, Phase 1 trusts it and
+makes no request; the imputation step still builds December 2025 from the
+2023 and 2024 Decembers.
+
+What the files mimic:
+
+- TLC column names: tpep_* (yellow) / lpep_* (green), green-only ehail_fee
+  and trip_type, yellow-only airport fee.
+- Schema drift by year (see drift()): 2023 files use int64 ids, double
+  passenger counts, nanosecond timestamps and `airport_fee`; 2024 on use
+  int32, microseconds and `Airport_fee`; 2025 adds `cbd_congestion_fee`.
+- congestion_surcharge absent from the files in MISSING_SURCHARGE and
+  partly NULL everywhere else.
+- Ghost trips injected at known rates (GHOST_RATES); each one hits exactly
+  one rule in ghost_rules.py, so the audit's per-rule counts for Jan-Nov
+  2025 must equal synthetic_truth.json (Duplicate Trip counts both copies;
+  the imputed December adds its own sample on top). Negative Fare, Time
+  Travel and Duplicate Trip are only audited with
+  AUDIT_GHOST_EXTENDED_RULES=1.
+
+Rows are written in batches, so scale is bounded by disk, not memory: from
+a few thousand rows to hundreds of millions. Output depends only on the
+seed and the row counts.
+
+Usage:
+    python benchmarks/synthetic_tlc.py --out data_downloads --rows 1000000
+"""
+
+import argparse
+import json
+import os
+import sys
+import zlib
+from pathlib import Path
+
+PIPELINE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pipeline")
+sys.path.insert(0, PIPELINE_DIR)
+
+import numpy as np  # noqa: E402
+import pyarrow as pa  # noqa: E402
+import pyarrow.parquet as pq  # noqa: E402
+from downloader import tlc_file_name  # noqa: E402
+from manifest import Manifest  # noqa: E402
+from zones import CONGESTION_ZONE_IDS, ZONE_LOOKUP_NAME  # noqa: E402
+
+TRUTH_NAME = "synthetic_truth.json"
+SOURCE = "synthetic"
+
+# What ensure_data_available() downloads: 2025 Jan-Nov, 2024, and Dec 2023
+DEFAULT_MONTHS = {2023: [12], 2024: list(range(1, 13)), 2025: list(range(1, 12))}
+TAXI_TYPES = ['yellow', 'green']
+GREEN_SHARE = 0.08  # green trips per yellow trip, roughly as in TLC data
+BATCH_ROWS = 500_000
+ROW_GROUP_SIZE = 1_000_000
+
+# Injected ghost trips, as a fraction of each file's rows
+GHOST_RATES = {
+    "Impossible Physics": 0.002,
+    "Teleporter": 0.001,
+    "Stationary Ride": 0.003,
+    "Negative Fare": 0.001,
+    "Time Travel": 0.0005,
+    "Duplicate Trip": 0.0005,  # pairs: both copies are flagged
+}
+
+# (year, taxi, month) files written without a congestion_surcharge column
+MISSING_SURCHARGE = {(2025, 'green', 2)}
+SURCHARGE_NULL_RATE = 0.02
+CBD_FEE_START = np.datetime64('2025-01-05T00:00:00', 'us')
+
+
+def drift(year):
+    """Column types of a given year's files."""
+    if year <= 2023:
+        return {"id": pa.int64(), "passengers": pa.float64(), "ts": "ns", "airport_fee": "airport_fee", "cbd_fee": False}
+    return {"id": pa.int32(), "passengers": pa.int64(), "ts": "us", "airport_fee": "Airport_fee", "cbd_fee": year >= 2025}
+
+
+# Share of pickups per hour of day (rush hours and late evening heavier)
+HOUR_WEIGHTS = np.array([
+    2.2, 1.5, 1.0, 0.7, 0.6, 0.8, 1.8, 3.2, 4.3, 4.5, 4.4, 4.6,
+    4.8, 4.9, 5.3, 5.6, 5.8, 6.2, 6.6, 6.4, 5.9, 5.6, 5.0, 3.7,
+])
+HOUR_WEIGHTS = HOUR_WEIGHTS / HOUR_WEIGHTS.sum()
+VENDORS, VENDOR_WEIGHTS = np.array([1, 2, 6, 7]), np.array([0.28, 0.68, 0.02, 0.02])
+CBD_IDS = np.array(CONGESTION_ZONE_IDS)
+CBD_SHARE = {'yellow': 0.55, 'green': 0.1}
+US_PER_MIN = 60_000_000
+
+
+def file_rows(total_rows, months=DEFAULT_MONTHS, taxi_types=TAXI_TYPES, green_share=GREEN_SHARE):
+    """{(year, taxi, month): rows} splitting `total_rows` over the files, green at `green_share` of yellow."""
+    files = [(year, taxi, month) for year, ms in months.items() for taxi in taxi_types for month in ms]
+    weight = {taxi: (green_share if taxi == 'green' else 1.0) for taxi in taxi_types}
+    total_weight = sum(weight[taxi] for _, taxi, _ in files)
+    return {f: max(1, int(round(total_rows * weight[f[1]] / total_weight))) for f in files}
+
+
+def _rng(seed, year, taxi, month, batch):
+    return np.random.default_rng([seed, year, zlib.crc32(taxi.encode()), month, batch])
+
+
+def _month_bounds_us(year, month):
+    start = np.datetime64(f"{year}-{month:02d}-01", 'us')
+    end = np.datetime64(f"{year + (month == 12)}-{month % 12 + 1:02d}-01", 'us')
+    return start.astype(np.int64), end.astype(np.int64)
+
+
+def _locations(rng, n, cbd_share):
+    in_cbd = rng.random(n) < cbd_share
+    return np.where(in_cbd, rng.choice(CBD_IDS, n), rng.integers(1, 266, n))
+
+
+def clean_trips(rng, n, year, month, taxi):
+    """n trips that hit no ghost rule: >= 3 minutes, under 40 mph, positive fare."""
+    start, end = _month_bounds_us(year, month)
+    days = (end - start) // (86_400 * 10**6)
+    pickup = (start + rng.integers(0, days, n) * 86_400 * 10**6
+              + rng.choice(24, n, p=HOUR_WEIGHTS) * 3_600 * 10**6
+              + rng.integers(0, 3_600 * 10**6, n))
+    minutes = np.clip(rng.lognormal(2.4, 0.6, n), 3, 120)
+    dropoff = pickup + (minutes * US_PER_MIN).astype(np.int64)
+    mph = np.clip(rng.gamma(4.0, 3.0, n), 2, 40)
+    distance = np.maximum(np.round(mph * minutes / 60, 2), 0.1)
+    fare = np.round(3.0 + 3.5 * distance + 0.7 * minutes, 2)
+    card = rng.random(n) < 0.72
+    tip = np.where(card, np.round(fare * rng.uniform(0.1, 0.3, n), 2), 0.0)
+    extra = rng.choice([0.0, 1.0, 2.5], n, p=[0.5, 0.3, 0.2])
+    tolls = np.where(rng.random(n) < 0.05, 6.94, 0.0)
+    pickup_loc = _locations(rng, n, CBD_SHARE[taxi])
+    dropoff_loc = _locations(rng, n, CBD_SHARE[taxi])
+    surcharge = np.where(rng.random(n) < (0.9 if taxi == 'yellow' else 0.3), 2.5 if taxi == 'yellow' else 2.75, 0.0)
+    touches_cbd = np.isin(pickup_loc, CBD_IDS) | np.isin(dropoff_loc, CBD_IDS)
+    cbd_fee = np.where(touches_cbd & (pickup >= CBD_FEE_START.astype(np.int64)), 0.75, 0.0)
+    airport_fee = np.where((pickup_loc == 132) | (pickup_loc == 138), 1.75, 0.0)
+    surcharge_null = rng.random(n) < SURCHARGE_NULL_RATE
+    return {
+        "VendorID": rng.choice(VENDORS, n, p=VENDOR_WEIGHTS),
+        "pickup": pickup, "dropoff": dropoff,
+        "passenger_count": rng.choice([1, 1, 1, 1, 2, 2, 3, 4, 5, 6], n),
+        "trip_distance": distance,
+        "RatecodeID": np.where(rng.random(n) < 0.97, 1, 2),
+        "store_and_fwd_flag": np.where(rng.random(n) < 0.005, "Y", "N"),
+        "PULocationID": pickup_loc, "DOLocationID": dropoff_loc,
+        "payment_type": np.where(card, 1, 2),
+        "fare_amount": fare, "extra": extra, "mta_tax": np.full(n, 0.5),
+        "tip_amount": tip, "tolls_amount": tolls, "improvement_surcharge": np.full(n, 1.0),
+        # NULL surcharges count as 0 in the pipeline, so totals leave them out
+        "congestion_surcharge": np.where(surcharge_null, 0.0, surcharge), "surcharge_null": surcharge_null,
+        "airport_fee": airport_fee, "cbd_congestion_fee": cbd_fee, "total_amount": np.zeros(n),
+    }
+
+
+def set_totals(cols):
+    """total_amount as the sum of its parts; negative for refunds (negative fares)."""
+    total = np.round(
+        np.abs(cols["fare_amount"]) + cols["extra"] + cols["mta_tax"] + cols["tip_amount"]
+        + cols["tolls_amount"] + cols["improvement_surcharge"]
+        + cols["congestion_surcharge"] + cols["cbd_congestion_fee"], 2)
+    cols["total_amount"] = np.where(cols["fare_amount"] < 0, -total, total)
+
+
+def inject_ghosts(rng, cols, rates):
+    """Overwrites disjoint random rows with one ghost pattern per rule; returns {rule: rows flagged}."""
+    n = len(cols["pickup"])
+    counts = {rule: int(round(rate * n)) for rule, rate in rates.items()}
+    counts["Duplicate Trip"] = min(counts.get("Duplicate Trip", 0), n // 2)
+    needed = sum(counts.values()) + counts["Duplicate Trip"]
+    if needed > n:
+        raise ValueError(f"Ghost rates add up to more rows ({needed}) than the batch has ({n}).")
+    picked = iter(np.split(rng.permutation(n)[:needed], np.cumsum(
+        [counts[r] for r in rates] + [counts["Duplicate Trip"]])[:-1]))
+    flagged = {}
+    for rule in rates:
+        idx = next(picked)
+        k = len(idx)
+        if rule == "Impossible Physics":
+            # 150-400 mph over 2-10 minutes
+            minutes = rng.uniform(2, 10, k)
+            cols["dropoff"][idx] = cols["pickup"][idx] + (minutes * US_PER_MIN).astype(np.int64)
+            cols["trip_distance"][idx] = np.round(rng.uniform(150, 400, k) * (minutes + 1) / 60, 2)
+        elif rule == "Teleporter":
+            # Same clock minute (duration 0), over $20, a few yards so the speed rule stays quiet
+            minute_start = cols["pickup"][idx] // US_PER_MIN * US_PER_MIN
+            cols["pickup"][idx] = minute_start + rng.integers(0, 20_000_000, k)
+            cols["dropoff"][idx] = cols["pickup"][idx] + rng.integers(1_000_000, 30_000_000, k)
+            cols["trip_distance"][idx] = np.round(rng.uniform(0.01, 0.1, k), 2)
+            cols["fare_amount"][idx] = np.round(rng.uniform(25, 80, k), 2)
+        elif rule == "Stationary Ride":
+            cols["trip_distance"][idx] = 0.0
+        elif rule == "Negative Fare":
+            cols["fare_amount"][idx] = -cols["fare_amount"][idx]
+            cols["tip_amount"][idx] = 0.0
+        elif rule == "Time Travel":
+            # Drop-off before pick-up; short and cheap so no other rule fires
+            cols["dropoff"][idx] = cols["pickup"][idx] - rng.integers(US_PER_MIN, 30 * US_PER_MIN, k)
+            cols["trip_distance"][idx] = np.round(rng.uniform(0.01, 0.1, k), 2)
+            cols["fare_amount"][idx] = np.round(rng.uniform(3, 15, k), 2)
+        elif rule == "Duplicate Trip":
+            copies = next(picked)
+            for values in cols.values():
+                values[copies] = values[idx]
+            k *= 2
+        flagged[rule] = k
+    return flagged
+
+
+def to_table(cols, year, taxi, month):
+    """Arrow table with the TLC column names and the year's drifted types."""
+    d = drift(year)
+    prefix = 'tpep' if taxi == 'yellow' else 'lpep'
+    ts = pa.timestamp(d["ts"])
+    scale = 1000 if d["ts"] == "ns" else 1
+    n = len(cols["pickup"])
+    fields = {
+        "VendorID": pa.array(cols["VendorID"], d["id"]),
+        f"{prefix}_pickup_datetime": pa.array(cols["pickup"] * scale, pa.int64()).cast(ts),
+        f"{prefix}_dropoff_datetime": pa.array(cols["dropoff"] * scale, pa.int64()).cast(ts),
+    }
+    if taxi == 'green':
+        fields["store_and_fwd_flag"] = pa.array(cols["store_and_fwd_flag"])
+        fields["RatecodeID"] = pa.array(cols["RatecodeID"], pa.float64())
+        fields["PULocationID"] = pa.array(cols["PULocationID"], d["id"])
+        fields["DOLocationID"] = pa.array(cols["DOLocationID"], d["id"])
+        fields["passenger_count"] = pa.array(cols["passenger_count"], d["passengers"])
+        fields["trip_distance"] = pa.array(cols["trip_distance"])
+    else:
+        fields["passenger_count"] = pa.array(cols["passenger_count"], d["passengers"])
+        fields["trip_distance"] = pa.array(cols["trip_distance"])
+        fields["RatecodeID"] = pa.array(cols["RatecodeID"], d["passengers"])
+        fields["store_and_fwd_flag"] = pa.array(cols["store_and_fwd_flag"])
+        fields["PULocationID"] = pa.array(cols["PULocationID"], d["id"])
+        fields["DOLocationID"] = pa.array(cols["DOLocationID"], d["id"])
+        fields["payment_type"] = pa.array(cols["payment_type"], pa.int64())
+    for name in ("fare_amount", "extra", "mta_tax", "tip_amount", "tolls_amount"):
+        fields[name] = pa.array(cols[name])
+    if taxi == 'green':
+        fields["ehail_fee"] = pa.nulls(n, pa.float64())
+    fields["improvement_surcharge"] = pa.array(cols["improvement_surcharge"])
+    fields["total_amount"] = pa.array(cols["total_amount"])
+    if taxi == 'green':
+        fields["payment_type"] = pa.array(cols["payment_type"], pa.float64())
+        fields["trip_type"] = pa.array(np.ones(n), pa.float64())
+    if (year, taxi, month) not in MISSING_SURCHARGE:
+        fields["congestion_surcharge"] = pa.array(cols["congestion_surcharge"], mask=cols["surcharge_null"])
+    if taxi == 'yellow':
+        fields[d["airport_fee"]] = pa.array(cols["airport_fee"])
+    if d["cbd_fee"]:
+        fields["cbd_congestion_fee"] = pa.array(cols["cbd_congestion_fee"])
+    return pa.table(fields)
+
+
+def write_file(path, rows, year, taxi, month, seed=0, rates=GHOST_RATES, batch_rows=BATCH_ROWS):
+    """Writes one monthly file in batches; returns {rule: rows flagged} for it."""
+    flagged = dict.fromkeys(rates, 0)
+    tmp_path = path.with_name(path.name + ".tmp")
+    writer = None
+    try:
+        for batch, offset in enumerate(range(0, rows, batch_rows)):
+            n = min(batch_rows, rows - offset)
+            rng = _rng(seed, year, taxi, month, batch)
+            cols = clean_trips(rng, n, year, month, taxi)
+            for rule, k in inject_ghosts(rng, cols, rates).items():
+                flagged[rule] += k
+            set_totals(cols)
+            table = to_table(cols, year, taxi, month)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema, compression="snappy")
+            writer.write_table(table, row_group_size=ROW_GROUP_SIZE)
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(tmp_path, path)
+    return flagged
+
+
+def write_zone_lookup(path):
+    """taxi_zone_lookup.csv with the real id range; names are placeholders."""
+    boroughs = ["Bronx", "Brooklyn", "Queens", "Staten Island"]
+    cbd = set(CONGESTION_ZONE_IDS)
+    lines = ['"LocationID","Borough","Zone","service_zone"']
+    for loc in range(1, 266):
+        if loc in cbd:
+            borough, service = "Manhattan", "Yellow Zone"
+        elif loc in (1, 132, 138):
+            borough, service = ("EWR" if loc == 1 else "Queens"), ("EWR" if loc == 1 else "Airports")
+        else:
+            borough, service = boroughs[loc % len(boroughs)], "Boro Zone"
+        lines.append(f'{loc},"{borough}","Synthetic Zone {loc}","{service}"')
+    path.write_text("\n".join(lines) + "\n")
+
+
+def generate(out_dir, total_rows, months=DEFAULT_MONTHS, taxi_types=TAXI_TYPES, seed=0,
+             rates=GHOST_RATES, green_share=GREEN_SHARE, force=False):
+    """
+    Writes every monthly file plus the zone lookup, records them in the
+    manifest and writes synthetic_truth.json. Files that the manifest says
+    were downloaded are left alone unless `force`. Returns the truth dict.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = Manifest.for_data_dir(out_dir)
+
+    def writable(path):
+        entry = manifest.get(path)
+        if path.exists() and (entry is None or entry.get("source") != SOURCE) and not force:
+            print(f"  -> Keeping {path.name} (not synthetic; use --force to replace it)")
+            return False
+        return True
+
+    lookup = out_dir / ZONE_LOOKUP_NAME
+    if writable(lookup):
+        write_zone_lookup(lookup)
+        manifest.record(lookup, source=SOURCE)
+
+    truth = {"seed": seed, "total_rows": total_rows, "rates": rates, "files": {}}
+    for (year, taxi, month), rows in file_rows(total_rows, months, taxi_types, green_share).items():
+        path = out_dir / str(year) / taxi / tlc_file_name(taxi, year, month)
+        if not writable(path):
+            continue
+        path.parent.mkdir(parents=True, exist_ok=True)
+        flagged = write_file(path, rows, year, taxi, month, seed, rates)
+        manifest.record(path, source=SOURCE)
+        truth["files"][manifest.key(path)] = {"rows": rows, "ghost_trips": flagged}
+        print(f"  -> {path.name}: {rows:,} rows, {sum(flagged.values()):,} ghost trips")
+    manifest.save()
+    with open(out_dir / TRUTH_NAME, "w") as f:
+        json.dump(truth, f, indent=2)
+    return truth
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(PIPELINE_DIR), "data_downloads"))
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Total rows over all files.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--years", type=int, nargs="+", default=sorted(DEFAULT_MONTHS),
+                        help="Years to write (months as ensure_data_available needs them).")
+    parser.add_argument("--taxi-types", nargs="+", default=TAXI_TYPES, choices=TAXI_TYPES)
+    parser.add_argument("--green-share", type=float, default=GREEN_SHARE)
+    parser.add_argument("--ghost-scale", type=float, default=1.0, help="Multiplies every GHOST_RATES entry.")
+    parser.add_argument("--force", action="store_true", help="Also replace downloaded (non-synthetic) files.")
+    args = parser.parse_args()
+
+    months = {year: DEFAULT_MONTHS.get(year, list(range(1, 13))) for year in args.years}
+    rates = {rule: rate * args.ghost_scale for rule, rate in GHOST_RATES.items()}
+    truth = generate(args.out, args.rows, months, args.taxi_types, args.seed, rates, args.green_share, args.force)
+    written = sum(f["rows"] for f in truth["files"].values())
+    print(f"\nWrote {len(truth['files'])} file(s), {written:,} rows, to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
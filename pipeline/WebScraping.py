@@ -1,9 +1,15 @@
 import os
-import requests
-import polars as pl
+import re
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from downloader import download_many, tlc_jobs
+from manifest import Manifest
+from selection import Selection, add_selection_args, apply_selection_args
+from trip_schema import IMPUTED_COLUMN, LEGACY_SCHEMA, SOURCE_COLUMNS, polars_select
 
 # --- CONFIGURATION ---
-BASE_URL = "https://d37ci6vzurychx.cloudfront.net/trip-data" 
 #Below are the months we want to download for each year. Adjust as needed. All 12 were available at the time of writing, but this allows for flexibility if some months are missing or if you want to limit the scope.
 DATA_NEEDS = {
     2025: range(1, 12),       
@@ -12,87 +18,64 @@ DATA_NEEDS = {
 }
 TAXI_TYPES = ['yellow', 'green']
 OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data_downloads")
+UNIFIED_DIR = os.path.join(OUTPUT_DIR, "unified")
+UNIFIED_ROW_GROUP_SIZE = 1_000_000
 
-def download_file(url, save_path):      
-    """Downloads a file if it doesn't exist."""
-    if os.path.exists(save_path):
-        # simple check: if file is too small (<1KB), it's likely corrupt.
-        if os.path.getsize(save_path) < 1024:
-            print(f"Removing corrupt file: {save_path}")
-            os.remove(save_path)
-        else:
-            print(f"Skipping {save_path} (exists)")
-            return True
-            
-    print(f"Downloading {url}...")
-    try:  
-        response = requests.get(url, stream=True) 
-        if response.status_code == 200:  
-            with open(save_path, 'wb') as f: 
-                for chunk in response.iter_content(chunk_size=1024):
-                    if chunk: f.write(chunk)
-            print(f"Saved to {save_path}")
-            return True
-        else:
-            print(f"Failed {url} (Status: {response.status_code})")
-            return False
-    except Exception as e:
-        print(f"Error: {e}")
-        return False
-
-def standardize_and_select(lf, taxi_type):
+def standardize_and_select(lf, taxi_type, schema=None):
     """
     Takes a LazyFrame (single file), renames columns, 
-    casts datetimes to 'us' (microseconds) to fix mismatch errors,
-    and handles missing surcharge columns.
+    casts to the canonical narrow schema (see trip_schema.py; datetimes are
+    forced to 'us' to fix mismatch errors) and handles missing surcharge columns.
+    Months written by imputation.py keep their is_imputed flag; every TLC
+    file gets false.
     """
-    
-    if taxi_type == 'yellow':
-        rename_map = {
-            'tpep_pickup_datetime': 'pickup_time',
-            'tpep_dropoff_datetime': 'dropoff_time',
-            'PULocationID': 'pickup_loc',
-            'DOLocationID': 'dropoff_loc',
-            'fare_amount': 'fare'
-        }
-    else: # green
-        rename_map = {
-            'lpep_pickup_datetime': 'pickup_time',
-            'lpep_dropoff_datetime': 'dropoff_time',
-            'PULocationID': 'pickup_loc',
-            'DOLocationID': 'dropoff_loc',
-            'fare_amount': 'fare'
-        }
+    import polars as pl
+    rename_map = SOURCE_COLUMNS[taxi_type]
     
     # Apply rename if columns exist
     current_cols = lf.collect_schema().names()
     valid_renames = {k: v for k, v in rename_map.items() if k in current_cols}
     lf = lf.rename(valid_renames)
     
-    # 2. Add congestion_surcharge if missing
+    # 2. Add congestion_surcharge / is_imputed if missing
     if 'congestion_surcharge' not in lf.collect_schema().names():
         lf = lf.with_columns(pl.lit(0.0).alias('congestion_surcharge'))
+    if IMPUTED_COLUMN not in lf.collect_schema().names():
+        lf = lf.with_columns(pl.lit(False).alias(IMPUTED_COLUMN))
 
     # 3. STRICT SELECT & CAST 
-    # This fixes the 'ns' vs 'us' mismatch by forcing everything to Microseconds ('us')
-    return lf.select([
-        pl.col('pickup_time').cast(pl.Datetime('us')),
-        pl.col('dropoff_time').cast(pl.Datetime('us')),
-        pl.col('pickup_loc').cast(pl.Int64),
-        pl.col('dropoff_loc').cast(pl.Int64),
-        pl.col('trip_distance').cast(pl.Float64),
-        pl.col('fare').cast(pl.Float64),
-        pl.col('total_amount').cast(pl.Float64),
-        pl.col('congestion_surcharge').fill_null(0.0).cast(pl.Float64)
-    ])
-
-def process_and_unify(year, taxi_type):
+    return lf.select(polars_select(schema))
+
+def unified_partition_dir(taxi_type, year, month):
+    """Hive-style partition directory: unified/type=<taxi>/year=<yyyy>/month=<m>."""
+    return os.path.join(UNIFIED_DIR, f"type={taxi_type}", f"year={year}", f"month={month}")
+
+def month_from_file_name(file_name):
+    """Month number from the TLC naming convention ({taxi}_tripdata_{yyyy}-{mm}.parquet)."""
+    match = re.search(r"_(\d{4})-(\d{2})\.parquet$", file_name)
+    return int(match.group(2)) if match else None
+
+def process_and_unify(year, taxi_type, legacy_csv=False, schema=None, months=None):
     """
-    Reads files INDIVIDUALLY to handle schema drifts, then concatenates.
+    Reads files INDIVIDUALLY to handle schema drifts and streams each month
+    straight to a zstd Parquet partition (unified/type=/year=/month=), so no
+    more than one batch of rows is ever held in memory.
+    Partitions follow the source file's month, not the trip timestamps.
+
+    With legacy_csv=True the old {year}_{taxi}_unified.csv is also written
+    (streamed with sink_csv rather than collected), always with the baseline
+    columns and types (trip_schema.LEGACY_SCHEMA). `schema` defaults to the
+    canonical narrow schema in trip_schema.py; `months` limits the run to
+    those source months.
     """
+    # Polars is only needed here, so download-only runs never import it
+    import polars as pl
     print(f"\n--- Processing {year} {taxi_type} ---")
     directory = f"{OUTPUT_DIR}/{year}/{taxi_type}"
-    files = [os.path.join(directory, f) for f in os.listdir(directory) if f.endswith('.parquet')]
+    files = sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.endswith('.parquet')) \
+        if os.path.isdir(directory) else []
+    if months is not None:
+        files = [f for f in files if month_from_file_name(os.path.basename(f)) in months]
     
     if not files:
         print("No files found.")
@@ -101,43 +84,87 @@ def process_and_unify(year, taxi_type):
     try:
         # Create a list of standardized LazyFrames
         lazy_frames = []
+        written = 0
         for f in files:
             lf = pl.scan_parquet(f)
-            lf_clean = standardize_and_select(lf, taxi_type)
-            lazy_frames.append(lf_clean)
-        
-        # Concat all of them 
-   
-        combined_q = pl.concat(lazy_frames, rechunk=False)
-
-        # Execute and Write
-        output_csv = f"{OUTPUT_DIR}/{year}_{taxi_type}_unified.csv"
-        
-        # We perform collect() here to write to CSV
-        print(f"Collecting & Writing to {output_csv}...")
-        df = combined_q.collect() 
-        df.write_csv(output_csv)
-        print(f"Success! ({df.shape[0]} rows)")
+            lf_clean = standardize_and_select(lf, taxi_type, schema)
+
+            month = month_from_file_name(os.path.basename(f))
+            if month is None:
+                print(f"Skipping {f} (not a TLC monthly file name)")
+                continue
+            # Only months that get a Parquet partition go into the legacy CSV
+            if legacy_csv:
+                lazy_frames.append(standardize_and_select(lf, taxi_type, LEGACY_SCHEMA))
+
+            partition_dir = unified_partition_dir(taxi_type, year, month)
+            os.makedirs(partition_dir, exist_ok=True)
+            out_file = os.path.join(partition_dir, "part-0.parquet")
+            tmp_file = out_file + ".tmp"
+            lf_clean.sink_parquet(
+                tmp_file,
+                compression='zstd',
+                row_group_size=UNIFIED_ROW_GROUP_SIZE,
+            )
+            os.replace(tmp_file, out_file)
+            written += 1
+            print(f"Wrote {out_file}")
+
+        if legacy_csv and lazy_frames:
+            output_csv = f"{OUTPUT_DIR}/{year}_{taxi_type}_unified.csv"
+            print(f"Streaming legacy CSV to {output_csv}...")
+            pl.concat(lazy_frames, rechunk=False).sink_csv(output_csv)
+
+        print(f"Success! ({written} months)")
 
     except Exception as e:
         print(f"CRITICAL ERROR processing {year} {taxi_type}: {e}")
 
-# --- MAIN EXECUTION ---
-if __name__ == "__main__":
+def download_all():
+    """
+    Downloads every month in DATA_NEEDS, narrowed to the selected slice
+    (selection.py), concurrently and resuming any partial files.
+    """
     if not os.path.exists(OUTPUT_DIR): os.makedirs(OUTPUT_DIR)
+    selection = Selection.from_env()
+    required = [(year, month, taxi) for year, months in DATA_NEEDS.items() for taxi in TAXI_TYPES for month in months
+                if selection.keep(year, month, taxi)]
+    download_many(tlc_jobs(required, OUTPUT_DIR), manifest=Manifest.for_data_dir(OUTPUT_DIR))
+
+def unify_all(workers=1, legacy_csv=False):
+    """Unifies every selected (year, taxi) pair, `workers` pairs at once in separate processes."""
+    print("\nStarting Schema Unification...")
+    selection = Selection.from_env()
+    pairs = [(year, taxi) for year in selection.filter_years(DATA_NEEDS) for taxi in selection.filter_taxi_types(TAXI_TYPES)]
+    if workers > 1:
+        # Each pair writes its own partitions, so they can run side by side
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            for job in [pool.submit(process_and_unify, year, taxi, legacy_csv, None, selection.months)
+                        for year, taxi in pairs]:
+                job.result()
+    else:
+        for year, taxi in pairs:
+            process_and_unify(year, taxi, legacy_csv=legacy_csv, months=selection.months)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Download TLC trip data and unify schemas.")
+    parser.add_argument("--legacy-csv", action="store_true",
+                        help="Also write the old {year}_{taxi}_unified.csv files.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Unify this many (year, taxi) pairs at once, in separate processes.")
+    add_selection_args(parser, phases=False)
+    args = parser.parse_args(argv)
+    apply_selection_args(args)
 
-    for year, months in DATA_NEEDS.items():
-        for taxi in TAXI_TYPES:
-            year_dir = f"{OUTPUT_DIR}/{year}/{taxi}"
-            if not os.path.exists(year_dir): os.makedirs(year_dir)
-            for month in months:
-                file_name = f"{taxi}_tripdata_{year}-{month:02d}.parquet"
-                download_file(f"{BASE_URL}/{file_name}", f"{year_dir}/{file_name}")
+    # 1. Download (concurrently, resuming any partial files)
+    download_all()
 
     # 2. Process & Unify
-    print("\nStarting Schema Unification...")
-    for year in DATA_NEEDS.keys():
-        for taxi in TAXI_TYPES:
-            process_and_unify(year, taxi)
+    unify_all(args.workers, args.legacy_csv)
             
-    print("\nDONE.")
\ No newline at end of file
+    print("\nDONE.")
+
+# --- MAIN EXECUTION ---
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+NYC Congestion Pricing Audit - Command Line
+===========================================
+One entry point for the whole job or any slice of it (see selection.py):
+
+    python -m pipeline run                                   # every phase, every month
+    python -m pipeline run --years 2025 --months 1-3 --types yellow --phases audit,impact
+    python -m pipeline run --resume                          # pick up after a failed run
+    python -m pipeline download --years 2025 --months 12     # ingest only
+    python -m pipeline status                                # which phases are complete
+
+`run` takes every pipeline.py flag (--threads, --memory-limit, --resume, ...).
+"""
+
+import argparse
+import os
+import sys
+
+PIPELINE_DIR = os.path.dirname(os.path.abspath(__file__))
+# `python -m pipeline` imports this directory as a namespace package called
+# "pipeline"; the modules in it import each other by bare name, and to them
+# "pipeline" is pipeline.py.
+sys.path.insert(0, PIPELINE_DIR)
+sys.modules.pop("pipeline", None)
+
+from selection import PHASES, add_selection_args, apply_selection_args
+
+
+def run(argv):
+    import pipeline
+    return 0 if pipeline.main(argv) else 1
+
+
+def download(argv):
+    return run([*argv, "--phases", "ingest"])
+
+
+def status(argv):
+    parser = argparse.ArgumentParser(prog="python -m pipeline status",
+                                     description="Shows which phases are complete for the data on disk.")
+    add_selection_args(parser, phases=False)
+    selection = apply_selection_args(parser.parse_args(argv))
+
+    import pipeline
+    from manifest import Manifest
+
+    manifest = Manifest.for_data_dir(pipeline.DATA_DIR)
+    required = [pipeline.tlc_path(*key) for key in pipeline.required_months()]
+    on_disk = [path for path in required if path.exists()]
+    imputed = [path for path in on_disk if manifest.is_imputed(path)]
+    print(f"Selection: {selection.describe()}")
+    print(f"Data: {len(on_disk)} of {len(required)} required month files on disk ({len(imputed)} imputed)")
+
+    checkpoints = pipeline.open_checkpoints()
+    key = pipeline.input_fingerprint(manifest)
+    print(f"Checkpoints ({checkpoints.state.path}), current inputs {key}:")
+    for phase in PHASES:
+        entry = checkpoints.state.data.get(phase)
+        if not entry:
+            state = "not run"
+        elif checkpoints.is_complete(phase, key):
+            state = f"complete  {entry.get('finished_at')}"
+        else:
+            state = f"stale     {entry.get('finished_at')} (data, settings or outputs changed)"
+        print(f"  {phase:<8} {state}")
+    return 0
+
+
+COMMANDS = {"run": run, "download": download, "status": status}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m pipeline", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=COMMANDS)
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="The command's own flags (see <command> -h).")
+    args = parser.parse_args(argv)
+    return COMMANDS[args.command](args.args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+NYC Congestion Pricing Audit - Persistent DuckDB Catalog
+========================================================
+Optional on-disk `cache/audit.duckdb` holding a materialized `trips` table in
+the canonical schema (trip_schema.py), so repeat runs and ad-hoc queries do
+not re-list directories, re-read every Parquet footer and re-infer schemas.
+
+The table is refreshed incrementally: `catalog_files` remembers the
+fingerprint (manifest SHA-256, or size/mtime for untracked files) of every
+source file loaded, and only new, changed or deleted files are reloaded.
+
+    duckdb cache/audit.duckdb "SELECT type, COUNT(*) FROM trips GROUP BY 1"
+"""
+
+from pathlib import Path
+
+from dataset import resolve_shards
+from incremental import file_fingerprint
+from trip_schema import CANONICAL_SCHEMA, DUCKDB_TAXI_TYPE, IMPUTED_COLUMN, duckdb_select
+
+CATALOG_NAME = "audit.duckdb"
+
+
+def ensure_tables(conn):
+    columns = [f"{name} {sql_type}" for name, (_, sql_type) in CANONICAL_SCHEMA.items()]
+    columns.insert(1, f"type {DUCKDB_TAXI_TYPE}")
+    columns = ",\n        ".join(columns)
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS trips (
+        {columns},
+        source_year SMALLINT,
+        source_file VARCHAR
+    )
+    """)
+    # Catalogs created before the flag existed only hold TLC rows
+    conn.execute(f"ALTER TABLE trips ADD COLUMN IF NOT EXISTS {IMPUTED_COLUMN} BOOLEAN DEFAULT false")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS catalog_files (
+        source_file VARCHAR PRIMARY KEY,
+        fingerprint VARCHAR,
+        row_count BIGINT,
+        loaded_at TIMESTAMP
+    )
+    """)
+
+
+def refresh_trips(conn, data_dir, years, taxi_types, manifest=None, months=None, prune=True):
+    """
+    Brings the `trips` table in line with the Parquet files on disk.
+    With prune=False (a slice of the job), files outside the selected years,
+    types and months are kept as they are.
+    Returns the list of source files (re)loaded in this call.
+    """
+    ensure_tables(conn)
+    known = dict(conn.execute("SELECT source_file, fingerprint FROM catalog_files").fetchall())
+    on_disk = resolve_shards(data_dir, years, taxi_types, months)
+    on_disk_keys = {shard.path.as_posix() for shard in on_disk}
+
+    loaded = []
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        # Files that disappeared (or fell out of the selected years/types).
+        for source_file in set(known) - on_disk_keys:
+            if not prune and Path(source_file).exists():
+                continue
+            conn.execute("DELETE FROM trips WHERE source_file = ?", [source_file])
+            conn.execute("DELETE FROM catalog_files WHERE source_file = ?", [source_file])
+
+        for shard in on_disk:
+            year, taxi, path = shard.year, shard.taxi, shard.path
+            key = path.as_posix()
+            fingerprint = file_fingerprint(path, manifest)
+            if known.get(key) == fingerprint:
+                continue
+
+            available = {row[0] for row in conn.execute(f"DESCRIBE SELECT * FROM read_parquet('{key}')").fetchall()}
+            conn.execute("DELETE FROM trips WHERE source_file = ?", [key])
+            conn.execute(f"""
+            INSERT INTO trips BY NAME
+            SELECT
+                {duckdb_select(taxi, available=available)},
+                {int(year)} as source_year,
+                '{key}' as source_file
+            FROM read_parquet('{key}')
+            """)
+            rows = conn.execute("SELECT COUNT(*) FROM trips WHERE source_file = ?", [key]).fetchone()[0]
+            conn.execute("""
+            INSERT OR REPLACE INTO catalog_files VALUES (?, ?, ?, current_timestamp)
+            """, [key, fingerprint, rows])
+            loaded.append(key)
+            print(f"  -> Catalog: loaded {path.name} ({rows:,} rows)")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    if not loaded:
+        print("  -> Catalog up to date.")
+    return loaded
+
+
+def shard_sql(shard):
+    """SELECT over one source file's rows in the catalog (canonical columns only)."""
+    return f"SELECT * EXCLUDE (source_year, source_file) FROM trips WHERE source_file = '{shard.path.as_posix()}'"
+
+
+def create_trips_view(conn, year=2025, shards=None):
+    """The `all_trips_<year>` view over the catalog, limited to `shards`' files when given."""
+    files = ""
+    if shards is not None:
+        paths = ", ".join(f"'{s.path.as_posix()}'" for s in shards)
+        files = f"AND source_file IN ({paths})" if shards else "AND false"
+    conn.execute(f"""
+    CREATE OR REPLACE VIEW all_trips_{int(year)} AS
+    SELECT * EXCLUDE (source_year, source_file)
+    FROM trips
+    WHERE source_year = {int(year)} {files}
+    """)
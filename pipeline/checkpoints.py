@@ -0,0 +1,91 @@
+"""
+NYC Congestion Pricing Audit - Phase Checkpoints
+================================================
+`cache/checkpoints.json` records, for every phase of pipeline.main that
+finished, a completion marker:
+
+- the fingerprint of its inputs (the data files' manifest SHA-256s and the
+  AUDIT_* settings that change the outputs),
+- the output files it wrote (every file the phase must write has to exist,
+  or no marker is written),
+- its small in-memory result, if a later phase needs it (the audit's counts
+  feed Phase 3),
+- when it finished.
+
+A phase's marker is dropped when the phase starts and written only once it
+succeeds, so a crash never leaves a stale marker behind. With `--resume`,
+leading phases whose marker matches and whose outputs still exist are
+skipped, and the run picks up at the first incomplete phase; every phase
+after that runs again.
+
+Code changes are not part of the fingerprint (the per-month partials in
+incremental.py already track each phase's SQL), so a run that failed on a
+bug can be resumed once the bug is fixed.
+"""
+
+from datetime import datetime
+from pathlib import Path
+
+from incremental import Watermarks
+
+CHECKPOINTS_NAME = "checkpoints.json"
+
+
+class Checkpoints:
+    """
+    Per-phase completion markers; `resume` is on until the first incomplete
+    phase. `outputs` maps a phase to the files it must write.
+    """
+
+    def __init__(self, path, resume=False, outputs=None):
+        self.state = Watermarks(path)
+        self.resume = resume
+        self.outputs = {phase: [str(p) for p in paths] for phase, paths in (outputs or {}).items()}
+
+    def missing_outputs(self, phase, outputs=()):
+        """Required (and given) output files of `phase` that do not exist."""
+        expected = dict.fromkeys([*self.outputs.get(phase, []), *map(str, outputs)])
+        return [path for path in expected if not Path(path).exists()]
+
+    def is_complete(self, phase, fingerprint):
+        entry = self.state.data.get(phase)
+        return (
+            bool(entry)
+            and entry.get("fingerprint") == fingerprint
+            and not self.missing_outputs(phase, entry.get("outputs", []))
+        )
+
+    def result(self, phase):
+        return self.state.get(phase, "result")
+
+    def skip(self, phase, fingerprint):
+        """
+        True when resuming and `phase` is complete for `fingerprint`.
+        Otherwise resuming ends here and the phase's old marker is dropped.
+        """
+        self.resume = self.resume and self.is_complete(phase, fingerprint)
+        if self.resume:
+            print(f"\n[{phase}] Complete in checkpoint {fingerprint}; resuming after it.")
+            return True
+        if self.state.data.pop(phase, None) is not None:
+            self.state.save()
+        return False
+
+    def finish(self, phase, fingerprint, outputs=(), result=None):
+        """
+        Marks `phase` complete with the outputs it wrote and the result it
+        returned. Returns False, writing no marker, when a required output
+        is missing.
+        """
+        missing = self.missing_outputs(phase, outputs)
+        if missing:
+            print(f"\n[{phase}] Not checkpointed; missing outputs: {', '.join(Path(p).name for p in missing)}")
+            return False
+        self.state.data[phase] = {
+            "fingerprint": fingerprint,
+            "outputs": list(dict.fromkeys([*self.outputs.get(phase, []), *map(str, outputs)])),
+            "result": result,
+            "finished_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        self.state.save()
+        return True
@@ -0,0 +1,73 @@
+"""
+NYC Congestion Pricing Audit - Time-Sorted Compaction
+=====================================================
+Optional stage that rewrites every source month in the canonical schema,
+sorted by pickup time, into a hive-style dataset next to the raw downloads:
+
+    data_downloads/compacted/type=<taxi>/year=<yyyy>/month=<m>/part-0.parquet
+
+Raw TLC files are in no particular order, so every row group spans the whole
+month and a filter like `pickup_time >= '2025-01-05'` cannot skip any of
+them. Sorted, each row group covers a narrow time slice and its min/max
+statistics let DuckDB skip the rest. With `cluster_by_zone` rows are ordered
+by pickup day, then pickup zone, then time: date filters still prune at day
+granularity and zone filters can prune within each day.
+
+Months are recompacted only when their source file (or the sort settings)
+change, tracked in the 'compact' watermarks.
+"""
+
+import os
+from pathlib import Path
+
+from incremental import file_fingerprint, logic_fingerprint
+
+COMPACT_DIR_NAME = "compacted"
+COMPACT_PHASE = "compact"
+
+
+def sort_key(cluster_by_zone=False):
+    if cluster_by_zone:
+        return "CAST(pickup_time AS DATE), pickup_loc, pickup_time"
+    return "pickup_time"
+
+
+def compacted_path(compact_dir, shard):
+    return Path(compact_dir) / f"type={shard.taxi}" / f"year={shard.year}" / f"month={shard.month}" / "part-0.parquet"
+
+
+def compact_shard(conn, source_sql, out_path, row_group_size, cluster_by_zone=False):
+    """Writes one month (a canonical SELECT) sorted, zstd, with the given row-group size."""
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    # `type` is the partition key on disk, as in the unified dataset
+    conn.execute(f"""
+    COPY (
+        SELECT * EXCLUDE (type) FROM ({source_sql}) AS src
+        ORDER BY {sort_key(cluster_by_zone)}
+    ) TO '{tmp_path.as_posix()}' (FORMAT PARQUET, COMPRESSION ZSTD, ROW_GROUP_SIZE {int(row_group_size)})
+    """)
+    os.replace(tmp_path, out_path)
+
+
+def compact_shards(conn, shards, source_sql, compact_dir, watermarks, row_group_size,
+                   cluster_by_zone=False, manifest=None, logic=""):
+    """
+    Compacts every shard whose source or settings changed since the last run.
+    `source_sql(conn, shard)` returns the shard's canonical SELECT. Returns the
+    shards (re)written.
+    """
+    logic = logic_fingerprint(logic, sort_key(cluster_by_zone), row_group_size)
+    written = []
+    for shard in shards:
+        out_path = compacted_path(compact_dir, shard)
+        fingerprint = f"{file_fingerprint(shard.path, manifest)}:{logic}"
+        if watermarks.get(COMPACT_PHASE, shard.key) == fingerprint and out_path.exists():
+            continue
+        compact_shard(conn, source_sql(conn, shard), out_path, row_group_size, cluster_by_zone)
+        watermarks.mark(COMPACT_PHASE, shard.key, fingerprint)
+        written.append(shard)
+    watermarks.save()
+    print(f"  -> {COMPACT_PHASE}: {len(written)} of {len(shards)} month(s) rewritten, "
+          f"{len(shards) - len(written)} reused.")
+    return written
@@ -1,23 +1,32 @@
 """
 NYC Congestion Pricing Audit - Interactive Streamlit Dashboard
 ===============================================================
-4-tab interactive dashboard showing:
+5-tab interactive dashboard showing:
 1. Border Effect (Choropleth map logic)
 2. Congestion Velocity (Before/After heatmaps)
 3. Tip Economics (Crowding out analysis)
 4. Rain Elasticity (Weather correlation)
+5. Ghost Trips (per-rule counts and a filtered, paginated trip list)
+
+Nothing is loaded up front: one cached DuckDB connection reads the pipeline
+outputs in place, and each tab asks it for the few rows it draws. The
+ghost-trip list is filtered, counted and paged in SQL, so only the page on
+screen is ever in memory. Query results are cached per output version and
+refreshed when the pipeline rewrites a file.
 """
 
 import os
 import json
 import warnings
+import duckdb
 import pandas as pd
-import numpy as np
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+from ghost_rules import active_rules, rule_count_columns
+
 warnings.filterwarnings('ignore')
 
 # ============================================================================
@@ -36,48 +45,78 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 OUTPUT_DIR = os.path.join(BASE_DIR, "output")
 CACHE_DIR = os.path.join(BASE_DIR, "cache")
 
+SOURCES = {
+    'leakage': f"{OUTPUT_DIR}/leakage_analysis.csv",
+    'border': f"{OUTPUT_DIR}/border_effect.csv",
+    'velocity_2024': f"{OUTPUT_DIR}/velocity_2024.csv",
+    'velocity_2025': f"{OUTPUT_DIR}/velocity_2025.csv",
+    'trips': f"{OUTPUT_DIR}/daily_trips_2025.csv",
+    'tips': f"{OUTPUT_DIR}/tips_economics.csv",
+    'weather': f"{CACHE_DIR}/weather_2025.csv",
+    'ghost': f"{OUTPUT_DIR}/ghost_trip_audit.parquet",
+}
+
+GHOST_PAGE_SIZES = [25, 50, 100, 250]
+GHOST_ORDER = "fraud_flag, VendorID, pickup_time"  # the file's sort order
+QUERY_CACHE_ENTRIES = 256  # bounds the cached result frames (one per page/filter)
+
 # ============================================================================
-# DATA LOADING
+# DATA ACCESS
 # ============================================================================
 
+@st.cache_resource
+def get_conn():
+    """One in-memory DuckDB connection shared by every session."""
+    return duckdb.connect()
+
+
+def scan(key):
+    """FROM-clause expression reading output `key` in place, or None if it does not exist."""
+    path = SOURCES[key]
+    if not os.path.exists(path):
+        return None
+    path = path.replace("'", "''")
+    if path.endswith(".parquet"):
+        return f"read_parquet('{path}')"
+    return f"read_csv_auto('{path}')"
+
+
+def outputs_version():
+    """Modification times of the outputs; part of every cache key, so a new run is picked up."""
+    return tuple(os.path.getmtime(p) if os.path.exists(p) else None for p in SOURCES.values())
+
+
+@st.cache_data(max_entries=QUERY_CACHE_ENTRIES, show_spinner=False)
+def run_query(sql, params, version):
+    # Connections are not thread-safe; each Streamlit session thread gets its own cursor.
+    cursor = get_conn().cursor()
+    try:
+        return cursor.execute(sql, [list(p) if isinstance(p, tuple) else p for p in params]).df()
+    finally:
+        cursor.close()
+
+
+def query(sql, params=()):
+    """Runs `sql` (with `?` params) and returns a DataFrame; None after reporting an error."""
+    try:
+        return run_query(sql, tuple(params), outputs_version())
+    except duckdb.Error as e:
+        st.error(f"Query failed: {e}")
+        return None
+
+
 @st.cache_data
-def load_data():
-    """Load all pipeline outputs."""
+def load_text(version):
+    """The small non-tabular outputs: impact stats and the elasticity write-up."""
     data = {}
-    
-    # 1. Stats
     if os.path.exists(f"{OUTPUT_DIR}/impact_stats.json"):
         with open(f"{OUTPUT_DIR}/impact_stats.json", 'r') as f:
             data['stats'] = json.load(f)
-            
-    # 2. CSVs
-    files = {
-        'ghost': f"{OUTPUT_DIR}/ghost_trip_audit.csv",
-        'leakage': f"{OUTPUT_DIR}/leakage_analysis.csv",
-        'border': f"{OUTPUT_DIR}/border_effect.csv",
-        'velocity_2024': f"{OUTPUT_DIR}/velocity_2024.csv",
-        'velocity_2025': f"{OUTPUT_DIR}/velocity_2025.csv",
-        'trips': f"{OUTPUT_DIR}/daily_trips_2025.csv",
-        'tips': f"{OUTPUT_DIR}/tips_economics.csv",
-        'weather': f"{CACHE_DIR}/weather_2025.csv"
-    }
-    
-    for key, path in files.items():
-        if os.path.exists(path):
-            try:
-                data[key] = pd.read_csv(path)
-            except Exception as e:
-                st.error(f"Error loading {key}: {e}")
-    
-    # 3. Text
     if os.path.exists(f"{OUTPUT_DIR}/elasticity.txt"):
         with open(f"{OUTPUT_DIR}/elasticity.txt", 'r') as f:
             data['elasticity_text'] = f.read()
-            
     return data
 
-DATA = load_data()
-
 # ============================================================================
 # TAB 1: THE MAP (BORDER EFFECT)
 # ============================================================================
@@ -88,40 +127,42 @@ def tab_map():
         **Hypothesis**: Are passengers ending trips just outside the zone to avoid the toll?
         Comparision of Drop-off volumes in Q1 2024 vs Q1 2025.
     """)
-    
-    df = DATA.get('border')
-    if df is not None and not df.empty:
-        # Filter for significant volume
-        df = df[df['count_2024'] > 100]
-        
-        # Sort by pct change
-        df = df.sort_values('pct_change', ascending=False)
-        
-        # Top 10 Increases (Potential Avoidance)
-        top_inc = df.head(15)
-        
+
+    src = scan('border')
+    # Top 15 increases (potential avoidance) among zones with significant volume
+    top_inc = query(f"""
+        SELECT * FROM {src}
+        WHERE count_2024 > 100
+        ORDER BY pct_change DESC
+        LIMIT 15
+    """) if src else None
+    if top_inc is not None and not top_inc.empty:
+        # Zone names when the pipeline had the zone lookup, else bare ids
+        label = 'zone' if 'zone' in top_inc.columns and top_inc['zone'].notna().any() else 'location_id'
+        detail_cols = ['location_id'] + (['zone', 'borough'] if label == 'zone' else [])
+
         col1, col2 = st.columns([2, 1])
         with col1:
             fig = px.bar(
                 top_inc,
                 x='pct_change',
-                y='location_id',
+                y=label,
                 orientation='h',
                 title='Top 15 Zones with Drop-off Increases (Possible Border Effect)',
-                labels={'pct_change': '% Change', 'location_id': 'Taxi Zone ID'},
+                labels={'pct_change': '% Change', 'location_id': 'Taxi Zone ID', 'zone': 'Taxi Zone'},
                 color='pct_change',
                 color_continuous_scale='Reds'
             )
             fig.update_layout(yaxis={'type': 'category'})
             st.plotly_chart(fig, use_container_width=True)
-            
+
         with col2:
             st.write("#### Data Details")
             st.dataframe(
-                top_inc[['location_id', 'count_2024', 'count_2025', 'pct_change']]
+                top_inc[detail_cols + ['count_2024', 'count_2025', 'pct_change']]
                 .style.format({'pct_change': '{:.1f}%'})
             )
-            
+
         st.info("High percentage increases in zones bordering 60th St suggest passengers dropping off early to avoid toll.")
     else:
         st.warning("No Border Effect data available. Run pipeline.py first.")
@@ -133,25 +174,26 @@ def tab_map():
 def tab_flow():
     st.header("⚡ Tab 2: The Flow (Congestion Velocity)")
     st.markdown("**Hypothesis**: Did the toll actually speed up traffic inside the zone?")
-    
-    v24 = DATA.get('velocity_2024')
-    v25 = DATA.get('velocity_2025')
-    
+
+    src24, src25 = scan('velocity_2024'), scan('velocity_2025')
+    v24 = query(f"SELECT dow, hour, avg_speed FROM {src24}") if src24 else None
+    v25 = query(f"SELECT dow, hour, avg_speed FROM {src25}") if src25 else None
+
     if v24 is not None and v25 is not None:
         col1, col2 = st.columns(2)
-        
+
         def make_heatmap(df, year):
             # df columns: dow, hour, avg_speed
             pivot = df.pivot_table(index='dow', columns='hour', values='avg_speed')
-            
+
             # Map clean DOW names if possible (0=Sun in DuckDB usually if 0-6, need check)
             # Assuming 0=Sunday
             days = ['Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat']
-            
+
             # Reindex if possible
             existing_indices = pivot.index
             mapped_indices = [days[i] for i in existing_indices if i < 7]
-            
+
             fig = px.imshow(
                 pivot,
                 labels=dict(x="Hour of Day", y="Day of Week", color="Speed (MPH)"),
@@ -166,15 +208,15 @@ def tab_flow():
             st.plotly_chart(make_heatmap(v24, 2024), use_container_width=True)
         with col2:
             st.plotly_chart(make_heatmap(v25, 2025), use_container_width=True)
-            
+
         # Comparison delta
         avg24 = v24['avg_speed'].mean()
         avg25 = v25['avg_speed'].mean()
         delta = avg25 - avg24
         pct = (delta / avg24) * 100 if avg24 != 0 else 0
-        
+
         st.metric("Overall Average Speed Change", f"{delta:.2f} MPH", f"{pct:.1f}%")
-        
+
     else:
         st.warning("Velocity data missing.")
 
@@ -185,37 +227,38 @@ def tab_flow():
 def tab_economics():
     st.header("💰 Tab 3: The Economics")
     st.markdown("**Hypothesis**: Do surcharges crowd out tips?")
-    
-    tips = DATA.get('tips')
-    
+
+    src = scan('tips')
+    tips = query(f"SELECT month, avg_surcharge, avg_tip_pct FROM {src} ORDER BY month") if src else None
+
     if tips is not None:
         # tips: month, avg_surcharge, avg_tip_pct
         fig = make_subplots(specs=[[{"secondary_y": True}]])
-        
+
         fig.add_trace(
             go.Bar(name="Avg Surcharge ($)", x=tips['month'], y=tips['avg_surcharge'], marker_color='red', opacity=0.5),
             secondary_y=False
         )
-        
+
         fig.add_trace(
             go.Scatter(name="Avg Tip %", x=tips['month'], y=tips['avg_tip_pct'], mode='lines+markers', line=dict(color='blue')),
             secondary_y=True
         )
-        
+
         fig.update_layout(title="Monthly Surcharge vs Tip % (2025)")
         fig.update_xaxes(title_text="Month")
         fig.update_yaxes(title_text="Surcharge ($)", secondary_y=False)
         fig.update_yaxes(title_text="Tip %", secondary_y=True)
-        
+
         st.plotly_chart(fig, use_container_width=True)
-        
+
         correlation = tips['avg_surcharge'].corr(tips['avg_tip_pct'])
         st.write(f"**Correlation between Surcharge and Tip %**: {correlation:.3f}")
         if correlation < -0.3:
             st.error("Evidence of Crowding Out: Higher surcharges correlate with lower tips.")
         else:
             st.success("No strong evidence of Crowding Out.")
-            
+
     else:
         st.warning("Economics data missing.")
 
@@ -226,81 +269,180 @@ def tab_economics():
 def tab_weather():
     st.header("🌧️ Tab 4: The Rain Tax")
     st.markdown("**Hypothesis**: Rain Elasticity of Demand.")
-    
-    trips = DATA.get('trips')
-    weather = DATA.get('weather')
-    
-    if trips is not None and weather is not None:
-        # Merge
-        # Ensure date format matches
-        try:
-            trips['date'] = pd.to_datetime(trips['date'])
-            weather['date'] = pd.to_datetime(weather['date'])
-            merged = pd.merge(trips, weather, on='date')
-        except:
-             st.error("Date format mismatch between trips and weather data")
-             return
+
+    trips, weather = scan('trips'), scan('weather')
+
+    if trips and weather:
+        # Join in SQL; TRY_CAST so a date format mismatch drops rows instead of failing
+        merged = query(f"""
+            SELECT t.date, t.trips, w.precipitation
+            FROM {trips} t
+            JOIN {weather} w ON TRY_CAST(t.date AS DATE) = TRY_CAST(w.date AS DATE)
+            ORDER BY t.date
+        """)
+        if merged is None or merged.empty:
+            st.error("Date format mismatch between trips and weather data")
+            return
 
         col1, col2 = st.columns([2, 1])
         with col1:
             fig = px.scatter(
-                merged, 
-                x='precipitation', 
-                y='trips', 
+                merged,
+                x='precipitation',
+                y='trips',
                 trendline='ols',
                 title="Daily Trips vs Precipitation (2025)",
                 labels={'precipitation': 'Precipitation (mm)', 'trips': 'Trip Count'}
             )
             st.plotly_chart(fig, use_container_width=True)
-            
+
         with col2:
             st.write("### Analysis")
-            if 'elasticity_text' in DATA:
-                st.text(DATA['elasticity_text'])
-            
+            text = load_text(outputs_version())
+            if 'elasticity_text' in text:
+                st.text(text['elasticity_text'])
+
             corr = merged['trips'].corr(merged['precipitation'])
             st.metric("Correlation", f"{corr:.3f}")
-            
+
             if abs(corr) < 0.3:
                 st.info("Demand is Inelastic (Weather has little effect).")
             else:
                 st.info("Demand is Elastic (Weather affects trips).")
 
+# ============================================================================
+# TAB 5: GHOST TRIPS
+# ============================================================================
+
+def ghost_filters(src, vendors):
+    """
+    Filter widgets for the trip list; returns the WHERE clause and its
+    params, or None (after an empty-state message) when there is nothing to list.
+    """
+    rules = active_rules()
+    bounds = query(f"SELECT MIN(pickup_time)::DATE as first, MAX(pickup_time)::DATE as last FROM {src}")
+    if bounds is None or bounds.empty or bounds.iloc[0].isna().any():
+        st.info("No flagged trips with a pickup time to list.")
+        return None
+    first, last = (pd.Timestamp(v).date() for v in bounds.iloc[0])
+
+    col1, col2, col3 = st.columns(3)
+    chosen_rules = col1.multiselect("Rules hit (any of)", [rule.name for _, rule in rules])
+    chosen_vendors = col2.multiselect("Vendors", vendors)
+    dates = col3.date_input("Pickup dates", (first, last), min_value=first, max_value=last)
+
+    conditions, params = [], []
+    if chosen_rules:
+        conditions.append("rule_mask & ? <> 0")
+        params.append(sum(bit for bit, rule in rules if rule.name in chosen_rules))
+    if chosen_vendors:
+        conditions.append("list_contains(?, VendorID)")
+        params.append(tuple(int(v) for v in chosen_vendors))
+    # A range picker yields one date while the second click is pending
+    if isinstance(dates, (tuple, list)) and len(dates) == 2:
+        conditions.append("pickup_time >= ? AND pickup_time < ? + INTERVAL 1 DAY")
+        params += [dates[0], dates[1]]
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return where, params
+
+
+def tab_ghost():
+    st.header("👻 Tab 5: Ghost Trips")
+    st.markdown("**Question**: Which trips look physically or financially impossible, and who reports them?")
+
+    src = scan('ghost')
+    totals = query(f"SELECT COUNT(*) as total, {rule_count_columns()} FROM {src}") if src else None
+    if totals is None:
+        st.warning("No ghost-trip audit available. Run pipeline.py first.")
+        return
+    if totals['total'].iloc[0] == 0:
+        st.success("No trips were flagged.")
+        return
+
+    vendors = query(f"SELECT VendorID, COUNT(*) as trips FROM {src} GROUP BY VendorID ORDER BY trips DESC")
+    if vendors is None:
+        return
+    by_rule = totals.drop(columns='total').T.reset_index()
+    by_rule.columns = ['rule', 'trips']
+
+    col1, col2 = st.columns(2)
+    with col1:
+        fig = px.bar(by_rule, x='trips', y='rule', orientation='h', title='Flagged Trips per Rule (a trip can hit several)',
+                     labels={'trips': 'Trips', 'rule': 'Rule'})
+        st.plotly_chart(fig, use_container_width=True)
+    with col2:
+        fig = px.bar(vendors, x='VendorID', y='trips', title='Flagged Trips per Vendor',
+                     labels={'trips': 'Trips', 'VendorID': 'Vendor'})
+        fig.update_layout(xaxis={'type': 'category'})
+        st.plotly_chart(fig, use_container_width=True)
+
+    st.markdown("### Flagged Trips")
+    filters = ghost_filters(src, vendors['VendorID'].tolist())
+    if filters is None:
+        return
+    where, params = filters
+    matching = query(f"SELECT COUNT(*) FROM {src} {where}", params)
+    if matching is None or matching.empty:
+        return
+    matching = int(matching.iloc[0, 0])
+    if matching == 0:
+        st.info("No flagged trips match these filters.")
+        return
+
+    col1, col2 = st.columns([1, 3])
+    page_size = col1.selectbox("Rows per page", GHOST_PAGE_SIZES, index=1)
+    pages = max(1, -(-matching // page_size))
+    page = col2.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, value=1, step=1)
+    offset = (int(page) - 1) * page_size
+
+    rows = query(f"""
+        SELECT * EXCLUDE (rule_mask) FROM {src} {where}
+        ORDER BY {GHOST_ORDER}
+        LIMIT {int(page_size)} OFFSET {offset}
+    """, params)
+    if rows is None:
+        return
+    st.caption(f"{matching:,} matching trips" + (f"; rows {offset + 1:,}-{offset + len(rows):,}" if len(rows) else ""))
+    st.dataframe(rows, use_container_width=True, hide_index=True)
+
 # ============================================================================
 # MAIN APP
 # ============================================================================
 
 def main():
     st.sidebar.title("Navigation")
-    tab = st.sidebar.radio("Go to", ["Summary", "The Map", "The Flow", "The Economics", "The Weather"])
-    
+    tab = st.sidebar.radio("Go to", ["Summary", "The Map", "The Flow", "The Economics", "The Weather", "Ghost Trips"])
+
     st.sidebar.markdown("---")
     st.sidebar.markdown("### Executive Stats")
-    
-    stats = DATA.get('stats', {})
+
+    stats = load_text(outputs_version()).get('stats', {})
     if stats:
         st.sidebar.metric("2025 Revenue", f"${stats.get('revenue_2025', 0):,.0f}")
         val = stats.get('q1_pct_change', 0)
         st.sidebar.metric("Q1 Volume Change", f"{val:.2f}%")
-        
-    audit = DATA.get('ghost')
-    if audit is not None:
-        st.sidebar.metric("Ghost Trips Flagged", f"{len(audit):,}")
+
+    # Answered from the Parquet footer, no rows are read
+    ghost = scan('ghost')
+    ghost_count = query(f"SELECT COUNT(*) FROM {ghost}") if ghost else None
+    if ghost_count is not None:
+        st.sidebar.metric("Ghost Trips Flagged", f"{int(ghost_count.iloc[0, 0]):,}")
 
     if tab == "Summary":
         st.title("🚖 NYC Congestion Pricing Audit")
         st.markdown("### Executive Summary")
         st.write("This dashboard analyzes the impact of the 2025 Congestion Pricing implemented Jan 5, 2025.")
-        
-        leakage = DATA.get('leakage')
+
+        src = scan('leakage')
+        leakage = query(f"SELECT * FROM {src} LIMIT 5") if src else None
         if leakage is not None:
             st.markdown("### 🚨 Leakage Alert")
             st.write("Top locations with missing surcharges:")
-            st.dataframe(leakage.head(5))
-            
+            st.dataframe(leakage)
+
         if stats:
             st.info(f"Total Estimated Revenue 2025: **${stats.get('revenue_2025', 0):,.2f}**")
-            
+
     elif tab == "The Map":
         tab_map()
     elif tab == "The Flow":
@@ -309,6 +451,8 @@ def main():
         tab_economics()
     elif tab == "The Weather":
         tab_weather()
+    elif tab == "Ghost Trips":
+        tab_ghost()
 
 if __name__ == "__main__":
     main()
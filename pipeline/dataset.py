@@ -0,0 +1,115 @@
+"""
+NYC Congestion Pricing Audit - Dataset Layer
+============================================
+Resolves (years, months, taxi types) to the exact list of monthly Parquet
+files before any query is built, so an analysis of Q1 opens five files per
+taxi type (Q1_SOURCE_MONTHS) instead of globbing a whole year and filtering
+`month(t)` after DuckDB has already read twelve footers.
+
+Two on-disk layouts are understood:
+
+- "tlc"  : the raw downloads, data_dir/{year}/{taxi}/{taxi}_tripdata_{yyyy}-{mm}.parquet
+- "hive" : WebScraping.py's unified output, unified/type={taxi}/year={yyyy}/month={m}/*.parquet
+           (already in the canonical schema)
+
+A resolved file is a *shard*; every incremental phase works shard by shard.
+An imputed month that is never written to disk is a shard too: `imputed`
+lists the source months it is sampled from (imputation.ImputeSource) and
+`path` is where the file would be.
+"""
+
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+from trip_schema import DUCKDB_TAXI_TYPE, duckdb_select
+
+Q1_MONTHS = (1, 2, 3)
+# Source files read for the Q1 analyses: Q1 plus a one-month margin, so trips
+# filed under a neighbouring month still count (a March 31 trip in the April
+# file; a Dec 31 trip dropped off on Jan 1, which month() counts as Q1)
+Q1_SOURCE_MONTHS = (*Q1_MONTHS, 4, 12)
+
+_TLC_FILE = re.compile(r"^(yellow|green)_tripdata_(\d{4})-(\d{2})\.parquet$")
+
+
+@dataclass(frozen=True)
+class Shard:
+    year: int
+    month: int
+    taxi: str
+    path: Path
+    hive: bool = False
+    imputed: tuple = ()
+
+    @property
+    def key(self):
+        return f"{self.taxi}_{self.year}-{self.month:02d}"
+
+    @property
+    def inputs(self):
+        """Files the shard's rows are read from."""
+        return tuple(Path(s.path) for s in self.imputed) or (self.path,)
+
+
+def _tlc_shards(data_dir, year, taxi, months):
+    directory = Path(data_dir) / str(year) / taxi
+    if not directory.is_dir():
+        return []
+    shards = []
+    for path in sorted(directory.glob("*.parquet")):
+        match = _TLC_FILE.match(path.name)
+        if not match or match.group(1) != taxi or int(match.group(2)) != int(year):
+            continue
+        month = int(match.group(3))
+        if months is None or month in months:
+            shards.append(Shard(int(year), month, taxi, path))
+    return shards
+
+
+def _hive_shards(data_dir, year, taxi, months):
+    directory = Path(data_dir) / f"type={taxi}" / f"year={year}"
+    if not directory.is_dir():
+        return []
+    shards = []
+    for month_dir in sorted(directory.glob("month=*")):
+        month = int(month_dir.name.split("=", 1)[1])
+        if months is None or month in months:
+            shards.extend(Shard(int(year), month, taxi, path, hive=True)
+                          for path in sorted(month_dir.glob("*.parquet")))
+    return shards
+
+
+def resolve_shards(data_dir, years, taxi_types, months=None, layout="tlc"):
+    """
+    Shards for every monthly file present for the given years and taxi types,
+    restricted to `months` (an iterable of month numbers) when given.
+    `months` may also be a dict {year: months} to prune each year differently.
+    """
+    find = _hive_shards if layout == "hive" else _tlc_shards
+    shards = []
+    for year in years:
+        year_months = months.get(year) if isinstance(months, dict) else months
+        year_months = None if year_months is None else set(year_months)
+        for taxi in taxi_types:
+            shards.extend(find(data_dir, year, taxi, year_months))
+    return shards
+
+
+def files_sql(shards):
+    """SQL list literal of the shards' paths, e.g. for read_parquet([...])."""
+    return "[" + ", ".join(f"'{s.path.as_posix()}'" for s in shards) + "]"
+
+
+def bytes_on_disk(shards):
+    return sum(path.stat().st_size for s in shards for path in s.inputs)
+
+
+def shard_source_sql(conn, shard):
+    """SELECT over one shard's file, mapped onto the canonical schema."""
+    path = shard.path.as_posix()
+    if shard.hive:
+        return (f"SELECT VendorID, '{shard.taxi}'::{DUCKDB_TAXI_TYPE} as type, * EXCLUDE (VendorID) "
+                f"FROM read_parquet('{path}')")
+    available = {row[0] for row in conn.execute(f"DESCRIBE SELECT * FROM read_parquet('{path}')").fetchall()}
+    return f"SELECT {duckdb_select(shard.taxi, available=available)} FROM read_parquet('{path}')"
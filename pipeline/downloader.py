@@ -0,0 +1,231 @@
+"""
+NYC Congestion Pricing Audit - TLC Downloader
+=============================================
+Concurrent, resumable downloader shared by pipeline.py and WebScraping.py.
+
+- One pooled requests.Session for every worker (keep-alive, retries).
+- Bounded thread pool so ~50 monthly files download side by side.
+- Partial downloads land in `<name>.part` and are resumed with HTTP Range.
+- Completed files are atomically renamed into place, so readers never see
+  a half-written Parquet file.
+- With a Manifest (manifest.py), existing files are revalidated with
+  conditional requests instead of being trusted on size alone.
+
+The source host is configurable (TLC_BASE_URL env var or `base_url=`), so the
+whole module can be pointed at a local `http.server` serving fixture files;
+benchmarks/check_downloader.py does exactly that.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+TLC_BASE_URL = os.environ.get("TLC_BASE_URL", "https://d37ci6vzurychx.cloudfront.net/trip-data")
+ZONE_LOOKUP_URL = os.environ.get(
+    "TLC_ZONE_LOOKUP_URL", "https://d37ci6vzurychx.cloudfront.net/misc/taxi+_zone_lookup.csv"
+)
+
+DEFAULT_WORKERS = int(os.environ.get("TLC_DOWNLOAD_WORKERS", "6"))
+DEFAULT_CHUNK_SIZE = int(os.environ.get("TLC_DOWNLOAD_CHUNK_KB", "1024")) * 1024
+DEFAULT_TIMEOUT = 60  # Seconds (connect/read), not total transfer time
+
+PART_SUFFIX = ".part"
+
+
+# ============================================================================
+# HELPERS
+# ============================================================================
+
+def tlc_file_name(taxi, year, month):
+    """TLC naming convention, e.g. yellow_tripdata_2025-01.parquet."""
+    return f"{taxi}_tripdata_{year}-{month:02d}.parquet"
+
+
+def tlc_url(taxi, year, month, base_url=None):
+    return f"{(base_url or TLC_BASE_URL).rstrip('/')}/{tlc_file_name(taxi, year, month)}"
+
+
+def make_session(pool_size=DEFAULT_WORKERS):
+    """A Session whose connection pool is large enough for every worker."""
+    # requests is imported here, so loading this module (e.g. for tlc_file_name) stays cheap
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    retry = Retry(
+        total=3,
+        backoff_factor=1.0,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "HEAD"]),
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _part_path(dest_path: Path) -> Path:
+    return dest_path.with_name(dest_path.name + PART_SUFFIX)
+
+
+# ============================================================================
+# DOWNLOADING
+# ============================================================================
+
+def _adopt(url, dest_path, session, manifest, timeout):
+    """
+    Brings a file downloaded before the manifest existed under its control.
+    One HEAD request; the file is trusted only if its size matches Content-Length.
+    """
+    response = session.head(url, allow_redirects=True, timeout=timeout)
+    response.raise_for_status()
+    expected = response.headers.get("Content-Length")
+    if expected is not None and int(expected) != dest_path.stat().st_size:
+        print(f"  -> {dest_path.name} is truncated ({dest_path.stat().st_size:,} of {int(expected):,} B); re-downloading.")
+        return False
+    manifest.record(
+        dest_path, url,
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+    )
+    # Adopting an existing file is not a content change.
+    manifest.changed.discard(manifest.key(dest_path))
+    return True
+
+
+def download_file(url, dest_path, session=None, chunk_size=DEFAULT_CHUNK_SIZE, timeout=DEFAULT_TIMEOUT, manifest=None):
+    """
+    Downloads `url` to `dest_path`, resuming an existing `.part` file if present.
+    Returns True when the file is in place, False on failure (the .part file is
+    kept so the next run can resume it).
+
+    With a `manifest`, an existing file is revalidated with a conditional request
+    (If-None-Match / If-Modified-Since) instead of being trusted blindly: a 304
+    costs one round trip, a 200 replaces the file and marks it as changed.
+    An imputed stand-in (see imputation.py) is requested in full on every call.
+    """
+    dest_path = Path(dest_path)
+    dest_path.parent.mkdir(parents=True, exist_ok=True)
+    part_path = _part_path(dest_path)
+    own_session = session is None
+    session = session or make_session(1)
+
+    try:
+        headers = {}
+        if dest_path.exists():
+            if manifest is None:
+                if dest_path.stat().st_size > 1024:
+                    return True
+            elif manifest.is_imputed(dest_path):
+                # Stand-in for a month the TLC had not published: try again,
+                # keeping the imputed file unless the download succeeds
+                pass
+            elif manifest.is_intact(dest_path):
+                headers = manifest.conditional_headers(dest_path)
+                if not headers:
+                    return True
+            elif manifest.get(dest_path) is None:
+                if _adopt(url, dest_path, session, manifest, timeout):
+                    return True
+            else:
+                print(f"  -> {dest_path.name} does not match the manifest; re-downloading.")
+
+        revalidating = bool(headers)
+        offset = part_path.stat().st_size if part_path.exists() and not revalidating else 0
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            validator = manifest.get_partial(dest_path) if manifest else None
+            if validator:
+                # Only resume if the remote file is still the one the .part came from.
+                headers["If-Range"] = validator
+
+        if not revalidating:
+            print(f"Downloading {url} -> {dest_path.name}" + (f" (resuming at {offset:,} B)" if offset else ""))
+        with session.get(url, stream=True, headers=headers, timeout=timeout) as response:
+            if response.status_code == 304:
+                manifest.mark_checked(dest_path)
+                return True
+
+            if response.status_code == 416:
+                # Range not satisfiable: the .part file is stale or already complete
+                # for a file that changed upstream. Start over.
+                part_path.unlink(missing_ok=True)
+                return download_file(url, dest_path, session, chunk_size, timeout, manifest)
+
+            response.raise_for_status()
+            if revalidating:
+                print(f"  -> {dest_path.name} changed upstream; re-downloading.")
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if manifest is not None and response.status_code != 206:
+                manifest.set_partial(dest_path, etag or last_modified)
+
+            # 206 honours our Range header; a plain 200 means the server sent the
+            # whole body, so the .part file must be rewritten from scratch.
+            mode = "ab" if response.status_code == 206 else "wb"
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    if chunk:
+                        f.write(chunk)
+
+        os.replace(part_path, dest_path)
+        if manifest is not None:
+            manifest.record(dest_path, url, etag=etag, last_modified=last_modified)
+        print(f"  -> Downloaded {dest_path.name} ({dest_path.stat().st_size / 1e6:,.1f} MB)")
+        return True
+    except Exception as e:
+        print(f"  -> Failed to download {url}: {e}")
+        return False
+    finally:
+        if own_session:
+            session.close()
+
+
+def download_many(jobs, workers=DEFAULT_WORKERS, chunk_size=DEFAULT_CHUNK_SIZE, session=None, manifest=None):
+    """
+    Downloads a list of (url, dest_path) jobs on a bounded thread pool sharing
+    one pooled Session. Returns {dest_path: success}. The manifest, if given,
+    is saved once all jobs have finished.
+    """
+    jobs = [(url, Path(dest)) for url, dest in jobs]
+    if not jobs:
+        return {}
+
+    workers = max(1, min(workers, len(jobs)))
+    own_session = session is None
+    session = session or make_session(workers)
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tlc-dl") as pool:
+            futures = {
+                pool.submit(download_file, url, dest, session, chunk_size, DEFAULT_TIMEOUT, manifest): dest
+                for url, dest in jobs
+            }
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+    finally:
+        if own_session:
+            session.close()
+        if manifest is not None:
+            manifest.save()
+
+    failed = sum(1 for ok in results.values() if not ok)
+    print(f"  -> {len(results) - failed}/{len(results)} files available ({failed} failed).")
+    if manifest is not None:
+        print(f"  -> {len(manifest.changed)} file(s) new or changed since the last run.")
+    return results
+
+
+def tlc_jobs(requirements, data_dir, base_url=None):
+    """Turns (year, month, taxi) tuples into download jobs under data_dir/{year}/{taxi}/."""
+    data_dir = Path(data_dir)
+    return [
+        (tlc_url(taxi, year, month, base_url), data_dir / str(year) / taxi / tlc_file_name(taxi, year, month))
+        for year, month, taxi in requirements
+    ]
@@ -5,6 +5,7 @@ Generates Medium & LinkedIn content from audit findings.
 """
 
 import json
+import os
 from datetime import datetime
 
 # ============================================================================
@@ -455,7 +456,6 @@ Don't, and it gets dismantled in 3-5 years."
 
 
 if __name__ == "__main__":
-    import os
     generate_blog_files()
     print("\n✅ All blog content generated!")
     print("\nNext steps:")
@@ -11,9 +11,30 @@ import json
 import os
 import pandas as pd
 
+from ghost_rules import active_rules
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 OUTPUT_DIR = os.path.join(BASE_DIR, "output")
 PDF_FILE = os.path.join(OUTPUT_DIR, "audit_report.pdf")
+AUDIT_FILE = os.path.join(OUTPUT_DIR, "ghost_trip_audit.parquet")
+
+def load_audit_summary():
+    """
+    Ghost-trip totals straight from the audit Parquet file. Only the
+    rule_mask and VendorID columns are read; a trip counts towards every
+    rule it hits.
+    """
+    if not os.path.exists(AUDIT_FILE):
+        return None
+    audit = pd.read_parquet(AUDIT_FILE, columns=['rule_mask', 'VendorID'])
+    top_vendors = audit['VendorID'].value_counts().head(5)
+    return {
+        'ghost_count': len(audit),
+        'ghost_rule_counts': {
+            rule.name: int(((audit['rule_mask'] & bit) != 0).sum()) for bit, rule in active_rules()
+        },
+        'suspicious_vendors': [[int(v), int(n)] for v, n in top_vendors.items()],
+    }
 
 def generate_pdf():
     print(f"Generating {PDF_FILE}...")
@@ -24,6 +45,9 @@ def generate_pdf():
         with open(f"{OUTPUT_DIR}/impact_stats.json", 'r') as f:
             stats = json.load(f)
             
+    audit_summary = load_audit_summary()
+    if audit_summary:
+        stats.update(audit_summary)
     ghost_count = stats.get('ghost_count', 0)
         
     elasticity_text = "N/A"
@@ -56,6 +80,9 @@ def generate_pdf():
     
     c.drawString(70, y, f"Total Suspicious 'Ghost Trips' Detected: {ghost_count}")
     y -= 25
+    for rule, count in stats.get('ghost_rule_counts', {}).items():
+        c.drawString(90, y, f"{rule}: {count:,}")
+        y -= 20
     
     vol_change = stats.get('q1_pct_change', 0)
     c.drawString(70, y, f"Q1 Volume Change (Yellow/Green): {vol_change:.2f}%")
@@ -0,0 +1,158 @@
+"""
+NYC Congestion Pricing Audit - Ghost Trip Rules
+===============================================
+Declarative registry of ghost-trip rules. Each rule is a SQL boolean
+expression over the canonical trip columns plus a few derived columns that
+are computed once per row:
+
+- duration_min : date_diff('minute', pickup_time, dropoff_time)
+- speed_mph    : trip_distance / hours (0 for non-positive durations)
+- ghost_speed  : trip_distance / hours with the duration floored at 0.1 min
+- dup_count    : identical trips (same vendor, times, zones and amounts);
+                 only computed when an enabled rule uses it. The audit runs
+                 per month, so copies in different months are not matched,
+                 and the window partitions every month on the full key.
+
+`compile_audit_query` turns the registry into ONE scan that emits a
+`rule_mask` bitmask of every rule a trip hits, plus `fraud_flag` (the first
+matching rule in registry order, as before). Adding a rule adds a bit and an
+expression, never another pass over the data.
+
+The original three rules (Impossible Physics, Teleporter, Stationary Ride)
+are the published audit. Negative Fare, Time Travel and Duplicate Trip are
+off unless AUDIT_GHOST_EXTENDED_RULES=1. They flag about 40% more trips on
+the synthetic benchmark data (1,791 -> 2,551 for one 2025 sample), which
+changes the vendor ranking, the report, the dashboard and every figure
+built on them.
+"""
+
+import os
+from dataclasses import dataclass
+
+# Ghost Trip Thresholds
+GHOST_SPEED_LIMIT = 65.0  # MPH
+GHOST_I_TELEPORTER_TIME = 1.0  # Minutes
+GHOST_I_TELEPORTER_FARE = 20.0  # Dollars
+GHOST_I_STATIONARY_DIST = 0.0  # Miles
+
+# Negative Fare, Time Travel and Duplicate Trip (see above)
+EXTENDED_RULES = os.environ.get("AUDIT_GHOST_EXTENDED_RULES", "0") == "1"
+
+DUPLICATE_KEY = "VendorID, pickup_time, dropoff_time, pickup_loc, dropoff_loc, fare, total_amount"
+
+
+@dataclass(frozen=True)
+class GhostRule:
+    name: str
+    condition: str
+    description: str = ""
+    enabled: bool = True
+
+    @property
+    def uses_duplicates(self):
+        return "dup_count" in self.condition
+
+
+GHOST_RULES = [
+    GhostRule(
+        "Impossible Physics",
+        f"ghost_speed > {GHOST_SPEED_LIMIT}",
+        f"Average speed above {GHOST_SPEED_LIMIT:g} MPH",
+    ),
+    GhostRule(
+        "Teleporter",
+        f"duration_min < {GHOST_I_TELEPORTER_TIME} AND fare > {GHOST_I_TELEPORTER_FARE}",
+        f"Under {GHOST_I_TELEPORTER_TIME:g} minute but over ${GHOST_I_TELEPORTER_FARE:g}",
+    ),
+    GhostRule(
+        "Stationary Ride",
+        f"trip_distance = {GHOST_I_STATIONARY_DIST} AND fare > 0",
+        "Zero distance but a positive fare",
+    ),
+    GhostRule(
+        "Negative Fare",
+        "fare < 0 OR total_amount < 0",
+        "Negative fare or total amount",
+        enabled=EXTENDED_RULES,
+    ),
+    GhostRule(
+        "Time Travel",
+        "dropoff_time < pickup_time",
+        "Drop-off recorded before pick-up",
+        enabled=EXTENDED_RULES,
+    ),
+    GhostRule(
+        "Duplicate Trip",
+        "dup_count > 1",
+        "Same vendor, timestamps, zones and amounts as another trip in the same month",
+        enabled=EXTENDED_RULES,
+    ),
+]
+
+
+def active_rules(rules=None):
+    """Enabled rules with their bit values: [(bit, rule)]. Bits follow registry order."""
+    rules = GHOST_RULES if rules is None else rules
+    return [(1 << i, rule) for i, rule in enumerate(rules) if rule.enabled]
+
+
+def compile_audit_query(source, rules=None):
+    """
+    SELECT statement over `source` (a table/view name) returning every trip
+    that hits at least one rule, with duration_min, speed_mph, rule_mask and
+    fraud_flag appended.
+    """
+    rules = active_rules(rules)
+    if not rules:
+        raise ValueError("No ghost-trip rules are enabled.")
+    if len(rules) > 16 or max(bit for bit, _ in rules) >= 1 << 16:
+        raise ValueError("rule_mask is a USMALLINT; at most 16 rules are supported.")
+
+    duplicates = any(rule.uses_duplicates for _, rule in rules)
+    dup_col = f",\n            COUNT(*) OVER (PARTITION BY {DUPLICATE_KEY}) as dup_count" if duplicates else ""
+    helper_cols = "ghost_speed, dup_count" if duplicates else "ghost_speed"
+
+    mask = "\n            | ".join(f"(CASE WHEN {rule.condition} THEN {bit} ELSE 0 END)" for bit, rule in rules)
+    flag = "\n            ".join(f"WHEN rule_mask & {bit} <> 0 THEN '{rule.name}'" for bit, rule in rules)
+
+    return f"""
+    WITH timed AS (
+        SELECT
+            *,
+            date_diff('minute', pickup_time, dropoff_time) as duration_min{dup_col}
+        FROM {source}
+    ),
+    scored AS (
+        SELECT
+            *,
+            CASE
+                WHEN duration_min <= 0 THEN 0
+                ELSE (trip_distance / (duration_min / 60.0))
+            END as speed_mph,
+            (trip_distance / (GREATEST(duration_min, 0.1) / 60.0)) as ghost_speed
+        FROM timed
+    ),
+    masked AS (
+        SELECT
+            * EXCLUDE ({helper_cols}),
+            CAST(
+            {mask}
+            AS USMALLINT) as rule_mask
+        FROM scored
+    )
+    SELECT
+        *,
+        CASE
+            {flag}
+        END as fraud_flag
+    FROM masked
+    WHERE rule_mask <> 0
+    """
+
+
+def rule_count_columns(rules=None):
+    """SELECT-list aggregates counting, per rule, the flagged trips that hit it."""
+    return ",\n        ".join(
+        f"COUNT(*) FILTER (WHERE rule_mask & {bit} <> 0) as \"{rule.name}\""
+        for bit, rule in active_rules(rules)
+    )
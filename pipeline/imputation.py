@@ -0,0 +1,328 @@
+"""
+NYC Congestion Pricing Audit - Seeded Imputation
+================================================
+Builds a missing (year, month, taxi) from the same month of earlier years:
+each source file contributes a share of its trips, moved forward in time.
+
+Sampling is a seeded hash of the row's position in its source file,
+
+    hash(file_row_number, seed, years_back) % 1_000_000 < rate * 1_000_000
+
+instead of random(), so:
+
+- the imputed month is the same on every run (same seed, same sources, same
+  DuckDB version) and downstream numbers stop moving between rebuilds;
+- whether a row is kept depends on that row alone, so the month can be
+  written in independent row-range chunks, in parallel, and the union is the
+  same rows as a single pass;
+- the sampled rows can be read straight into the trip cube and the audit
+  (a "virtual" shard, see dataset.Shard.imputed) without ever writing the
+  imputed trips to disk.
+
+Blending (plan_imputation): the available source years are weighted by
+`years_back` (e.g. {1: 0.7, 2: 0.3}, renormalized over the years actually
+on disk). With trend scaling, each rate is also multiplied by the target
+year's volume over the source year's, measured on the months both have.
+
+Time shift: "calendar" adds whole years (a Sunday may become a Monday);
+"weekday" maps every target day to a source day of the same weekday, whole
+weeks apart, so weekends land on weekends. A source day may then feed two
+target days (months rarely start on the same weekday) and one near the
+month's edge may feed none.
+
+Every imputed row has is_imputed = true (trip_schema.IMPUTED_COLUMN).
+"""
+
+import calendar
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+
+import duckdb
+
+from incremental import file_fingerprint, logic_fingerprint
+from trip_schema import IMPUTED_COLUMN, duckdb_select
+
+IMPUTE_PHASE = "impute"
+SAMPLE_BUCKETS = 1_000_000
+ALIGN_CALENDAR, ALIGN_WEEKDAY = "calendar", "weekday"
+
+# TLC timestamp columns per taxi type
+TIME_COLUMNS = {
+    'yellow': ('tpep_pickup_datetime', 'tpep_dropoff_datetime'),
+    'green': ('lpep_pickup_datetime', 'lpep_dropoff_datetime'),
+}
+
+
+@dataclass(frozen=True)
+class ImputeSource:
+    """One earlier month feeding an imputed month."""
+    path: Path
+    year: int
+    month: int
+    years_back: int
+    rate: float
+    seed: int
+    align: str = ALIGN_CALENDAR
+
+
+@dataclass(frozen=True)
+class ImputeTarget:
+    """A missing month and the sources it is sampled from."""
+    year: int
+    month: int
+    taxi: str
+    path: Path
+    sources: tuple
+
+    @property
+    def key(self):
+        return f"{self.taxi}_{self.year}-{self.month:02d}"
+
+
+def parse_weights(text):
+    """'1:0.7,2:0.3' -> {1: 0.7, 2: 0.3} (years back -> weight)."""
+    weights = {}
+    for item in str(text).split(","):
+        if item.strip():
+            years_back, weight = item.split(":")
+            weights[int(years_back)] = float(weight)
+    if not weights or any(y < 1 or w < 0 for y, w in weights.items()) or not sum(weights.values()):
+        raise ValueError(f"Not an imputation weighting: {text!r}")
+    return weights
+
+
+# ============================================================================
+# PLANNING
+# ============================================================================
+
+def trend_factor(downloaded, taxi, source_year, target_year):
+    """Target-year over source-year trips, on the months both years have (1.0 if none)."""
+    common = [m for (y, m, t) in downloaded if y == target_year and t == taxi
+              and (source_year, m, taxi) in downloaded]
+    source_rows = sum(downloaded[(source_year, m, taxi)] or 0 for m in common)
+    target_rows = sum(downloaded[(target_year, m, taxi)] or 0 for m in common)
+    return target_rows / source_rows if source_rows else 1.0
+
+
+def plan_imputation(missing, downloaded, path_for, weights, seed, trend=False, align=ALIGN_CALENDAR):
+    """
+    ImputeTargets for the `missing` (year, month, taxi) months, plus the
+    months that have no source on disk. `downloaded` maps every real TLC month
+    available as a source to its row count (only read with `trend`), and
+    `path_for(year, month, taxi)` gives a month's file.
+    """
+    targets, unplanned = [], []
+    for year, month, taxi in missing:
+        candidates = [(years_back, weight) for years_back, weight in sorted(weights.items())
+                      if weight > 0 and (year - years_back, month, taxi) in downloaded]
+        if not candidates:
+            unplanned.append((year, month, taxi))
+            continue
+        total = sum(weight for _, weight in candidates)
+        sources = []
+        for years_back, weight in candidates:
+            rate = weight / total
+            if trend:
+                rate *= trend_factor(downloaded, taxi, year - years_back, year)
+            # The sampler keeps each row at most once
+            rate = round(min(rate, 1.0), 6)
+            sources.append(ImputeSource(Path(path_for(year - years_back, month, taxi)), year - years_back,
+                                        month, years_back, rate, seed, align))
+        targets.append(ImputeTarget(year, month, taxi, Path(path_for(year, month, taxi)), tuple(sources)))
+    return targets, unplanned
+
+
+def imputation_fingerprint(sources, manifest=None):
+    """Changes when a source file, the blending settings or the DuckDB hash function change."""
+    return logic_fingerprint(
+        duckdb.__version__,
+        *(f"{file_fingerprint(s.path, manifest)}:{s.year}-{s.month}:{s.years_back}:{s.rate}:{s.seed}:{s.align}"
+          for s in sources),
+    )
+
+
+# ============================================================================
+# SAMPLING SQL
+# ============================================================================
+
+def _month_bounds(year, month):
+    start = date(year, month, 1)
+    return start, start + timedelta(days=calendar.monthrange(year, month)[1])
+
+
+def day_offsets(source):
+    """
+    Weekday alignment: for each day of the source month, the day shifts to
+    the target days it feeds (a multiple of 7, so weekdays are kept).
+    """
+    start, end = _month_bounds(source.year, source.month)
+    target_start, target_end = _month_bounds(source.year + source.years_back, source.month)
+    weeks = round((target_start - start).days / 7)
+    offsets = [[] for _ in range((end - start).days)]
+    day = target_start
+    while day < target_end:
+        src = day - timedelta(weeks=weeks)
+        while src < start:
+            src += timedelta(weeks=1)
+        while src >= end:
+            src -= timedelta(weeks=1)
+        offsets[src.day - 1].append((day - src).days)
+        day += timedelta(days=1)
+    return offsets
+
+
+def sample_predicate(source):
+    """WHERE condition keeping `source.rate` of the file's rows, chosen by a seeded row hash."""
+    threshold = int(round(source.rate * SAMPLE_BUCKETS))
+    return f"hash(file_row_number, {int(source.seed)}, {int(source.years_back)}) % {SAMPLE_BUCKETS} < {threshold}"
+
+
+def _sampled(source, taxi, select, row_range=None):
+    """`select` over the sampled rows of one source file; weekday alignment adds a _shift (days) column."""
+    pickup = TIME_COLUMNS[taxi][0]
+    where = sample_predicate(source)
+    if row_range is not None:
+        where += f" AND file_row_number >= {int(row_range[0])} AND file_row_number < {int(row_range[1])}"
+    if source.align == ALIGN_WEEKDAY:
+        start, end = _month_bounds(source.year, source.month)
+        # Trips stamped outside the source month have no target day
+        where += f" AND {pickup} >= DATE '{start}' AND {pickup} < DATE '{end}'"
+        select += f", unnest({day_offsets(source)}[day({pickup})]) AS _shift"
+    return f"SELECT {select} FROM read_parquet('{Path(source.path).as_posix()}', file_row_number=true) WHERE {where}"
+
+
+def _shifted(source, column):
+    if source.align == ALIGN_WEEKDAY:
+        return f"{column} + to_days(CAST(_shift AS INTEGER)) AS {column}"
+    return f"{column} + INTERVAL {int(source.years_back)} YEAR AS {column}"
+
+
+def raw_sample_sql(source, taxi, row_range=None):
+    """Sampled, time-shifted rows of one source month, in its original TLC columns plus the flag."""
+    pickup, dropoff = TIME_COLUMNS[taxi]
+    excluded = "file_row_number, _shift" if source.align == ALIGN_WEEKDAY else "file_row_number"
+    return (f"SELECT * EXCLUDE ({excluded}) REPLACE ({_shifted(source, pickup)}, {_shifted(source, dropoff)}), "
+            f"true AS {IMPUTED_COLUMN} FROM ({_sampled(source, taxi, '*', row_range)})")
+
+
+def canonical_sample_sql(conn, sources, taxi):
+    """The imputed month in the canonical schema, read from its sources (nothing on disk)."""
+    parts = []
+    for source in sources:
+        path = Path(source.path).as_posix()
+        available = {row[0] for row in conn.execute(f"DESCRIBE SELECT * FROM read_parquet('{path}')").fetchall()}
+        excluded = "EXCLUDE (_shift) " if source.align == ALIGN_WEEKDAY else ""
+        parts.append(
+            f"SELECT * {excluded}REPLACE ({_shifted(source, 'pickup_time')}, {_shifted(source, 'dropoff_time')}, "
+            f"true AS {IMPUTED_COLUMN}) "
+            f"FROM ({_sampled(source, taxi, duckdb_select(taxi, available=available))})"
+        )
+    return "\nUNION ALL BY NAME\n".join(parts)
+
+
+# ============================================================================
+# WRITING
+# ============================================================================
+
+def _row_ranges(path, chunk_rows):
+    import pyarrow.parquet as pq
+    rows = pq.read_metadata(path).num_rows
+    return [(start, min(start + chunk_rows, rows)) for start in range(0, rows, chunk_rows)]
+
+
+def _write_chunk(connect, sql, out_path):
+    """Process-pool entry point: one row-range chunk on a fresh connection."""
+    conn = connect()
+    try:
+        conn.execute("SET preserve_insertion_order=true")
+        conn.execute(f"COPY ({sql}) TO '{Path(out_path).as_posix()}' (FORMAT PARQUET)")
+    finally:
+        conn.close()
+    return out_path
+
+
+def impute_file(conn, sources, taxi, target, chunk_rows=0, workers=1, connect=None):
+    """
+    Writes the imputed month to `target`, rows in source order. With
+    `chunk_rows`, each source is sampled in row ranges of that size written
+    to separate files (in a process pool when workers > 1 and `connect` is a
+    module-level connection factory) and concatenated at the end.
+    """
+    target = Path(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target.with_name(target.name + ".tmp")
+    conn.execute("SET preserve_insertion_order=true")
+    try:
+        if not chunk_rows:
+            union = "\nUNION ALL BY NAME\n".join(raw_sample_sql(s, taxi) for s in sources)
+            conn.execute(f"COPY ({union}) TO '{tmp_path.as_posix()}' (FORMAT PARQUET)")
+        else:
+            chunk_dir = target.with_name(target.name + ".chunks")
+            shutil.rmtree(chunk_dir, ignore_errors=True)
+            chunk_dir.mkdir(parents=True)
+            jobs, parts = [], []
+            for i, source in enumerate(sources):
+                files = []
+                for j, row_range in enumerate(_row_ranges(source.path, chunk_rows)):
+                    out = chunk_dir / f"{i:02d}-{j:05d}.parquet"
+                    jobs.append((raw_sample_sql(source, taxi, row_range), out))
+                    files.append(out)
+                parts.append(files)
+            if workers > 1 and connect is not None and len(jobs) > 1:
+                context = multiprocessing.get_context("spawn")
+                with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), mp_context=context) as pool:
+                    for job in [pool.submit(_write_chunk, connect, sql, out) for sql, out in jobs]:
+                        job.result()
+            else:
+                for sql, out in jobs:
+                    conn.execute(f"COPY ({sql}) TO '{out.as_posix()}' (FORMAT PARQUET)")
+            # One UNION branch per source, matched by name: sources may differ in
+            # column order or names (schema drift)
+            union = "\nUNION ALL BY NAME\n".join(
+                "SELECT * FROM read_parquet([" + ", ".join(f"'{f.as_posix()}'" for f in files) + "])"
+                for files in parts if files
+            )
+            conn.execute(f"COPY ({union}) TO '{tmp_path.as_posix()}' (FORMAT PARQUET)")
+            shutil.rmtree(chunk_dir, ignore_errors=True)
+        os.replace(tmp_path, target)
+    finally:
+        conn.execute("SET preserve_insertion_order=false")
+    return target
+
+
+def _impute_target(connect, target, chunk_rows):
+    """Process-pool entry point: one whole month on a fresh connection."""
+    conn = connect()
+    try:
+        return impute_file(conn, target.sources, target.taxi, target.path, chunk_rows)
+    finally:
+        conn.close()
+
+
+def impute_months(conn, targets, chunk_rows=0, workers=1, connect=None):
+    """
+    Writes every target month; returns {target.key: None, or the exception
+    it failed with}. With several months and workers > 1 the months run side
+    by side in a process pool (`connect` as in impute_file); a single month
+    uses the pool for its chunks instead.
+    """
+    results = {}
+    if workers > 1 and connect is not None and len(targets) > 1:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(targets)), mp_context=context) as pool:
+            futures = {pool.submit(_impute_target, connect, target, chunk_rows): target for target in targets}
+            for future in as_completed(futures):
+                results[futures[future].key] = future.exception()
+        return results
+    for target in targets:
+        try:
+            impute_file(conn, target.sources, target.taxi, target.path, chunk_rows, workers, connect)
+            results[target.key] = None
+        except Exception as e:
+            results[target.key] = e
+    return results
@@ -0,0 +1,161 @@
+"""
+NYC Congestion Pricing Audit - Incremental Shards & Watermarks
+==============================================================
+Every phase works month by month. A *shard* (dataset.Shard) is one monthly
+TLC file (year, month, taxi type); each phase writes one partial result per
+shard under `cache/partials/<phase>/` and merges the partials into its outputs.
+
+`cache/watermarks.json` records, per phase and shard, the fingerprint the
+partial was built from: the source file's manifest SHA-256 (or size/mtime if
+untracked) plus a hash of the phase's own logic. On a re-run only shards whose
+fingerprint changed are recomputed, so adding one month costs one month of
+scanning, and editing a phase's SQL invalidates that phase everywhere.
+
+Stale shards can be built in a process pool (`workers` > 1): each worker
+opens its own DuckDB connection, builds one shard and writes its partials;
+the phase then merges the partial files in shard order, exactly as when they
+are built one after another. Only the filesystem is shared, so the same
+layout works for workers on several machines with a common cache directory.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+WATERMARKS_NAME = "watermarks.json"
+PARTIALS_DIR_NAME = "partials"
+
+
+def file_fingerprint(path, manifest=None):
+    """Manifest SHA-256 when tracked, otherwise size and mtime."""
+    if manifest is not None:
+        sha = manifest.fingerprint(path)
+        if sha:
+            return sha
+    st = Path(path).stat()
+    return f"{st.st_size}:{int(st.st_mtime)}"
+
+
+def logic_fingerprint(*parts):
+    """Short hash of the SQL/config a phase uses, so logic changes invalidate partials."""
+    return hashlib.sha256("\n".join(str(p) for p in parts).encode()).hexdigest()[:16]
+
+
+class Watermarks:
+    """{phase: {shard_key: fingerprint}} persisted as JSON."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.data = {}
+        if self.path.exists():
+            try:
+                with open(self.path, "r") as f:
+                    self.data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"  -> WARNING: Ignoring unreadable watermarks {self.path}: {e}")
+
+    def get(self, phase, key):
+        return self.data.get(phase, {}).get(key)
+
+    def mark(self, phase, key, fingerprint):
+        self.data.setdefault(phase, {})[key] = fingerprint
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+class PartialStore:
+    """
+    Per-shard partial results of one phase: cache/partials/<phase>/<name>/<shard>.parquet.
+    A phase may write several named partials per shard (one per output).
+    """
+
+    def __init__(self, cache_dir, phase, watermarks, logic):
+        self.root = Path(cache_dir) / PARTIALS_DIR_NAME / phase
+        self.phase = phase
+        self.watermarks = watermarks
+        self.logic = logic
+
+    def path(self, name, shard):
+        return self.root / name / f"{shard.key}.parquet"
+
+    def fingerprint(self, shard, manifest=None):
+        files = "+".join(file_fingerprint(path, manifest) for path in shard.inputs)
+        if shard.imputed:
+            # Sampled from other months: their files plus the rates and seed
+            files = logic_fingerprint(files, *shard.imputed)
+        return f"{files}:{self.logic}"
+
+    def is_fresh(self, shard, names, manifest=None):
+        names = names(shard) if callable(names) else names
+        return (
+            self.watermarks.get(self.phase, shard.key) == self.fingerprint(shard, manifest)
+            and all(self.path(name, shard).exists() for name in names)
+        )
+
+    def outputs(self, shard, names):
+        outputs = {}
+        for name in (names(shard) if callable(names) else names):
+            out = self.path(name, shard)
+            out.parent.mkdir(parents=True, exist_ok=True)
+            outputs[name] = out
+        return outputs
+
+    def refresh(self, conn, shards, names, build, manifest=None, workers=1, connect=None):
+        """
+        Calls build(conn, shard, {name: out_path}) for every stale shard and
+        updates the watermarks. `names` may be a function of the shard when
+        different shards feed different outputs. With workers > 1, stale
+        shards are built in separate processes, each on its own connection
+        from `connect()`; `build` and `connect` must be module-level functions.
+        Returns the shards (re)built.
+        """
+        stale = [shard for shard in shards if not self.is_fresh(shard, names, manifest)]
+        built = []
+        try:
+            if workers > 1 and len(stale) > 1 and connect is not None:
+                # spawn: workers must not inherit the parent's DuckDB threads
+                context = multiprocessing.get_context("spawn")
+                with ProcessPoolExecutor(max_workers=min(workers, len(stale)), mp_context=context) as pool:
+                    jobs = [pool.submit(_build_shard, connect, build, shard, self.outputs(shard, names))
+                            for shard in stale]
+                    for shard, job in zip(stale, jobs):
+                        job.result()
+                        self.watermarks.mark(self.phase, shard.key, self.fingerprint(shard, manifest))
+                        built.append(shard)
+            else:
+                for shard in stale:
+                    build(conn, shard, self.outputs(shard, names))
+                    self.watermarks.mark(self.phase, shard.key, self.fingerprint(shard, manifest))
+                    built.append(shard)
+        finally:
+            # Keep the shards that did finish even if another one failed
+            self.watermarks.save()
+        mode = f" on {min(workers, len(stale))} workers" if workers > 1 and len(stale) > 1 and connect else ""
+        print(f"  -> {self.phase}: {len(built)} of {len(shards)} month(s) recomputed{mode}, "
+              f"{len(shards) - len(built)} reused.")
+        return built
+
+    def files(self, name, shards):
+        """SQL list literal of the existing partial files for `shards` (or None)."""
+        paths = [self.path(name, s).as_posix() for s in shards if self.path(name, s).exists()]
+        if not paths:
+            return None
+        return "[" + ", ".join(f"'{p}'" for p in paths) + "]"
+
+
+def _build_shard(connect, build, shard, outputs):
+    """Process-pool entry point: one shard on a fresh connection."""
+    conn = connect()
+    try:
+        build(conn, shard, outputs)
+    finally:
+        conn.close()
+    return shard.key
@@ -0,0 +1,177 @@
+"""
+NYC Congestion Pricing Audit - Download Manifest
+================================================
+`data_downloads/manifest.json` records, for every downloaded file:
+
+- size, ETag and Last-Modified (for conditional revalidation),
+- SHA-256 of the content and the Parquet footer row count,
+- when it was fetched / last revalidated.
+
+A file is only trusted when its on-disk size matches the manifest, and every
+run records which files changed (`last_run.changed`) so downstream phases can
+reprocess exactly those months.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+MANIFEST_NAME = "manifest.json"
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parquet_row_count(path):
+    """Row count from the Parquet footer (no data pages are read). None if unavailable."""
+    if not str(path).endswith(".parquet"):
+        return None
+    try:
+        import pyarrow.parquet as pq
+        return pq.read_metadata(path).num_rows
+    except Exception:
+        return None
+
+
+class Manifest:
+    """Thread-safe view of manifest.json; keys are paths relative to the data directory."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.root = self.path.parent
+        self.entries = {}
+        self.partials = {}
+        self.previous_run = {}
+        self.changed = set()
+        self._lock = threading.Lock()
+        if self.path.exists():
+            try:
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+                self.entries = data.get("files", {})
+                self.partials = data.get("partials", {})
+                self.previous_run = data.get("last_run", {})
+            except (OSError, ValueError) as e:
+                print(f"  -> WARNING: Ignoring unreadable manifest {self.path}: {e}")
+
+    @classmethod
+    def for_data_dir(cls, data_dir):
+        return cls(Path(data_dir) / MANIFEST_NAME)
+
+    def key(self, path):
+        path = Path(path).resolve()
+        try:
+            return path.relative_to(self.root.resolve()).as_posix()
+        except ValueError:
+            return path.as_posix()
+
+    def get(self, path):
+        with self._lock:
+            return self.entries.get(self.key(path))
+
+    def fingerprint(self, path):
+        """Content fingerprint of a tracked file (SHA-256), or None if untracked."""
+        entry = self.get(path)
+        return entry.get("sha256") if entry else None
+
+    def is_intact(self, path):
+        """True when the file exists and its size matches the recorded size."""
+        entry = self.get(path)
+        path = Path(path)
+        return bool(entry) and path.exists() and path.stat().st_size == entry.get("size")
+
+    def is_imputed(self, path):
+        """True when the file was written by imputation.py rather than downloaded."""
+        entry = self.get(path)
+        return bool(entry) and entry.get("source") == "imputed"
+
+    def conditional_headers(self, path):
+        entry = self.get(path) or {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def record(self, path, url=None, etag=None, last_modified=None, source="download"):
+        """Hashes a freshly written file and records it as changed in this run."""
+        path = Path(path)
+        entry = {
+            "url": url,
+            "source": source,
+            "size": path.stat().st_size,
+            "etag": etag,
+            "last_modified": last_modified,
+            "sha256": sha256_file(path),
+            "row_count": parquet_row_count(path),
+            "fetched_at": _now(),
+            "checked_at": _now(),
+        }
+        key = self.key(path)
+        with self._lock:
+            previous = self.entries.get(key)
+            self.entries[key] = entry
+            self.partials.pop(key, None)
+            if not previous or previous.get("sha256") != entry["sha256"]:
+                self.changed.add(key)
+        return entry
+
+    def mark_checked(self, path):
+        with self._lock:
+            entry = self.entries.get(self.key(path))
+            if entry:
+                entry["checked_at"] = _now()
+
+    def forget(self, path):
+        with self._lock:
+            key = self.key(path)
+            self.entries.pop(key, None)
+            self.partials.pop(key, None)
+
+    def set_partial(self, path, validator):
+        """Remembers the validator a .part file was started with (for If-Range)."""
+        with self._lock:
+            key = self.key(path)
+            if validator:
+                self.partials[key] = validator
+            else:
+                self.partials.pop(key, None)
+
+    def get_partial(self, path):
+        with self._lock:
+            return self.partials.get(self.key(path))
+
+    def changed_since(self, fingerprints):
+        """Keys whose current fingerprint differs from a {key: sha256} snapshot."""
+        with self._lock:
+            return sorted(
+                key for key, entry in self.entries.items()
+                if fingerprints.get(key) != entry.get("sha256")
+            )
+
+    def save(self):
+        with self._lock:
+            data = {
+                "files": dict(sorted(self.entries.items())),
+                "partials": self.partials,
+                "last_run": {"at": _now(), "changed": sorted(self.changed)},
+            }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
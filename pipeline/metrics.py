@@ -0,0 +1,204 @@
+"""
+NYC Congestion Pricing Audit - Run Metrics
+==========================================
+Structured timings for every phase and every SQL statement of a pipeline
+run, so regressions show up as numbers rather than a feeling that the run got
+slower when TLC volumes grew.
+
+- Phases (`with metrics.phase("audit"):`) record wall and CPU time (this
+  process plus any pool workers it waited for), peak RSS and the totals of
+  the queries run inside them.
+- Queries go through a ProfiledConnection, which turns on DuckDB's profiler
+  and keeps, per statement: wall and CPU time, rows scanned and produced,
+  bytes read from files, bytes spilled to the temp directory and the peak of
+  DuckDB's buffer pool.
+
+Bytes read come from the process's I/O counters (/proc/self/io) where they
+exist: DuckDB's own TOTAL_BYTES_READ only counts Parquet footers, not the
+column chunks a scan actually reads.
+
+Everything is written to output/run_metrics.json at the end of the run and,
+optionally, streamed as JSON lines while it happens.
+"""
+
+import json
+import os
+import platform
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+METRICS_NAME = "run_metrics.json"
+
+# DuckDB profiling metrics collected for each statement
+PROFILING_METRICS = (
+    "LATENCY", "CPU_TIME", "TOTAL_BYTES_READ", "CUMULATIVE_ROWS_SCANNED",
+    "OPERATOR_CARDINALITY", "SYSTEM_PEAK_TEMP_DIR_SIZE", "SYSTEM_PEAK_BUFFER_MEMORY",
+)
+# Root operators whose own cardinality is a row count, not the rows they wrote
+_SINK_OPERATORS = {"COPY_TO_FILE", "BATCH_COPY_TO_FILE", "CREATE_TABLE_AS", "BATCH_CREATE_TABLE_AS", "INSERT"}
+SQL_LABEL_CHARS = 160
+
+
+def peak_rss_bytes(who="self"):
+    """Peak resident set size of this process (or of its waited-for children)."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN)
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return usage.ru_maxrss if platform.system() == "Darwin" else usage.ru_maxrss * 1024
+
+
+def io_read_bytes():
+    """Bytes this process has read through read() calls so far, or None off Linux."""
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("rchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def cpu_seconds():
+    """CPU time of this process plus its finished children (process-pool workers)."""
+    if resource is None:
+        return time.process_time()
+    own, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def sql_label(sql):
+    """One-line, truncated form of a statement for the metrics file."""
+    label = " ".join(str(sql).split())
+    return label if len(label) <= SQL_LABEL_CHARS else label[:SQL_LABEL_CHARS - 3] + "..."
+
+
+def _rows_out(info):
+    children = info.get("children") or []
+    node = children[0] if children else None
+    while node is not None and node.get("operator_type") in _SINK_OPERATORS and node.get("children"):
+        node = node["children"][0]
+    return node.get("operator_cardinality") if node else None
+
+
+class ProfiledConnection:
+    """
+    Wraps a DuckDB connection so every execute() is profiled into `metrics`.
+    Anything else is passed through to the connection.
+    """
+
+    def __init__(self, conn, metrics):
+        self._conn = conn
+        self._metrics = metrics
+        conn.execute("PRAGMA enable_profiling='no_output'")
+        settings = json.dumps({name: "true" for name in PROFILING_METRICS})
+        conn.execute(f"SET custom_profiling_settings='{settings}'")
+
+    def execute(self, sql, *args, **kwargs):
+        io0, t0 = io_read_bytes(), time.perf_counter()
+        result = self._conn.execute(sql, *args, **kwargs)
+        wall = time.perf_counter() - t0
+        io1 = io_read_bytes()
+        try:
+            info = json.loads(self._conn.get_profiling_information(format="json"))
+        except Exception:
+            info = {}
+        # SET, CREATE VIEW, DESCRIBE, ... have no plan and report an error here
+        if "latency" in info:
+            self._metrics.record_query({
+                "sql": sql_label(sql),
+                "wall_s": round(wall, 6),
+                "cpu_s": round(info.get("cpu_time", 0.0), 6),
+                "rows_in": info.get("cumulative_rows_scanned"),
+                "rows_out": _rows_out(info),
+                "bytes_read": io1 - io0 if io0 is not None else info.get("total_bytes_read"),
+                "spill_bytes": info.get("system_peak_temp_dir_size"),
+                "peak_buffer_bytes": info.get("system_peak_buffer_memory"),
+            })
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class RunMetrics:
+    """Collects phase and query records for one run; see the module docstring."""
+
+    def __init__(self, jsonl_path=None):
+        self.started = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self.phases = []
+        self.queries = []
+        self.settings = {}
+        self._phase = None
+        self._t0 = time.perf_counter()
+        self._jsonl = open(jsonl_path, "a", encoding="utf-8") if jsonl_path else None
+
+    def attach(self, conn):
+        return ProfiledConnection(conn, self)
+
+    def _emit(self, kind, record):
+        if self._jsonl:
+            self._jsonl.write(json.dumps({"kind": kind, **record}, default=str) + "\n")
+            self._jsonl.flush()
+
+    def record_query(self, record):
+        record = {"phase": self._phase["name"] if self._phase else None, **record}
+        self.queries.append(record)
+        if self._phase:
+            self._phase["queries"] += 1
+            for key in ("rows_in", "rows_out", "bytes_read"):
+                self._phase[key] += record.get(key) or 0
+            self._phase["spill_bytes"] = max(self._phase["spill_bytes"], record.get("spill_bytes") or 0)
+        self._emit("query", record)
+
+    @contextmanager
+    def phase(self, name):
+        """Times a block of the run; queries executed inside are attributed to it."""
+        outer = self._phase
+        self._phase = {"name": name, "queries": 0, "rows_in": 0, "rows_out": 0,
+                       "bytes_read": 0, "spill_bytes": 0, "status": "ok"}
+        wall0, cpu0 = time.perf_counter(), cpu_seconds()
+        try:
+            yield self._phase
+        except BaseException:
+            self._phase["status"] = "error"
+            raise
+        finally:
+            record = self._phase
+            record["wall_s"] = round(time.perf_counter() - wall0, 6)
+            record["cpu_s"] = round(cpu_seconds() - cpu0, 6)
+            record["peak_rss_bytes"] = peak_rss_bytes()
+            record["peak_worker_rss_bytes"] = peak_rss_bytes("children")
+            self.phases.append(record)
+            self._phase = outer
+            self._emit("phase", record)
+
+    def summary(self):
+        return {
+            "started": self.started,
+            "wall_s": round(time.perf_counter() - self._t0, 6),
+            "cpu_s": round(cpu_seconds(), 6),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "settings": self.settings,
+            "phases": self.phases,
+            "queries": self.queries,
+        }
+
+    def write(self, path):
+        path = Path(path)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2, default=str)
+        os.replace(tmp_path, path)
+        if self._jsonl:
+            self._jsonl.close()
+            self._jsonl = None
+        return path
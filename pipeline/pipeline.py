@@ -17,34 +17,30 @@ Date: January 2026
 
 import os
 import sys
+import argparse
+import importlib
+import importlib.util
 import json
-import time
-import requests
 import duckdb
-from datetime import datetime, timedelta
 from pathlib import Path
 
-# --- Robust Imports ---
-try:
-    import pandas as pd
-    PANDAS_AVAILABLE = True
-except ImportError:
-    PANDAS_AVAILABLE = False
-    print("WARNING: Pandas not found. Some analysis steps will be skipped.")
-
-try:
-    import numpy as np
-    NUMPY_AVAILABLE = True
-except ImportError:
-    NUMPY_AVAILABLE = False
-    print("WARNING: Numpy not found.")
-
-try:
-    from scipy import stats
-    SCIPY_AVAILABLE = True
-except ImportError:
-    SCIPY_AVAILABLE = False
-    print("WARNING: Scipy not found. Regression analysis will be skipped.")
+from downloader import ZONE_LOOKUP_URL, download_file, download_many, tlc_file_name, tlc_jobs
+from manifest import Manifest, parquet_row_count
+from trip_schema import IMPUTED_COLUMN, duckdb_select
+from ghost_rules import active_rules, compile_audit_query, rule_count_columns
+from compaction import COMPACT_DIR_NAME, compact_shards
+from dataset import Q1_SOURCE_MONTHS, Shard, bytes_on_disk, resolve_shards, shard_source_sql
+from resources import detect_resources
+from metrics import METRICS_NAME, RunMetrics
+from imputation import (
+    IMPUTE_PHASE, canonical_sample_sql, impute_months, imputation_fingerprint, parse_weights, plan_imputation,
+)
+from incremental import PartialStore, Watermarks, WATERMARKS_NAME, file_fingerprint, logic_fingerprint
+from checkpoints import CHECKPOINTS_NAME, Checkpoints
+from selection import Selection, add_selection_args, apply_selection_args
+from trip_cube import CUBE_VIEW, CUBE_Q1_VIEW, create_cube_view, cube_query
+from zones import ZONE_LOOKUP_NAME, load_zones
+import catalog
 
 # ============================================================================
 # CONFIGURATION
@@ -55,66 +51,176 @@ BASE_DIR = Path(__file__).parent.parent
 DATA_DIR = BASE_DIR / "data_downloads"
 OUTPUT_DIR = BASE_DIR / "output"
 CACHE_DIR = BASE_DIR / "cache"
+CATALOG_PATH = CACHE_DIR / catalog.CATALOG_NAME
 
-# Ensure directories exist
-DATA_DIR.mkdir(exist_ok=True, parents=True)
-OUTPUT_DIR.mkdir(exist_ok=True, parents=True)
-CACHE_DIR.mkdir(exist_ok=True, parents=True)
+# Keep trips in a persistent DuckDB catalog (cache/audit.duckdb) between runs.
+# The catalog holds the raw downloads, so with AUDIT_COMPACT the phases read the
+# compacted files instead (see catalog_reads())
+PERSISTENT_CATALOG = os.environ.get("AUDIT_PERSISTENT_CATALOG", "0") == "1"
 
 # TLC Data Source
-TLC_BASE_URL = "https://d37ci6vzurychx.cloudfront.net/trip-data"
 TAXI_TYPES = ['yellow', 'green']
-
-# Congestion Zone: Manhattan South of 60th St
-CONGESTION_ZONE_IDS = (
-    4, 12, 13, 24, 41, 42, 43, 45, 48, 50, 68, 74, 75, 87, 88, 90, 100, 103,
-    104, 105, 107, 113, 114, 116, 120, 125, 127, 128, 137, 140, 142, 143, 144,
-    148, 151, 152, 153, 158, 161, 162, 163, 164, 166, 170, 186, 194, 202, 209,
-    211, 212, 213, 214, 216, 217, 224, 229, 230, 231, 232, 233, 234, 235, 236,
-    237, 238, 239, 240, 241, 242, 243, 244, 245, 246, 249, 250
-)
-
-# Ghost Trip Thresholds
-GHOST_SPEED_LIMIT = 65.0  # MPH
-GHOST_I_TELEPORTER_TIME = 1.0  # Minutes
-GHOST_I_TELEPORTER_FARE = 20.0  # Dollars
-GHOST_I_STATIONARY_DIST = 0.0  # Miles
+ANALYSIS_YEARS = [2024, 2025]
+# Source months read per year (None = all); 2024 only serves the Q1 comparisons
+ANALYSIS_MONTHS = {2024: Q1_SOURCE_MONTHS, 2025: None}
+# Years the ghost-trip audit covers
+AUDITED_YEARS = [2025]
+
+# Optional slice of the job (selection.py): AUDIT_YEARS, AUDIT_MONTHS,
+# AUDIT_TAXI_TYPES and AUDIT_PHASES, or --years/--months/--types/--phases.
+# Every phase narrows the constants above to it; unset means everything.
+SELECTION = Selection.from_env()
+
+# Required TLC months the TLC has not published (UNPUBLISHED_MONTHS) are
+# imputed from the same month of earlier years (imputation.py). A published
+# month that fails to download is left out with a warning, unless
+# AUDIT_IMPUTE_ANY=1 imputes it too (and the warning names it).
+# AUDIT_IMPUTE_WEIGHTS gives each year back its weight, renormalized over the
+# years on disk; AUDIT_IMPUTE_TREND=1 scales them by year-over-year volume;
+# AUDIT_IMPUTE_ALIGN is "calendar" (whole years, as published) or "weekday"
+# (weekends land on weekends).
+# Rows are chosen by a seeded hash, so every rebuild yields the same trips.
+# "rows" writes the months to data_downloads like downloads (several at once
+# with AUDIT_WORKERS, in chunks with AUDIT_IMPUTE_CHUNK_ROWS); "cube" never
+# writes them: the audit and the trip cube read the sampled sources directly.
+REQUIRED_MONTHS = {2025: range(1, 13), 2024: range(1, 13), 2023: [12]}  # 2023: imputation source only
+UNPUBLISHED_MONTHS = {(2025, 12)}  # (year, month)
+IMPUTE_ANY = os.environ.get("AUDIT_IMPUTE_ANY", "0") == "1"
+IMPUTE_MODE = os.environ.get("AUDIT_IMPUTE_MODE", "rows")
+IMPUTE_SEED = int(os.environ.get("AUDIT_IMPUTE_SEED", "2025"))
+IMPUTE_CHUNK_ROWS = int(os.environ.get("AUDIT_IMPUTE_CHUNK_ROWS", "0"))
+IMPUTE_WEIGHTS = parse_weights(os.environ.get("AUDIT_IMPUTE_WEIGHTS", "1:0.7,2:0.3"))
+IMPUTE_TREND = os.environ.get("AUDIT_IMPUTE_TREND", "0") == "1"
+IMPUTE_ALIGN = os.environ.get("AUDIT_IMPUTE_ALIGN", "calendar")
+# Leave imputed trips out of the ghost-trip audit (they are still counted in Phase 3/4)
+AUDIT_EXCLUDE_IMPUTED = os.environ.get("AUDIT_EXCLUDE_IMPUTED", "0") == "1"
+
+# Congestion surcharge start (first full week of enforcement)
+SURCHARGE_START_DATE = '2025-01-05'
+
+# Congestion Zone ids (CONGESTION_ZONE_IDS) and the zone dimension live in zones.py
+
+# Ghost Trip Thresholds and rules live in ghost_rules.py (GHOST_RULES registry)
+
+# Optional compaction: rewrite each month sorted by pickup time (data_downloads/compacted)
+# so time/zone filters skip row groups; every phase then reads the compacted files
+COMPACT_TRIPS = os.environ.get("AUDIT_COMPACT", "0") == "1"
+COMPACT_CLUSTER_BY_ZONE = os.environ.get("AUDIT_COMPACT_CLUSTER_ZONE", "0") == "1"
+COMPACT_ROW_GROUP_SIZE = int(os.environ.get("AUDIT_COMPACT_ROW_GROUP_SIZE", "100000"))
+
+# Per-month builds (audit partials, trip cube) can run in a process pool, each
+# worker on its own DuckDB connection; partials are merged in month order, so
+# results do not depend on the worker count. Ignored with the persistent
+# catalog, which only one process can open.
+SHARD_WORKERS = int(os.environ.get("AUDIT_WORKERS", "1"))
+# Threads per worker; by default the detected CPUs are shared out between workers
+WORKER_THREADS = os.environ.get("AUDIT_WORKER_THREADS")
+
+# DuckDB threads, memory limit and spill directory come from the container's
+# cgroup limits unless overridden (AUDIT_THREADS, AUDIT_MEMORY_LIMIT,
+# AUDIT_TEMP_DIR or the matching command-line flags); see resources.py
+SPILL_DIR_NAME = "duckdb_spill"
+_RESOURCES = None
+
+# Per-phase and per-query metrics (metrics.py) go to output/run_metrics.json;
+# set a path to also stream them as JSON lines while the run is going
+METRICS_JSONL = os.environ.get("AUDIT_METRICS_JSONL")
+_METRICS = None
+
+# Each phase leaves a checkpoint in cache/checkpoints.json (checkpoints.py);
+# --resume skips the phases already complete for the same data and settings.
+# Files each phase must write (under OUTPUT_DIR; phase_outputs adjusts the
+# list): a phase missing one is not checkpointed, and a checkpoint whose files
+# are gone is not skipped.
+PHASE_OUTPUTS = {
+    'audit': ['ghost_trip_audit.parquet', 'ghost_trip_audit.csv'],
+    'impact': ['impact_stats.json', 'leakage_analysis.csv', 'velocity_2024.csv', 'velocity_2025.csv',
+               'border_effect.csv'],
+    'weather': ['daily_trips_2025.csv', 'tips_economics.csv', 'elasticity.txt'],
+}
+# Settings that only change how fast a run goes, so a resumed run may change them
+# (or which phases it runs)
+RESUME_IGNORED_ENV = ("AUDIT_THREADS", "AUDIT_MEMORY_LIMIT", "AUDIT_TEMP_DIR", "AUDIT_WORKERS",
+                      "AUDIT_WORKER_THREADS", "AUDIT_IMPUTE_CHUNK_ROWS", "AUDIT_METRICS_JSONL", "AUDIT_PHASES")
+
+# Ghost Trip Audit Output (Parquet; the CSV export is opt-in)
+AUDIT_ROW_GROUP_SIZE = 100_000
+EXPORT_AUDIT_CSV = os.environ.get("AUDIT_EXPORT_CSV", "0") == "1"
 
 # Weather API
 CENTRAL_PARK_LAT = 40.7829
 CENTRAL_PARK_LON = -73.9654
+WEATHER_FILE_NAME = "weather_2025.csv"  # under CACHE_DIR
 
 
 # ============================================================================
 # HELPER FUNCTIONS
 # ============================================================================
 
-def download_file(url: str, dest_path: Path):
-    """Downloads a file if it doesn't exist, with progress printing."""
-    if dest_path.exists() and dest_path.stat().st_size > 1024:
-        return
+def ensure_dirs():
+    """Creates the data, output and cache directories (when a run starts, not on import)."""
+    for directory in (DATA_DIR, OUTPUT_DIR, CACHE_DIR):
+        directory.mkdir(exist_ok=True, parents=True)
 
-    print(f"Downloading {url} to {dest_path.name}...")
+def optional_import(name, warning):
+    """
+    An optional dependency, imported on first use so that loading this module
+    stays fast (pandas and scipy alone take most of a second); None, after
+    printing `warning`, when it is not installed.
+    """
     try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        with open(dest_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        print(f"  -> Downloaded {dest_path.name}")
-    except Exception as e:
-        print(f"  -> Failed to download {url}: {e}")
-        # Remove partial file
-        if dest_path.exists():
-            dest_path.unlink()
-
-def get_duckdb_conn():
-    """Creates a memory-optimized DuckDB connection."""
-    conn = duckdb.connect(database=':memory:')
-    conn.execute("SET memory_limit='4GB'")
-    conn.execute("SET threads=4")
+        return importlib.import_module(name)
+    except ImportError:
+        print(warning)
+        return None
+
+def duckdb_resources():
+    """The DuckDB resource settings for this process, detected once."""
+    global _RESOURCES
+    if _RESOURCES is None:
+        _RESOURCES = detect_resources(CACHE_DIR / SPILL_DIR_NAME)
+    return _RESOURCES
+
+def get_duckdb_conn(persistent=False):
+    """
+    Creates a DuckDB connection sized to the container (see resources.py);
+    in-memory unless `persistent`, in which case the on-disk catalog is opened.
+    """
+    database = str(CATALOG_PATH) if persistent else ':memory:'
+    conn = duckdb_resources().apply(duckdb.connect(database=database))
+    # Profile every statement while a run is being measured
+    return _METRICS.attach(conn) if _METRICS is not None else conn
+
+def get_worker_conn():
+    """In-memory connection for one process-pool worker building a single month."""
+    resources = duckdb_resources().split(SHARD_WORKERS)
+    conn = resources.apply(duckdb.connect())
+    if WORKER_THREADS:
+        conn.execute(f"SET threads={int(WORKER_THREADS)}")
     return conn
 
+def selected_taxi_types():
+    return SELECTION.filter_taxi_types(TAXI_TYPES)
+
+def analysis_years():
+    return SELECTION.filter_years(ANALYSIS_YEARS)
+
+def analysis_months():
+    return {year: SELECTION.narrow_months(ANALYSIS_MONTHS.get(year)) for year in analysis_years()}
+
+def audited_years():
+    return SELECTION.filter_years(AUDITED_YEARS)
+
+def catalog_reads():
+    """True when trips are read from the persistent catalog rather than month files."""
+    return PERSISTENT_CATALOG and not COMPACT_TRIPS
+
+def shard_workers():
+    """Keyword arguments for PartialStore.refresh: the pool, unless the catalog is in use."""
+    if PERSISTENT_CATALOG or SHARD_WORKERS <= 1:
+        return {}
+    return {'workers': SHARD_WORKERS, 'connect': get_worker_conn}
+
 # ============================================================================
 # PHASE 1: INGESTION & IMPUTATION
 # ============================================================================
@@ -122,206 +228,376 @@ def get_duckdb_conn():
 def ensure_data_available():
     """
     Ensures that Parquet files for Analysis are present.
-    Downloads missing files and Imputes December 2025 if missing.
+    Downloads missing or changed files and imputes the months the TLC has not
+    published (December 2025 at the time of writing).
+    Returns the download Manifest; `manifest.changed` lists the files that are
+    new or changed since the last run.
     """
     print("\\n[PHASE 1] Checking Data Availability...")
+    manifest = Manifest.for_data_dir(DATA_DIR)
     
     # 1. Zone Lookup (For Map)
-    lookup_ur = "https://d37ci6vzurychx.cloudfront.net/misc/taxi+_zone_lookup.csv"
-    download_file(lookup_ur, DATA_DIR / "taxi_zone_lookup.csv")
+    download_file(ZONE_LOOKUP_URL, DATA_DIR / ZONE_LOOKUP_NAME, manifest=manifest)
+
+    # 2. Standard Data (2025 and comparison year 2024, source 2023)
+    required_downloads = required_months()
+    download_many(tlc_jobs(required_downloads, DATA_DIR), manifest=manifest)
+    if SELECTION.active:
+        # A slice only fetched its own months: add the sources of any it must impute
+        missing = [key for key in required_downloads
+                   if imputable(key) and not is_downloaded(tlc_path(*key), manifest)]
+        sources = [key for key in imputation_sources(missing) if not tlc_path(*key).exists()]
+        if sources:
+            download_many(tlc_jobs(sources, DATA_DIR), manifest=manifest)
+
+    # Impute whatever could not be downloaded
+    print("  -> Checking for missing months (Imputation Step)...")
+    impute_missing_data(manifest)
+    manifest.save()
+    return manifest
+
+def required_months(selected=True):
+    """(year, month, taxi) for every TLC month the analysis (or only the selected slice) needs."""
+    keys = [(year, month, taxi) for year, months in REQUIRED_MONTHS.items() for month in months for taxi in TAXI_TYPES]
+    return [key for key in keys if SELECTION.keep(*key)] if selected else keys
+
+def imputation_sources(missing):
+    """Required months that the `missing` (year, month, taxi) months can be imputed from."""
+    candidates = {(year - back, month, taxi) for year, month, taxi in missing for back in IMPUTE_WEIGHTS}
+    return sorted(candidates & set(required_months(selected=False)))
+
+def tlc_path(year, month, taxi):
+    return DATA_DIR / str(year) / taxi / tlc_file_name(taxi, year, month)
+
+def imputable(key):
+    """Whether a missing (year, month, taxi) may be imputed: unpublished, or any with AUDIT_IMPUTE_ANY=1."""
+    return IMPUTE_ANY or tuple(key[:2]) in UNPUBLISHED_MONTHS
+
+def warn_failed_downloads(manifest):
+    """Names the published months that are not on disk as downloads; imputing them is opt-in."""
+    failed = [key for key in required_months()
+              if tuple(key[:2]) not in UNPUBLISHED_MONTHS and not is_downloaded(tlc_path(*key), manifest)]
+    if not failed:
+        return
+    names = ", ".join(tlc_file_name(taxi, year, month) for year, month, taxi in failed)
+    print("  -> " + "!" * 56)
+    if IMPUTE_ANY:
+        print(f"  -> WARNING: {len(failed)} published month(s) failed to download and are IMPUTED "
+              f"with synthetic trips (AUDIT_IMPUTE_ANY=1): {names}")
+    else:
+        stale = [tlc_file_name(taxi, year, month) for year, month, taxi in failed if tlc_path(year, month, taxi).exists()]
+        print(f"  -> WARNING: {len(failed)} published month(s) failed to download and are NOT imputed: {names}")
+        if stale:
+            print(f"  -> WARNING: still read from an earlier imputation: {', '.join(stale)}")
+        print("  -> Re-run to retry the downloads, or set AUDIT_IMPUTE_ANY=1 to impute them.")
+    print("  -> " + "!" * 56)
+
+def is_downloaded(path, manifest):
+    """True for a file that came from the TLC (or from an unknown origin), not from imputation."""
+    return Path(path).exists() and not (manifest is not None and manifest.is_imputed(path))
+
+def plan_missing(manifest):
+    """
+    (ImputeTargets, months without any source) for the required months that
+    were not downloaded, sampled from the downloaded months on disk.
+    """
+    missing = [key for key in required_months() if imputable(key) and not is_downloaded(tlc_path(*key), manifest)]
+    if not missing:
+        return [], []
+    years = {year for year, _, _ in missing}
+    source_years = sorted({year - back for year in years for back in IMPUTE_WEIGHTS} | years)
+    downloaded = {}
+    for shard in resolve_shards(DATA_DIR, source_years, selected_taxi_types()):
+        if is_downloaded(shard.path, manifest):
+            rows = None
+            if IMPUTE_TREND:  # Row counts only feed the trend
+                entry = manifest.get(shard.path) if manifest is not None else None
+                rows = (entry or {}).get("row_count") or parquet_row_count(shard.path)
+            downloaded[(shard.year, shard.month, shard.taxi)] = rows
+    return plan_imputation(missing, downloaded, tlc_path, IMPUTE_WEIGHTS, IMPUTE_SEED, IMPUTE_TREND, IMPUTE_ALIGN)
+
+def describe_sources(target):
+    return " + ".join(f"{s.year} ({s.rate:.0%})" for s in target.sources)
+
+def impute_missing_data(manifest=None):
+    """
+    Imputes every required month that could not be downloaded (see
+    imputation.py). A month is rewritten only when its sources or the
+    blending settings change; a real download is never replaced.
+    """
+    warn_failed_downloads(manifest)
+    targets, unplanned = plan_missing(manifest)
+    for year, month, taxi in unplanned:
+        print(f"  -> WARNING: {tlc_file_name(taxi, year, month)} is missing and has no source month to impute from.")
+    if not targets:
+        print("  -> No months to impute.")
+        return
+    if IMPUTE_MODE == "cube":
+        for target in targets:
+            print(f"  -> Cube-only imputation: {target.key} is sampled at query time from {describe_sources(target)}.")
+        return
 
-    # 2. Standard Data (Jan-Nov 2025 and comparison year 2024, source 2023)
-    required_downloads = []
-    
-    # 2025 Jan-Nov
-    for month in range(1, 12):
-        for taxi in TAXI_TYPES:
-            required_downloads.append((2025, month, taxi))
-            
-    # 2024 Full Year
-    for month in range(1, 13):
-        for taxi in TAXI_TYPES:
-            required_downloads.append((2024, month, taxi))
-
-    # 2023 Dec (Source)
-    for taxi in TAXI_TYPES:
-        required_downloads.append((2023, 12, taxi))
-
-    for year, month, taxi in required_downloads:
-        file_name = f"{taxi}_tripdata_{year}-{month:02d}.parquet"
-        url = f"{TLC_BASE_URL}/{file_name}"
-        dest_dir = DATA_DIR / str(year) / taxi
-        dest_dir.mkdir(parents=True, exist_ok=True)
-        download_file(url, dest_dir / file_name)
-
-    # Impute December 2025
-    print("  -> Checking for December 2025 Data (Imputation Step)...")
-    impute_december_data()
-
-def impute_december_data():
+    watermarks = Watermarks(CACHE_DIR / WATERMARKS_NAME)
+    fingerprints = {target.key: imputation_fingerprint(target.sources, manifest) for target in targets}
+    stale = []
+    for target in targets:
+        if target.path.exists() and watermarks.get(IMPUTE_PHASE, target.key) == fingerprints[target.key]:
+            print(f"  -> {target.path.name} is up to date (imputed).")
+        else:
+            print(f"  -> Generating imputed data for {target.key} from {describe_sources(target)}, "
+                  f"{IMPUTE_ALIGN} aligned, seed {IMPUTE_SEED}...")
+            stale.append(target)
+    if not stale:
+        return
+
+    conn = get_duckdb_conn()
+    try:
+        results = impute_months(conn, stale, IMPUTE_CHUNK_ROWS, **shard_workers())
+    finally:
+        conn.close()
+    try:
+        for target in stale:
+            error = results.get(target.key)
+            if error is not None:
+                print(f"  -> Error imputing {target.key}: {error}")
+                continue
+            if manifest is not None:
+                manifest.record(target.path, source="imputed")
+            watermarks.mark(IMPUTE_PHASE, target.key, fingerprints[target.key])
+            print(f"  -> Imputed file created: {target.path.name}")
+    finally:
+        watermarks.save()
+
+def imputed_shards(years, taxi_types=None, months=None):
+    """Cube-only imputation: the missing months as shards read from their sampled sources."""
+    if IMPUTE_MODE != "cube":
+        return []
+    taxi_types = taxi_types or selected_taxi_types()
+    targets, _ = plan_missing(Manifest.for_data_dir(DATA_DIR))
+    shards = []
+    for target in targets:
+        year_months = months.get(target.year) if isinstance(months, dict) else months
+        if target.year in years and target.taxi in taxi_types and (year_months is None or target.month in year_months):
+            shards.append(Shard(target.year, target.month, target.taxi, target.path, imputed=target.sources))
+    return shards
+
+def compact_trips(manifest=None):
     """
-    Imputes Dec 2025 data if missing, using weighted average of Dec 2023 (30%) and Dec 2024 (70%).
+    Optional (AUDIT_COMPACT=1): rewrites every analysed month sorted by pickup
+    time into data_downloads/compacted (see compaction.py). Unchanged months
+    are skipped.
     """
+    if not COMPACT_TRIPS:
+        return
+    print("  -> Compacting trips (sorted by pickup time)...")
     conn = get_duckdb_conn()
-    
-    for taxi in TAXI_TYPES:
-        target_dir = DATA_DIR / "2025" / taxi
-        target_file = target_dir / f"{taxi}_tripdata_2025-12.parquet"
-        
-        if target_file.exists():
-            print(f"  -> {target_file.name} already exists.")
-            continue
-            
-        print(f"  -> Generating imputed data for {taxi} Dec 2025...")
-        
-        src_2023 = DATA_DIR / "2023" / taxi / f"{taxi}_tripdata_2023-12.parquet"
-        src_2024 = DATA_DIR / "2024" / taxi / f"{taxi}_tripdata_2024-12.parquet"
-        
-        if not src_2023.exists() or not src_2024.exists():
-            print(f"  -> WARNING: Missing source data for imputation. Skipping {taxi}")
-            continue
-
-        try:
-            print("     - Sampling 2023 (30%) & 2024 (70%)...")
-            
-            pickup_col = 'tpep_pickup_datetime' if taxi == 'yellow' else 'lpep_pickup_datetime'
-            dropoff_col = 'tpep_dropoff_datetime' if taxi == 'yellow' else 'lpep_dropoff_datetime'
-            
-            q_src_2023 = str(src_2023).replace('\\\\', '/')
-            q_src_2024 = str(src_2024).replace('\\\\', '/')
-            q_target = str(target_file).replace('\\\\', '/')
-
-            query = f"""
-            COPY (
-                SELECT * REPLACE (
-                    {pickup_col} + INTERVAL 2 YEAR AS {pickup_col},
-                    {dropoff_col} + INTERVAL 2 YEAR AS {dropoff_col}
-                )
-                FROM '{q_src_2023}'
-                WHERE random() < 0.3
-                
-                UNION ALL
-                
-                SELECT * REPLACE (
-                    {pickup_col} + INTERVAL 1 YEAR AS {pickup_col},
-                    {dropoff_col} + INTERVAL 1 YEAR AS {dropoff_col}
-                )
-                FROM '{q_src_2024}'
-                WHERE random() < 0.7
-            ) TO '{q_target}' (FORMAT PARQUET)
-            """
-            conn.execute(query)
-            print(f"  -> Imputed file created: {target_file.name}")
-            
-        except Exception as e:
-            print(f"  -> Error imputing data for {taxi}: {e}")
+    try:
+        compact_shards(
+            conn,
+            resolve_shards(DATA_DIR, analysis_years(), selected_taxi_types(), analysis_months()),
+            shard_source_sql,
+            DATA_DIR / COMPACT_DIR_NAME,
+            Watermarks(CACHE_DIR / WATERMARKS_NAME),
+            COMPACT_ROW_GROUP_SIZE,
+            cluster_by_zone=COMPACT_CLUSTER_BY_ZONE,
+            manifest=manifest,
+            logic=logic_fingerprint(duckdb_select('yellow'), duckdb_select('green')),
+        )
+    finally:
+        conn.close()
 
 # ============================================================================
 # PHASE 2: GHOST TRIP FILTER & AUDIT
 # ============================================================================
 
-def run_ghost_trip_audit(conn):
-    print("\\n[PHASE 2] Auditing for Ghost Trips...")
-    
-    yellow_glob = str(DATA_DIR / "2025/yellow/*.parquet").replace('\\\\', '/')
-    green_glob = str(DATA_DIR / "2025/green/*.parquet").replace('\\\\', '/')
-    
-    query_view = f"""
-    CREATE OR REPLACE VIEW all_trips_2025 AS
-    SELECT 
-        VendorID,
-        'yellow' as type,
-        tpep_pickup_datetime as pickup_time,
-        tpep_dropoff_datetime as dropoff_time,
-        PULocationID as pickup_loc,
-        DOLocationID as dropoff_loc,
-        trip_distance,
-        fare_amount as fare,
-        total_amount,
-        COALESCE(congestion_surcharge, 0) as congestion_surcharge
-    FROM read_parquet('{yellow_glob}', union_by_name=True)
-    UNION ALL
+def create_trips_view(conn, manifest=None):
+    """
+    Creates an `all_trips_<year>` view per audited year: over the persistent
+    catalog table when PERSISTENT_CATALOG is set (refreshing only changed
+    files), over the month files when COMPACT_TRIPS is set or a slice is
+    selected, otherwise directly over the raw Parquet globs. The compacted
+    files take precedence over the catalog, which only holds raw downloads.
+    """
+    if catalog_reads():
+        # A slice refreshes its own months and leaves the rest of the catalog alone
+        catalog.refresh_trips(conn, DATA_DIR, analysis_years(), selected_taxi_types(), manifest, analysis_months(),
+                              prune=not SELECTION.active)
+        for year in audited_years():
+            catalog.create_trips_view(conn, year, get_shards([year], months=analysis_months()) if SELECTION.active else None)
+        return
+
+    for year in audited_years():
+        view = f"all_trips_{int(year)}"
+        if COMPACT_TRIPS or SELECTION.active:
+            shards = get_shards([year], months=analysis_months())
+            if shards:
+                parts = "\n    UNION ALL\n    ".join(shard_source(conn, shard) for shard in shards)
+                conn.execute(f"CREATE OR REPLACE VIEW {view} AS\n    {parts}")
+                continue
+
+        parts = []
+        for taxi in selected_taxi_types():
+            glob = str(DATA_DIR / f"{year}/{taxi}/*.parquet").replace('\\\\', '/')
+            # Columns across the glob: is_imputed only exists in imputed months
+            cols = {row[0] for row in conn.execute(f"DESCRIBE SELECT * FROM read_parquet('{glob}', union_by_name=True)").fetchall()}
+            parts.append(f"""
     SELECT 
-        VendorID,
-        'green' as type,
-        lpep_pickup_datetime as pickup_time,
-        lpep_dropoff_datetime as dropoff_time,
-        PULocationID as pickup_loc,
-        DOLocationID as dropoff_loc,
-        trip_distance,
-        fare_amount as fare,
-        total_amount,
-        COALESCE(congestion_surcharge, 0) as congestion_surcharge
-    FROM read_parquet('{green_glob}', union_by_name=True)
+        {duckdb_select(taxi, available=cols)}
+    FROM read_parquet('{glob}', union_by_name=True)""")
+        conn.execute(f"CREATE OR REPLACE VIEW {view} AS" + "\n    UNION ALL".join(parts))
+
+def get_shards(years, taxi_types=None, months=None):
     """
+    Monthly source files (dataset.Shard) for the given years, pruned to
+    `months`: the compacted months when COMPACT_TRIPS, else the raw downloads.
+    With cube-only imputation, imputed months are sampled from their sources.
+    """
+    taxi_types = taxi_types or selected_taxi_types()
+    if COMPACT_TRIPS:
+        shards = resolve_shards(DATA_DIR / COMPACT_DIR_NAME, years, taxi_types, months, layout="hive")
+    else:
+        shards = resolve_shards(DATA_DIR, years, taxi_types, months)
+    virtual = {s.key: s for s in imputed_shards(years, taxi_types, months)}
+    if virtual:
+        # An imputed file left by a "rows" run is replaced by its virtual twin
+        shards = [s for s in shards if s.key not in virtual] + list(virtual.values())
+        shards.sort(key=lambda s: (years.index(s.year), taxi_types.index(s.taxi), s.month))
+    return shards
+
+def shard_source(conn, shard):
+    """SELECT over one shard in the canonical schema (catalog table, raw file or imputed sample)."""
+    if shard.imputed:
+        return canonical_sample_sql(conn, shard.imputed, shard.taxi)
+    if catalog_reads():
+        return catalog.shard_sql(shard)
+    return shard_source_sql(conn, shard)
+
+def build_audit_partial(conn, shard, outputs):
+    # Single pass per month: every rule in ghost_rules.GHOST_RULES is compiled
+    # into one scan that emits a bitmask of all rules hit.
+    source = f"({shard_source(conn, shard)}) AS src"
+    if AUDIT_EXCLUDE_IMPUTED:
+        # Constant per file, so the flag's min/max stats skip imputed row groups
+        source = f"(SELECT * FROM {source} WHERE NOT {IMPUTED_COLUMN}) AS src"
+    out_file = outputs['ghost_trips'].as_posix()
+    conn.execute(f"""
+    COPY (
+        {compile_audit_query(source)}
+    ) TO '{out_file}' (FORMAT PARQUET, COMPRESSION ZSTD)
+    """)
+
+def run_ghost_trip_audit(conn, manifest=None):
+    print("\\n[PHASE 2] Auditing for Ghost Trips...")
+
     try:
-        conn.execute(query_view)
+        create_trips_view(conn, manifest)
     except Exception as e:
         print(f"  -> Error creating view: {e}. Are files downloaded?")
-        return 0, []
-    
-    audit_file = str(OUTPUT_DIR / 'ghost_trip_audit.csv').replace('\\\\', '/')
-    
-    audit_query = f"""
-    COPY (
-        SELECT 
-            *,
-            date_diff('minute', pickup_time, dropoff_time) as duration_min,
-            CASE 
-                WHEN date_diff('minute', pickup_time, dropoff_time) <= 0 THEN 0 
-                ELSE (trip_distance / (date_diff('minute', pickup_time, dropoff_time) / 60.0)) 
-            END as speed_mph,
-            CASE
-                WHEN (trip_distance / (GREATEST(date_diff('minute', pickup_time, dropoff_time), 0.1) / 60.0)) > {GHOST_SPEED_LIMIT} THEN 'Impossible Physics'
-                WHEN date_diff('minute', pickup_time, dropoff_time) < {GHOST_I_TELEPORTER_TIME} AND fare > {GHOST_I_TELEPORTER_FARE} THEN 'Teleporter'
-                WHEN trip_distance = {GHOST_I_STATIONARY_DIST} AND fare > 0 THEN 'Stationary Ride'
-                ELSE 'OK'
-            END as fraud_flag
-        FROM all_trips_2025
-        WHERE 
-            (trip_distance / (GREATEST(date_diff('minute', pickup_time, dropoff_time), 0.1) / 60.0)) > {GHOST_SPEED_LIMIT}
-            OR (date_diff('minute', pickup_time, dropoff_time) < {GHOST_I_TELEPORTER_TIME} AND fare > {GHOST_I_TELEPORTER_FARE})
-            OR (trip_distance = {GHOST_I_STATIONARY_DIST} AND fare > 0)
-    ) TO '{audit_file}' (HEADER, FORMAT CSV)
-    """
-    
+        return 0, [], {}
+
+    audit_file = str(OUTPUT_DIR / 'ghost_trip_audit.parquet').replace('\\\\', '/')
+
+    # Only months whose source (or the rules) changed since the last run are
+    # re-audited; the per-month flagged trips are then merged into a temp table
+    # so every count below reads it instead of re-scanning the source.
     print("  -> Executing Audit Query...")
-    conn.execute(audit_query)
+    shards = get_shards(audited_years(), months=analysis_months())
+    store = PartialStore(CACHE_DIR, 'audit', Watermarks(CACHE_DIR / WATERMARKS_NAME),
+                         logic_fingerprint(compile_audit_query('src'), duckdb_select('yellow'), duckdb_select('green'),
+                                           AUDIT_EXCLUDE_IMPUTED))
+    store.refresh(conn, shards, ['ghost_trips'], build_audit_partial, manifest, **shard_workers())
+    partial_files = store.files('ghost_trips', shards)
+    if not partial_files:
+        print(f"  -> No {'/'.join(map(str, audited_years())) or 'audited'} trip files selected. Are files downloaded?")
+        return 0, [], {}
+    conn.execute(f"CREATE OR REPLACE TEMP TABLE ghost_trips AS SELECT * FROM read_parquet({partial_files})")
+    # Sorted so readers get tight row-group min/max stats for flag/vendor/time filters
+    conn.execute(f"""
+    COPY (
+        SELECT * FROM ghost_trips ORDER BY fraud_flag, VendorID, pickup_time
+    ) TO '{audit_file}' (FORMAT PARQUET, COMPRESSION ZSTD, ROW_GROUP_SIZE {AUDIT_ROW_GROUP_SIZE})
+    """)
+    if EXPORT_AUDIT_CSV:
+        csv_file = str(OUTPUT_DIR / 'ghost_trip_audit.csv').replace('\\\\', '/')
+        conn.execute(f"COPY ghost_trips TO '{csv_file}' (HEADER, FORMAT CSV)")
+        print("  -> CSV export written.")
     
-    count = conn.execute(f"SELECT COUNT(*) FROM '{audit_file}'").fetchone()[0]
+    # Total, per-rule (any rule hit, from the bitmask) and per-vendor counts
+    # in one pass over the flagged trips
+    rule_names = [rule.name for _, rule in active_rules()]
+    stats_query = f"""
+    SELECT GROUPING(VendorID) as is_total, VendorID, COUNT(*) as ghost_count,
+        {rule_count_columns()}
+    FROM ghost_trips
+    GROUP BY GROUPING SETS ((), (VendorID))
+    """
+    count, rule_counts, vendor_counts = 0, {}, []
+    for is_total, vendor, n, *hits in conn.execute(stats_query).fetchall():
+        if is_total:
+            count = n
+            rule_counts = dict(zip(rule_names, hits))
+        else:
+            vendor_counts.append((vendor, n))
     print(f"  -> {count} suspicious trips flagged.")
+    for flag, n in rule_counts.items():
+        print(f"     {flag}: {n:,}")
     
     # Vendor Audit
     print("  -> Auditing Vendors...")
-    vendor_query = f"""
-    SELECT VendorID, COUNT(*) as ghost_count
-    FROM '{audit_file}'
-    GROUP BY VendorID
-    ORDER BY ghost_count DESC
-    LIMIT 5
-    """
-    vendors = conn.execute(vendor_query).fetchall()
+    vendors = sorted(vendor_counts, key=lambda v: v[1], reverse=True)[:5]
     print(f"  -> Top suspicious vendor code: {vendors[0][0] if vendors else 'None'}")
     
-    return count, vendors
+    return count, vendors, rule_counts
 
 # ============================================================================
 # PHASE 3: IMPACT ANALYSIS & AGGREGATIONS
 # ============================================================================
 
-def run_impact_analysis(conn, ghost_count, suspicious_vendors):
+def build_cube_partial(conn, shard, outputs):
+    source = f"({shard_source(conn, shard)}) AS src"
+    out_file = outputs['cube'].as_posix()
+    conn.execute(f"COPY ({cube_query(source, shard.year)}) TO '{out_file}' (FORMAT PARQUET, COMPRESSION ZSTD)")
+
+def refresh_trip_cube(conn, manifest=None):
+    """
+    Brings the per-month trip cube up to date and (re)creates the `trip_cube`
+    view over it. Cheap when nothing changed, so both phases call it.
+    Returns False when there is no trip data at all.
+    """
+    shards = get_shards(analysis_years(), months=analysis_months())
+    logic = logic_fingerprint(cube_query('src', 0), duckdb_select('yellow'), duckdb_select('green'))
+    store = PartialStore(CACHE_DIR, 'cube', Watermarks(CACHE_DIR / WATERMARKS_NAME), logic)
+    store.refresh(conn, shards, ['cube'], build_cube_partial, manifest, **shard_workers())
+    files = store.files('cube', shards)
+    if not files:
+        print("  -> No trip files found for the aggregation cube.")
+        return False
+    create_cube_view(conn, files)
+    # Q1 comparisons read only the Q1 (plus margin) months' cubes
+    q1_shards = [s for s in shards if s.month in Q1_SOURCE_MONTHS]
+    if q1_shards:
+        create_cube_view(conn, store.files('cube', q1_shards), CUBE_Q1_VIEW)
+    print(f"  -> Q1 analyses read {len(q1_shards)} of {len(shards)} source month(s) "
+          f"({bytes_on_disk(q1_shards) / 1e6:,.1f} of {bytes_on_disk(shards) / 1e6:,.1f} MB).")
+    return True
+
+def run_impact_analysis(conn, ghost_count, suspicious_vendors, ghost_rule_counts=None, manifest=None):
     print("\\n[PHASE 3] Analyzing Congestion Impact...")
-    
-    start_date = '2025-01-05'
-    zone_ids_str = ', '.join(map(str, CONGESTION_ZONE_IDS))
-    
+
+    # Every output below is derived from the trip cube, not the raw files
+    if not refresh_trip_cube(conn, manifest):
+        return
+    # Zone membership via the in_cbd() macro; names via the `zones` table
+    load_zones(conn, DATA_DIR / ZONE_LOOKUP_NAME)
+
     # 1. Revenue
     try:
         rev_query = f"""
-            SELECT SUM(congestion_surcharge) 
-            FROM all_trips_2025 
-            WHERE pickup_time >= '{start_date}'
-            AND (pickup_loc IN ({zone_ids_str}) OR dropoff_loc IN ({zone_ids_str}))
+            SELECT SUM(surcharge_cents) / 100.0
+            FROM {CUBE_VIEW}
+            WHERE source_year = 2025
+            AND pickup_date >= '{SURCHARGE_START_DATE}'
+            AND (in_cbd(pickup_loc) OR in_cbd(dropoff_loc))
         """
         revenue = conn.execute(rev_query).fetchone()[0]
         revenue = revenue if revenue else 0.0
@@ -333,44 +609,44 @@ def run_impact_analysis(conn, ghost_count, suspicious_vendors):
     leakage_file = str(OUTPUT_DIR / 'leakage_analysis.csv').replace('\\\\', '/')
     leakage_query = f"""
     COPY (
-        SELECT 
-            pickup_loc,
-            COUNT(*) as total_trips,
-            SUM(CASE WHEN congestion_surcharge > 0 THEN 1 ELSE 0 END) as compliant_trips,
-            CAST(SUM(CASE WHEN congestion_surcharge > 0 THEN 1 ELSE 0 END) AS FLOAT) / COUNT(*) as compliance_rate,
-            1.0 - (CAST(SUM(CASE WHEN congestion_surcharge > 0 THEN 1 ELSE 0 END) AS FLOAT) / COUNT(*)) as leakage_rate
-        FROM all_trips_2025
-        WHERE pickup_time >= '{start_date}'
-          AND pickup_loc NOT IN ({zone_ids_str})
-          AND dropoff_loc IN ({zone_ids_str})
-        GROUP BY pickup_loc
-        HAVING COUNT(*) > 100
-        ORDER BY leakage_rate DESC
-        LIMIT 20
+        WITH leakage AS (
+            SELECT
+                pickup_loc,
+                SUM(trips) as total_trips,
+                COALESCE(SUM(trips) FILTER (WHERE surcharge_paid), 0) as compliant_trips,
+                CAST(compliant_trips AS FLOAT) / total_trips as compliance_rate,
+                1.0 - (CAST(compliant_trips AS FLOAT) / total_trips) as leakage_rate
+            FROM {CUBE_VIEW}
+            WHERE source_year = 2025
+              AND pickup_date >= '{SURCHARGE_START_DATE}'
+              AND NOT in_cbd(pickup_loc)
+              AND in_cbd(dropoff_loc)
+            GROUP BY pickup_loc
+            HAVING SUM(trips) > 100
+            ORDER BY leakage_rate DESC
+            LIMIT 20
+        )
+        SELECT l.*, z.zone as pickup_zone, z.borough as pickup_borough
+        FROM leakage l
+        LEFT JOIN zones z ON z.location_id = l.pickup_loc
+        ORDER BY l.leakage_rate DESC
     ) TO '{leakage_file}' (HEADER, FORMAT CSV)
     """
     conn.execute(leakage_query)
     print("  -> Leakage analysis saved.")
-    
-    # 3. Q1 Decline
+
+    # 3. Q1 Decline (3-5 only read the Q1 source months' cubes)
     print("  -> Calculating Q1 Volume Decline...")
     def get_q1_count(year):
-        yg = str(DATA_DIR / f"{year}/yellow/*.parquet").replace('\\\\', '/')
-        gg = str(DATA_DIR / f"{year}/green/*.parquet").replace('\\\\', '/')
-        # Careful with union_by_name if schemas drift massively, but VendorID/dates usually stable
         q_zone = f"""
-        SELECT COUNT(*)
-        FROM (
-            SELECT tpep_dropoff_datetime as t, DOLocationID as loc FROM read_parquet('{yg}', union_by_name=True)
-            UNION ALL
-            SELECT lpep_dropoff_datetime as t, DOLocationID as loc FROM read_parquet('{gg}', union_by_name=True)
-        )
-        WHERE month(t) IN (1, 2, 3) 
-          AND t >= '{year}-01-01' AND t < '{year}-04-01'
-          AND loc IN ({zone_ids_str})
+        SELECT COALESCE(SUM(trips), 0)
+        FROM {CUBE_Q1_VIEW}
+        WHERE source_year = {year}
+          AND dropoff_date >= '{year}-01-01' AND dropoff_date < '{year}-04-01'
+          AND in_cbd(dropoff_loc)
         """
         try:
-            return conn.execute(q_zone).fetchone()[0]
+            return int(conn.execute(q_zone).fetchone()[0])
         except:
             return 0
 
@@ -378,36 +654,36 @@ def run_impact_analysis(conn, ghost_count, suspicious_vendors):
     q1_2025 = get_q1_count(2025)
     diff = (q1_2025 - q1_2024) / q1_2024 * 100 if q1_2024 > 0 else 0
     print(f"     Q1 2024: {q1_2024:,} | Q1 2025: {q1_2025:,} | Change: {diff:.2f}%")
-    
+
     stats = {
         "revenue_2025": revenue,
         "q1_2024_vol": q1_2024,
         "q1_2025_vol": q1_2025,
         "q1_pct_change": diff,
         "ghost_count": ghost_count,
+        "ghost_rule_counts": ghost_rule_counts or {},
         "suspicious_vendors": suspicious_vendors
     }
     with open(OUTPUT_DIR / "impact_stats.json", "w") as f:
         json.dump(stats, f)
-        
+
     # 4. Velocity Heatmap
     print("  -> Generating Velocity Heatmap Data...")
     def export_velocity(year):
-        yg = str(DATA_DIR / f"{year}/yellow/*.parquet").replace('\\\\', '/')
         out_file = str(OUTPUT_DIR / f'velocity_{year}.csv').replace('\\\\', '/')
         q = f"""
         COPY (
-            SELECT 
-                dayofweek(tpep_pickup_datetime) as dow,
-                hour(tpep_pickup_datetime) as hour,
-                AVG(trip_distance / (GREATEST(date_diff('minute', tpep_pickup_datetime, tpep_dropoff_datetime), 1) / 60.0)) as avg_speed
-            FROM read_parquet('{yg}', union_by_name=True)
-            WHERE month(tpep_pickup_datetime) IN (1, 2, 3)
-              AND DOLocationID IN ({zone_ids_str})
-              AND date_diff('minute', tpep_pickup_datetime, tpep_dropoff_datetime) > 1
-              AND trip_distance > 0.1
-              AND (trip_distance / (GREATEST(date_diff('minute', tpep_pickup_datetime, tpep_dropoff_datetime), 1) / 60.0)) < 100
+            SELECT
+                dayofweek(pickup_date) as dow,
+                hour,
+                SUM(speed_sum) / SUM(velocity_trips) as avg_speed
+            FROM {CUBE_Q1_VIEW}
+            WHERE source_year = {year}
+              AND type = 'yellow'
+              AND month(pickup_date) IN (1, 2, 3)
+              AND in_cbd(dropoff_loc)
             GROUP BY 1, 2
+            HAVING SUM(velocity_trips) > 0
         ) TO '{out_file}' (HEADER, FORMAT CSV)
         """
         try:
@@ -417,37 +693,36 @@ def run_impact_analysis(conn, ghost_count, suspicious_vendors):
 
     export_velocity(2024)
     export_velocity(2025)
-    
+
     # 5. Border Effect
     print("  -> Generating Border Effect Data...")
     border_file = str(OUTPUT_DIR / 'border_effect.csv').replace('\\\\', '/')
-    yg_2024 = str(DATA_DIR / "2024/yellow/*.parquet").replace('\\\\', '/')
-    yg_2025 = str(DATA_DIR / "2025/yellow/*.parquet").replace('\\\\', '/')
-    
+
     border_query = f"""
     COPY (
-        WITH q1_2024 AS (
-            SELECT DOLocationID as loc, COUNT(*) as cnt 
-            FROM read_parquet('{yg_2024}', union_by_name=True)
-            WHERE month(tpep_dropoff_datetime) IN (1,2,3)
-            GROUP BY 1
+        WITH q1 AS (
+            SELECT source_year, dropoff_loc as loc, SUM(trips) as cnt
+            FROM {CUBE_Q1_VIEW}
+            WHERE type = 'yellow'
+              AND month(dropoff_date) IN (1,2,3)
+            GROUP BY 1, 2
         ),
-        q1_2025 AS (
-            SELECT DOLocationID as loc, COUNT(*) as cnt 
-            FROM read_parquet('{yg_2025}', union_by_name=True)
-            WHERE month(tpep_dropoff_datetime) IN (1,2,3)
-            GROUP BY 1
-        )
-        SELECT 
+        q1_2024 AS (SELECT loc, cnt FROM q1 WHERE source_year = 2024),
+        q1_2025 AS (SELECT loc, cnt FROM q1 WHERE source_year = 2025)
+        SELECT
             COALESCE(a.loc, b.loc) as location_id,
             COALESCE(a.cnt, 0) as count_2024,
             COALESCE(b.cnt, 0) as count_2025,
             (COALESCE(b.cnt, 0) - COALESCE(a.cnt, 0)) as diff,
-            CASE WHEN COALESCE(a.cnt, 0) > 0 
-                 THEN (COALESCE(b.cnt, 0) - COALESCE(a.cnt, 0)) * 100.0 / a.cnt 
-                 ELSE 0 END as pct_change
+            CASE WHEN COALESCE(a.cnt, 0) > 0
+                 THEN (COALESCE(b.cnt, 0) - COALESCE(a.cnt, 0)) * 100.0 / a.cnt
+                 ELSE 0 END as pct_change,
+            z.zone,
+            z.borough,
+            z.in_cbd
         FROM q1_2024 a
         FULL OUTER JOIN q1_2025 b ON a.loc = b.loc
+        LEFT JOIN zones z ON z.location_id = COALESCE(a.loc, b.loc)
     ) TO '{border_file}' (HEADER, FORMAT CSV)
     """
     try:
@@ -459,13 +734,19 @@ def run_impact_analysis(conn, ghost_count, suspicious_vendors):
 # PHASE 4: WEATHER & ECONOMICS
 # ============================================================================
 
-def fetch_weather_and_analyze(conn):
+def fetch_weather_and_analyze(conn, manifest=None):
     print("\\n[PHASE 4] Weather & Economics...")
+    pd = optional_import("pandas", "WARNING: Pandas not found. Some analysis steps will be skipped.")
+    stats = optional_import("scipy.stats", "WARNING: Scipy not found. Regression analysis will be skipped.")
+    # Fetch/elasticity errors leave their file missing, so the phase is not
+    # checkpointed (see phase_outputs) and --resume retries it
+    failures = []
     
     # 1. Fetch Weather
-    weather_file = CACHE_DIR / "weather_2025.csv"
+    weather_file = CACHE_DIR / WEATHER_FILE_NAME
     if not weather_file.exists():
         try:
+            import requests
             url = "https://archive-api.open-meteo.com/v1/archive"
             params = {
                 'latitude': CENTRAL_PARK_LAT,
@@ -479,7 +760,7 @@ def fetch_weather_and_analyze(conn):
             r.raise_for_status()
             data = r.json()
             
-            if PANDAS_AVAILABLE:
+            if pd is not None:
                 df_weather = pd.DataFrame({
                     'date': data['daily']['time'],
                     'precipitation': data['daily']['precipitation_sum']
@@ -496,15 +777,20 @@ def fetch_weather_and_analyze(conn):
 
         except Exception as e:
             print(f"  -> Failed to fetch weather: {e}")
+            failures.append(f"weather fetch: {e}")
             
-    # 2. Daily Trip Counts
+    # 2. Daily Trip Counts (from the trip cube; a no-op refresh when Phase 3
+    # already brought it up to date)
+    if not refresh_trip_cube(conn, manifest):
+        return
     out_trips = str(OUTPUT_DIR / 'daily_trips_2025.csv').replace('\\\\', '/')
     daily_trips_query = f"""
     COPY (
         SELECT 
-            CAST(pickup_time AS DATE) as date,
-            COUNT(*) as trips
-        FROM all_trips_2025
+            pickup_date as date,
+            SUM(trips) as trips
+        FROM {CUBE_VIEW}
+        WHERE source_year = 2025
         GROUP BY 1
         ORDER BY 1
     ) TO '{out_trips}' (HEADER, FORMAT CSV)
@@ -516,10 +802,11 @@ def fetch_weather_and_analyze(conn):
     tips_query = f"""
     COPY (
         SELECT 
-            month(pickup_time) as month,
-            AVG(congestion_surcharge) as avg_surcharge,
-            AVG(CASE WHEN fare > 0 THEN (total_amount - fare)/fare ELSE 0 END) * 100 as avg_tip_pct
-        FROM all_trips_2025
+            month(pickup_date) as month,
+            SUM(surcharge_cents) / 100.0 / SUM(trips) as avg_surcharge,
+            SUM(tip_ratio_sum) / NULLIF(SUM(tip_trips), 0) * 100 as avg_tip_pct
+        FROM {CUBE_VIEW}
+        WHERE source_year = 2025
         GROUP BY 1
         ORDER BY 1
     ) TO '{out_tips}' (HEADER, FORMAT CSV)
@@ -527,7 +814,7 @@ def fetch_weather_and_analyze(conn):
     conn.execute(tips_query)
 
     # 4. Elasticity
-    if PANDAS_AVAILABLE and SCIPY_AVAILABLE:
+    if pd is not None and stats is not None and weather_file.exists():
         try:
             df_trips = pd.read_csv(OUTPUT_DIR / "daily_trips_2025.csv")
             df_weather = pd.read_csv(weather_file)
@@ -544,33 +831,152 @@ def fetch_weather_and_analyze(conn):
                     f.write(f"Correlation: {correlation}\\nSlope: {slope}\\n")
         except Exception as e:
             print(f"  -> Economics analysis error: {e}")
+            failures.append(f"elasticity: {e}")
+
+    if failures:
+        print(f"  -> WARNING: Phase 4 incomplete ({'; '.join(failures)}); --resume will retry it.")
 
 # ============================================================================
 # MAIN ORCHESTRATOR
 # ============================================================================
 
-def main():
+def input_fingerprint(manifest):
+    """
+    Checkpoint key of a run: the data files' manifest SHA-256s (size/mtime
+    when untracked) and every AUDIT_* setting that changes the outputs.
+    """
+    paths = [DATA_DIR / ZONE_LOOKUP_NAME] + [tlc_path(*key) for key in required_months()]
+    files = [f"{manifest.key(p)}={file_fingerprint(p, manifest)}" for p in paths if p.exists()]
+    settings = [f"{k}={v}" for k, v in sorted(os.environ.items())
+                if k.startswith("AUDIT_") and k not in RESUME_IGNORED_ENV]
+    return logic_fingerprint(*files, *settings)
+
+def elasticity_available():
+    """Phase 4 only runs (and writes elasticity.txt for) the regression with pandas and scipy installed."""
+    return all(importlib.util.find_spec(name) is not None for name in ("pandas", "scipy"))
+
+def phase_outputs(phase):
+    """Files `phase` must leave behind to be checkpointed."""
+    names = PHASE_OUTPUTS.get(phase, [])
+    if phase == 'audit' and not EXPORT_AUDIT_CSV:
+        names = [name for name in names if not name.endswith('.csv')]
+    if phase == 'weather' and not elasticity_available():
+        names = [name for name in names if name != 'elasticity.txt']
+    outputs = [OUTPUT_DIR / name for name in names]
+    if phase == 'weather':
+        outputs.append(CACHE_DIR / WEATHER_FILE_NAME)  # Missing after a failed fetch
+    return outputs
+
+def open_checkpoints(resume=False):
+    return Checkpoints(CACHE_DIR / CHECKPOINTS_NAME, resume=resume,
+                       outputs={phase: phase_outputs(phase) for phase in PHASE_OUTPUTS})
+
+def run_phase(metrics, checkpoints, phase, key, run):
+    """
+    Runs one phase under its metrics record and checkpoint and returns
+    run()'s result; when resuming past the phase, the checkpointed result
+    instead, and None when the phase is not selected.
+    """
+    with metrics.phase(phase) as record:
+        if not SELECTION.runs(phase):
+            record["status"] = "not selected"
+            return None
+        if checkpoints.skip(phase, key):
+            record["status"] = "resumed"
+            return checkpoints.result(phase)
+        result = run()
+        if not checkpoints.finish(phase, key, result=result):
+            record["status"] = "incomplete"
+        return result
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="NYC Congestion Pricing Audit pipeline.")
+    parser.add_argument("--threads", type=int, help="DuckDB threads (default: cgroup CPU quota).")
+    parser.add_argument("--memory-limit", help="DuckDB memory limit, e.g. 8GB (default: share of cgroup memory.max).")
+    parser.add_argument("--temp-dir", help="Scratch directory DuckDB spills to (default: cache/duckdb_spill).")
+    parser.add_argument("--metrics-jsonl", default=METRICS_JSONL,
+                        help="Also stream phase/query metrics to this JSON-lines file.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip the phases already complete for the same data and settings "
+                             "(see cache/checkpoints.json) and pick up at the first incomplete one.")
+    add_selection_args(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Runs every selected phase; returns False when one of them failed."""
+    global _METRICS, SELECTION
+    args = parse_args(argv)
+    ensure_dirs()
+    # Through the environment so process-pool workers see the same overrides
+    for flag, env in ((args.threads, "AUDIT_THREADS"), (args.memory_limit, "AUDIT_MEMORY_LIMIT"),
+                      (args.temp_dir, "AUDIT_TEMP_DIR")):
+        if flag:
+            os.environ[env] = str(flag)
+    SELECTION = apply_selection_args(args)
+
     print("="*60)
     print("Starting NYC Congestion Pricing Audit Pipeline (Final)")
     print("="*60)
+    if SELECTION != Selection():
+        print(f"Selection: {SELECTION.describe()}")
+    resources = duckdb_resources()
+    print(f"DuckDB resources: {resources.describe()}")
+    if SHARD_WORKERS > 1 and not PERSISTENT_CATALOG:
+        print(f"  -> {SHARD_WORKERS} shard workers, each: {resources.split(SHARD_WORKERS).describe()}")
+    if PERSISTENT_CATALOG and COMPACT_TRIPS:
+        print("  -> AUDIT_COMPACT set: trips are read from the compacted files, not the persistent catalog")
+    metrics = _METRICS = RunMetrics(args.metrics_jsonl)
+    metrics.settings = {"threads": resources.threads, "memory_limit": resources.memory_limit,
+                        "temp_directory": resources.temp_directory, "shard_workers": SHARD_WORKERS,
+                        "compact": COMPACT_TRIPS, "persistent_catalog": PERSISTENT_CATALOG,
+                        "selection": SELECTION.describe()}
     
-    ensure_data_available()
-    print("\\nInitializing Database Connection...")
-    conn = get_duckdb_conn()
-    
+    checkpoints = open_checkpoints(resume=args.resume)
+    ok = True
     try:
-        count, vendors = run_ghost_trip_audit(conn)
-        run_impact_analysis(conn, count, vendors)
-        fetch_weather_and_analyze(conn)
+        with metrics.phase("ingest") as record:
+            # Keyed by the data it leaves behind: a resumed run compares the
+            # manifest on disk with the one the last ingest wrote
+            manifest = Manifest.for_data_dir(DATA_DIR)
+            key = input_fingerprint(manifest)
+            if not SELECTION.runs("ingest"):
+                record["status"] = "not selected"
+            elif checkpoints.skip("ingest", key):
+                record["status"] = "resumed"
+            else:
+                manifest = ensure_data_available()
+                key = input_fingerprint(manifest)
+                checkpoints.finish("ingest", key, [manifest.path])
+        run_phase(metrics, checkpoints, "compact", key, lambda: compact_trips(manifest))
+        print("\\nInitializing Database Connection...")
+        conn = get_duckdb_conn(persistent=PERSISTENT_CATALOG)
         
-    except Exception as e:
-        print(f"\\nCRITICAL PIPELINE ERROR: {e}")
-        import traceback
-        traceback.print_exc()
+        try:
+            audit = run_phase(metrics, checkpoints, "audit", key,
+                              lambda: list(run_ghost_trip_audit(conn, manifest)))
+            if audit is None and checkpoints.is_complete("audit", key):
+                audit = checkpoints.result("audit")  # Not selected: the last audit of the same data
+            elif audit is None and SELECTION.runs("impact"):
+                print("  -> WARNING: No audit of this data; impact_stats.json gets no ghost-trip counts.")
+            count, vendors, rule_counts = audit or (0, [], {})
+            run_phase(metrics, checkpoints, "impact", key,
+                      lambda: run_impact_analysis(conn, count, vendors, rule_counts, manifest))
+            run_phase(metrics, checkpoints, "weather", key, lambda: fetch_weather_and_analyze(conn, manifest))
+            
+        except Exception as e:
+            print(f"\\nCRITICAL PIPELINE ERROR: {e}")
+            import traceback
+            traceback.print_exc()
+            ok = False
+        finally:
+            conn.close()
     finally:
-        conn.close()
+        metrics_file = metrics.write(OUTPUT_DIR / METRICS_NAME)
+        _METRICS = None
+        print(f"\\nRun metrics saved to {metrics_file}")
         
-    print("\\nPipeline Completed.")
+    print("\\nPipeline Completed." if ok else "\\nPipeline Failed.")
+    return ok
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(0 if main() else 1)
\ No newline at end of file
@@ -0,0 +1,132 @@
+"""
+NYC Congestion Pricing Audit - DuckDB Resource Settings
+=======================================================
+Sizes DuckDB to the box it actually runs on instead of a fixed 4 GB / 4
+threads: the CPU quota and memory limit of the container (cgroup v2
+cpu.max / memory.max), falling back to the host's CPUs and RAM.
+
+Overrides, strongest first: explicit arguments (pipeline.py --threads,
+--memory-limit, --temp-dir), then the environment:
+
+    AUDIT_THREADS        number of DuckDB threads
+    AUDIT_MEMORY_LIMIT   any DuckDB size string, e.g. '8GB'
+    AUDIT_TEMP_DIR       where DuckDB spills when a query exceeds the limit
+
+DuckDB is given MEMORY_FRACTION of the detected memory; the rest is left
+for Python, pyarrow and the OS page cache.
+"""
+
+import math
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+CGROUP_DIR = Path("/sys/fs/cgroup")
+MEMORY_FRACTION = 0.75
+
+_SIZE = re.compile(r"^\s*([\d.]+)\s*([KMGT]?i?B?)\s*$", re.IGNORECASE)
+_UNITS = {"": 1, "B": 1, "K": 1e3, "M": 1e6, "G": 1e9, "T": 1e12}
+
+
+def _read_cgroup(name):
+    try:
+        return (CGROUP_DIR / name).read_text().split()
+    except OSError:
+        return None
+
+
+def cpu_limit():
+    """(CPUs available, where the figure came from)."""
+    fields = _read_cgroup("cpu.max")
+    if fields and fields[0] != "max":
+        quota, period = int(fields[0]), int(fields[1]) if len(fields) > 1 else 100_000
+        return max(1, math.ceil(quota / period)), "cgroup cpu.max"
+    try:
+        return len(os.sched_getaffinity(0)), "cpu affinity"
+    except AttributeError:
+        return os.cpu_count() or 1, "os.cpu_count"
+
+
+def memory_limit():
+    """(bytes available, where the figure came from), or (None, ...) if unknown."""
+    fields = _read_cgroup("memory.max")
+    if fields and fields[0] != "max":
+        return int(fields[0]), "cgroup memory.max"
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES"), "physical memory"
+    except (AttributeError, ValueError, OSError):
+        return None, "DuckDB default"
+
+
+def parse_size(text):
+    """Bytes in a size string such as '8GB', '512MiB' or '2g'."""
+    match = _SIZE.match(str(text))
+    if not match:
+        raise ValueError(f"Not a memory size: {text!r}")
+    number, unit = float(match.group(1)), match.group(2).upper()
+    scale = 2 ** (10 * "BKMGT".index(unit[0])) if "I" in unit else _UNITS[unit.rstrip("B") or unit]
+    return int(number * scale)
+
+
+def _mib(n_bytes):
+    return f"{max(1, int(n_bytes) // 2**20)}MiB"
+
+
+@dataclass(frozen=True)
+class DuckDBResources:
+    threads: int
+    memory_bytes: int | None  # None: DuckDB's own default (80% of RAM)
+    temp_directory: str
+    source: str
+
+    @property
+    def memory_limit(self):
+        return _mib(self.memory_bytes) if self.memory_bytes else "default"
+
+    def split(self, workers):
+        """Share of these resources for one of `workers` processes running at once."""
+        workers = max(1, int(workers))
+        memory = self.memory_bytes // workers if self.memory_bytes else None
+        return DuckDBResources(max(1, self.threads // workers), memory, self.temp_directory,
+                               f"{self.source}; 1/{workers} per worker")
+
+    def apply(self, conn, preserve_insertion_order=False):
+        """
+        Applies the settings to a connection. Insertion order is not preserved
+        by default: every output that needs an order has an ORDER BY.
+        """
+        conn.execute(f"SET threads={int(self.threads)}")
+        if self.memory_bytes:
+            conn.execute(f"SET memory_limit='{self.memory_limit}'")
+        conn.execute(f"SET temp_directory='{Path(self.temp_directory).as_posix()}'")
+        conn.execute(f"SET preserve_insertion_order={'true' if preserve_insertion_order else 'false'}")
+        return conn
+
+    def describe(self):
+        return (f"threads={self.threads}, memory_limit={self.memory_limit}, "
+                f"temp_directory={self.temp_directory} ({self.source})")
+
+
+def detect_resources(default_temp_dir, threads=None, memory=None, temp_dir=None):
+    """Resource settings from the arguments, the AUDIT_* environment, then cgroup/host limits."""
+    sources = []
+    threads = threads or os.environ.get("AUDIT_THREADS")
+    if threads:
+        threads, cpu_source = int(threads), "override"
+    else:
+        threads, cpu_source = cpu_limit()
+    sources.append(f"cpu: {cpu_source}")
+
+    memory = memory or os.environ.get("AUDIT_MEMORY_LIMIT")
+    if memory:
+        memory, mem_source = parse_size(memory), "override"
+    else:
+        available, mem_source = memory_limit()
+        memory = int(available * MEMORY_FRACTION) if available else None
+        if available:
+            mem_source += f" x {MEMORY_FRACTION}"
+    sources.append(f"memory: {mem_source}")
+
+    temp_dir = str(temp_dir or os.environ.get("AUDIT_TEMP_DIR") or default_temp_dir)
+    return DuckDBResources(threads, memory, temp_dir, "; ".join(sources))
@@ -0,0 +1,137 @@
+"""
+NYC Congestion Pricing Audit - Run Selection
+============================================
+A slice of the full job: the years, months, taxi types and phases one run
+touches, e.g. `python -m pipeline run --years 2025 --months 1-3 --types
+yellow --phases audit,impact`. Every phase narrows what it downloads and
+reads to the slice; nothing outside it is deleted or rewritten.
+
+The slice travels in the environment (AUDIT_YEARS, AUDIT_MONTHS,
+AUDIT_TAXI_TYPES, AUDIT_PHASES), like the other AUDIT_* settings, so
+process-pool workers and app.py's stages see the same one. Unset means
+everything.
+"""
+
+import argparse
+import os
+from dataclasses import dataclass
+
+PHASES = ("ingest", "compact", "audit", "impact", "weather")
+TAXI_TYPES = ("yellow", "green")
+
+SELECTION_ENV = {
+    "years": "AUDIT_YEARS",
+    "months": "AUDIT_MONTHS",
+    "taxi_types": "AUDIT_TAXI_TYPES",
+    "phases": "AUDIT_PHASES",
+}
+
+
+def parse_int_ranges(text, low=None, high=None):
+    """'1-3,12' -> (1, 2, 3, 12); raises ValueError outside [low, high]."""
+    values = set()
+    for part in str(text).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        first, last = int(first), int(last or first)
+        if first > last:
+            raise ValueError(f"empty range {part!r}")
+        values.update(range(first, last + 1))
+    if not values:
+        raise ValueError(f"nothing selected in {text!r}")
+    out_of_range = [v for v in values if (low is not None and v < low) or (high is not None and v > high)]
+    if out_of_range:
+        raise ValueError(f"{sorted(out_of_range)} not in {low}..{high}")
+    return tuple(sorted(values))
+
+
+def parse_names(text, choices):
+    """'audit,impact' -> ('audit', 'impact'), in `choices` order."""
+    names = {name.strip() for name in str(text).split(",") if name.strip()}
+    unknown = names - set(choices)
+    if unknown or not names:
+        raise ValueError(f"expected some of {', '.join(choices)}, got {text!r}")
+    return tuple(name for name in choices if name in names)
+
+
+PARSERS = {
+    "years": lambda text: parse_int_ranges(text, 2009, 2100),
+    "months": lambda text: parse_int_ranges(text, 1, 12),
+    "taxi_types": lambda text: parse_names(text, TAXI_TYPES),
+    "phases": lambda text: parse_names(text, PHASES),
+}
+
+
+@dataclass(frozen=True)
+class Selection:
+    years: tuple = None
+    months: tuple = None
+    taxi_types: tuple = None
+    phases: tuple = None
+
+    @classmethod
+    def from_env(cls, environ=None):
+        environ = os.environ if environ is None else environ
+        return cls(**{field: PARSERS[field](environ[env]) for field, env in SELECTION_ENV.items()
+                      if environ.get(env)})
+
+    @property
+    def active(self):
+        """True when the data read is narrowed (a phase-only selection still reads everything)."""
+        return any(v is not None for v in (self.years, self.months, self.taxi_types))
+
+    def keep(self, year, month, taxi):
+        return ((self.years is None or year in self.years)
+                and (self.months is None or month in self.months)
+                and (self.taxi_types is None or taxi in self.taxi_types))
+
+    def filter_years(self, years):
+        return [year for year in years if self.years is None or year in self.years]
+
+    def filter_taxi_types(self, taxi_types):
+        return [taxi for taxi in taxi_types if self.taxi_types is None or taxi in self.taxi_types]
+
+    def narrow_months(self, months):
+        """A month set (None = all) narrowed to the selected months."""
+        if self.months is None:
+            return months
+        return tuple(m for m in (months if months is not None else range(1, 13)) if m in self.months)
+
+    def runs(self, phase):
+        return self.phases is None or phase in self.phases
+
+    def describe(self):
+        parts = [f"{field.replace('_', ' ')} {','.join(map(str, getattr(self, field)))}"
+                 for field in SELECTION_ENV if getattr(self, field) is not None]
+        return "; ".join(parts) or "everything"
+
+
+def _arg_type(field):
+    def parse(text):
+        try:
+            return ",".join(map(str, PARSERS[field](text)))
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(str(e))
+    parse.__name__ = field
+    return parse
+
+
+def add_selection_args(parser, phases=True):
+    """--years/--months/--types(/--phases); values are normalized to their AUDIT_* form."""
+    parser.add_argument("--years", type=_arg_type("years"), help="Years to process, e.g. 2025 or 2024-2025.")
+    parser.add_argument("--months", type=_arg_type("months"), help="Months to process, e.g. 1-3 or 1,2,12.")
+    parser.add_argument("--types", type=_arg_type("taxi_types"), help="Taxi types, e.g. yellow or yellow,green.")
+    if phases:
+        parser.add_argument("--phases", type=_arg_type("phases"),
+                            help=f"Phases to run, out of {','.join(PHASES)}.")
+
+
+def apply_selection_args(args):
+    """Exports the selection flags given to the environment; returns the resulting Selection."""
+    for field, env in SELECTION_ENV.items():
+        value = getattr(args, "types" if field == "taxi_types" else field, None)
+        if value:
+            os.environ[env] = value
+    return Selection.from_env()
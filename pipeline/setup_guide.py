@@ -31,7 +31,7 @@ PROJECT_STRUCTURE = """
 │
 ├── 📁 output/                     # Generated analysis outputs
 │   ├── summary_stats.json         # Key statistics & metrics
-│   ├── ghost_trip_audit.csv       # Detected fraudulent transactions
+│   ├── ghost_trip_audit.parquet   # Detected fraudulent transactions
 │   ├── surcharge_leakage.csv      # Missing surcharge analysis
 │   ├── audit_report.pdf           # Executive audit report (~12 pages)
 │   ├── medium_article.md          # Full technical blog post
@@ -65,7 +65,7 @@ python pipeline.py
 
 # This will:
 # 1. Load 147.3M taxi trips from data_downloads/
-# 2. Detect 1,247 ghost trips and save to output/ghost_trip_audit.csv
+# 2. Detect 1,247 ghost trips and save to output/ghost_trip_audit.parquet
 # 3. Perform congestion zone analysis (Q1 2024 vs 2025 comparison)
 # 4. Fetch weather data from Open-Meteo API
 # 5. Generate aggregations in DuckDB (big data stack)
@@ -553,7 +553,7 @@ DELIVERABLES CHECKLIST
 📊 Data Outputs
   ├─ output/summary_stats.json
   │  └─ Comprehensive statistics in JSON format
-  ├─ output/ghost_trip_audit.csv
+  ├─ output/ghost_trip_audit.parquet
   │  └─ 1,247 fraudulent transactions
   ├─ output/surcharge_leakage.csv
   │  └─ Location-level missing surcharge analysis
@@ -0,0 +1,206 @@
+"""
+NYC Congestion Pricing Audit - Stage Graph
+==========================================
+Runs app.py's stages (ingestion, ETL, report, blogs, ...) as a small DAG
+instead of a fixed sequence of subprocesses:
+
+- Each Stage declares its inputs (files, directories or glob patterns under
+  the repository), its outputs and the stages it runs after.
+- Before a stage runs, its inputs are fingerprinted: the download manifest's
+  SHA-256 for tracked TLC files, a SHA-256 of the content otherwise (cached
+  by size and mtime, so unchanged files are not re-read), plus the
+  environment variables it declares. A stage whose fingerprint matches its
+  last successful run and whose outputs all exist is skipped.
+- Stages run in this process ("module:function", imported on first use) so
+  pandas/duckdb/polars are imported once; a target without ":" is a script
+  run in a subprocess.
+- Stages whose dependencies are done run side by side on a thread pool;
+  `exclusive` stages (the ones that size themselves to the whole machine)
+  run alone.
+
+State is kept in cache/stages.json. A failed stage is never marked done;
+the stages after it are reported as blocked.
+"""
+
+import glob
+import hashlib
+import importlib
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+
+from incremental import Watermarks, logic_fingerprint
+from manifest import MANIFEST_NAME, Manifest
+
+STAGES_NAME = "stages.json"
+HASH_CHUNK = 1 << 20
+
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    target: str              # "module:function" (in process) or a script path (subprocess)
+    args: tuple = ()         # the function's arguments, or the script's command line
+    inputs: tuple = ()       # paths / glob patterns relative to the repository
+    outputs: tuple = ()      # must all exist for the stage to be skipped
+    after: tuple = ()
+    env: tuple = ()          # prefixes of environment variables that change the outputs
+    always: bool = False     # never skipped (e.g. downloads: only the server knows what changed)
+    exclusive: bool = False  # never runs next to another stage
+
+    @property
+    def in_process(self):
+        return ":" in self.target
+
+
+class StageRunner:
+    """Runs a list of Stages in dependency order; see the module docstring."""
+
+    def __init__(self, stages, base_dir, state_path, jobs=2, force=()):
+        self.stages = {stage.name: stage for stage in stages}
+        for stage in stages:
+            unknown = set(stage.after) - set(self.stages)
+            if unknown:
+                raise ValueError(f"Stage {stage.name!r} runs after unknown stage(s): {sorted(unknown)}")
+        self.base_dir = Path(base_dir)
+        self.state = Watermarks(state_path)
+        self.jobs = max(1, int(jobs))
+        self.force = set(self.stages) if "all" in force else set(force)
+        self.results = []
+
+    # ------------------------------------------------------------------
+    # Fingerprints
+    # ------------------------------------------------------------------
+
+    def _expand(self, patterns):
+        paths = set()
+        for pattern in patterns:
+            path = self.base_dir / pattern
+            if path.is_dir():
+                paths.update(p for p in path.rglob("*") if p.is_file())
+            else:
+                paths.update(Path(p) for p in glob.glob(str(path)) if os.path.isfile(p))
+        return sorted(paths)
+
+    def _manifest_for(self, path, found):
+        """The download manifest of the data directory holding `path`, if any."""
+        for parent in path.parents:
+            if parent not in found:
+                manifest_file = parent / MANIFEST_NAME
+                found[parent] = Manifest(manifest_file) if manifest_file.exists() else None
+            if found[parent] is not None or parent == self.base_dir:
+                return found[parent]
+        return None
+
+    def content_hash(self, path):
+        """SHA-256 of a file, reused while its size and mtime are unchanged."""
+        st = path.stat()
+        key = path.relative_to(self.base_dir).as_posix() if path.is_relative_to(self.base_dir) else str(path)
+        stamp = f"{st.st_size}:{st.st_mtime_ns}"
+        cached = self.state.get("file_hashes", key)
+        if cached and cached.startswith(stamp + ":"):
+            return cached[len(stamp) + 1:]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                digest.update(chunk)
+        self.state.mark("file_hashes", key, f"{stamp}:{digest.hexdigest()}")
+        return digest.hexdigest()
+
+    def fingerprint(self, stage):
+        found = {}
+        parts = [stage.target]
+        for path in self._expand(stage.inputs):
+            manifest = self._manifest_for(path, found)
+            tracked = manifest.fingerprint(path) if manifest is not None else None
+            parts.append(f"{path.relative_to(self.base_dir).as_posix()}={tracked or self.content_hash(path)}")
+        parts.extend(f"{k}={v}" for k, v in sorted(os.environ.items()) if k.startswith(tuple(stage.env)))
+        return logic_fingerprint(*parts)
+
+    def is_current(self, stage, fingerprint):
+        if stage.always or stage.name in self.force:
+            return False
+        if not all(self._expand([output]) for output in stage.outputs):
+            return False
+        return self.state.get("stages", stage.name) == fingerprint
+
+    # ------------------------------------------------------------------
+    # Execution
+    # ------------------------------------------------------------------
+
+    def _call(self, stage):
+        """Runs a stage; returns True on success."""
+        if stage.in_process:
+            module, function = stage.target.split(":")
+            return getattr(importlib.import_module(module), function)(*stage.args) is not False
+        command = [sys.executable, str(self.base_dir / stage.target), *map(str, stage.args)]
+        return subprocess.run(command, cwd=self.base_dir).returncode == 0
+
+    def _execute(self, stage):
+        t0 = time.perf_counter()
+        try:
+            ok = self._call(stage)
+        except SystemExit as e:  # argparse errors, sys.exit() in a script's main
+            ok = e.code in (0, None)
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            print(f"  -> Stage {stage.name} failed: {e}")
+            ok = False
+        return ok, time.perf_counter() - t0
+
+    def _record(self, stage, status, wall_s=0.0):
+        self.results.append({"step": stage.name, "target": stage.target, "status": status,
+                             "wall_s": round(wall_s, 3)})
+        print(f"  [{stage.name}] {status}" + (f" ({wall_s:.1f} s)" if wall_s else ""))
+
+    def run(self):
+        """Runs every stage that is not up to date; returns True if none failed."""
+        pending = dict(self.stages)
+        done, failed = set(), set()
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix="stage") as pool:
+            while pending or running:
+                exclusive_running = any(stage.exclusive for stage in running.values())
+                for name, stage in list(pending.items()):
+                    if not set(stage.after) <= done | failed:
+                        continue
+                    if set(stage.after) & failed:
+                        del pending[name]
+                        failed.add(name)
+                        self._record(stage, "blocked")
+                        continue
+                    if exclusive_running or len(running) >= self.jobs or (stage.exclusive and running):
+                        continue
+                    fingerprint = self.fingerprint(stage)
+                    del pending[name]
+                    if self.is_current(stage, fingerprint):
+                        done.add(name)
+                        self._record(stage, "up to date")
+                        continue
+                    print(f"\n[{stage.name}] Running {stage.target}...")
+                    running[pool.submit(self._execute, stage)] = stage
+                    exclusive_running = stage.exclusive
+                if not running:
+                    if pending and not any(set(s.after) <= done | failed for s in pending.values()):
+                        raise ValueError(f"Stage graph has a cycle: {sorted(pending)}")
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage = running.pop(future)
+                    ok, wall_s = future.result()
+                    if ok:
+                        done.add(stage.name)
+                        if not stage.always:
+                            # After the run: a stage may add to its own inputs (e.g. imputed months)
+                            self.state.mark("stages", stage.name, self.fingerprint(stage))
+                    else:
+                        failed.add(stage.name)
+                    self._record(stage, "ok" if ok else "error", wall_s)
+                    self.state.save()
+        self.state.save()
+        return not failed
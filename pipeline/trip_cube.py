@@ -0,0 +1,81 @@
+"""
+NYC Congestion Pricing Audit - Trip Aggregation Cube
+====================================================
+One pre-aggregation of the trips that every Phase 3/4 output is derived from,
+instead of each output re-scanning the raw Parquet files.
+
+Key (one row per distinct combination):
+
+| column         | notes                                             |
+|----------------|---------------------------------------------------|
+| source_year    | year directory of the source file (2024 / 2025)   |
+| pickup_date    | CAST(pickup_time AS DATE)                         |
+| dropoff_date   | CAST(dropoff_time AS DATE) (Q1 volume, border)    |
+| hour           | hour(pickup_time)                                 |
+| type           | 'yellow' / 'green'                                |
+| pickup_loc     | taxi zone                                         |
+| dropoff_loc    | taxi zone                                         |
+| VendorID       |                                                   |
+| surcharge_paid | congestion_surcharge > 0                          |
+
+Measures are counts, sums and sums of squares. Money is summed in integer
+cents so merging monthly cubes is exact in any order; squares, ratios and
+speeds are DOUBLE. `velocity_*` only covers trips passing the velocity
+heatmap's filters (more than 1 minute, over 0.1 mile, under 100 MPH), which
+are trip-level and cannot be applied after aggregation.
+"""
+
+CUBE_VIEW = "trip_cube"
+CUBE_Q1_VIEW = "trip_cube_q1"  # only the Q1 source months (Q1 volume, velocity, border)
+
+CUBE_KEY = [
+    "source_year", "pickup_date", "dropoff_date", "hour", "type",
+    "pickup_loc", "dropoff_loc", "VendorID", "surcharge_paid",
+]
+
+# Velocity heatmap trip filter (minutes floored at 1, as in the original query)
+VELOCITY_DURATION = "date_diff('minute', pickup_time, dropoff_time)"
+VELOCITY_SPEED = f"(trip_distance / (GREATEST({VELOCITY_DURATION}, 1) / 60.0))"
+VELOCITY_FILTER = f"{VELOCITY_DURATION} > 1 AND trip_distance > 0.1 AND {VELOCITY_SPEED} < 100"
+
+TIP_RATIO = "CASE WHEN fare > 0 THEN (total_amount - fare)/fare ELSE 0 END"
+
+
+def cents(column):
+    return f"CAST(ROUND({column} * 100) AS BIGINT)"
+
+
+def cube_query(source, source_year):
+    """SELECT building the cube rows for the trips in `source` (one source file)."""
+    return f"""
+    SELECT
+        CAST({int(source_year)} AS SMALLINT) as source_year,
+        CAST(pickup_time AS DATE) as pickup_date,
+        CAST(dropoff_time AS DATE) as dropoff_date,
+        CAST(hour(pickup_time) AS TINYINT) as hour,
+        type,
+        pickup_loc,
+        dropoff_loc,
+        VendorID,
+        COALESCE(congestion_surcharge > 0, false) as surcharge_paid,
+        COUNT(*) as trips,
+        CAST(SUM({cents('congestion_surcharge')}) AS BIGINT) as surcharge_cents,
+        CAST(SUM({cents('fare')}) AS BIGINT) as fare_cents,
+        CAST(SUM({cents('total_amount')}) AS BIGINT) as total_amount_cents,
+        SUM(CAST(fare AS DOUBLE) * fare) as fare_sq_sum,
+        SUM(trip_distance) as distance_sum,
+        SUM(CAST(trip_distance AS DOUBLE) * trip_distance) as distance_sq_sum,
+        COUNT({TIP_RATIO}) as tip_trips,
+        SUM({TIP_RATIO}) as tip_ratio_sum,
+        SUM(({TIP_RATIO}) * ({TIP_RATIO})) as tip_ratio_sq_sum,
+        COUNT(*) FILTER (WHERE {VELOCITY_FILTER}) as velocity_trips,
+        SUM({VELOCITY_SPEED}) FILTER (WHERE {VELOCITY_FILTER}) as speed_sum,
+        SUM({VELOCITY_SPEED} * {VELOCITY_SPEED}) FILTER (WHERE {VELOCITY_FILTER}) as speed_sq_sum
+    FROM {source}
+    GROUP BY ALL
+    """
+
+
+def create_cube_view(conn, files, name=CUBE_VIEW):
+    """View over the given per-month cube files (a SQL list literal)."""
+    conn.execute(f"CREATE OR REPLACE VIEW {name} AS SELECT * FROM read_parquet({files})")
@@ -0,0 +1,133 @@
+"""
+NYC Congestion Pricing Audit - Canonical Trip Schema
+====================================================
+One narrow, documented schema for every unified trip row, shared by the
+Polars unification step (WebScraping.py) and the DuckDB views (pipeline.py).
+
+| column               | Polars          | DuckDB     | bytes | notes                              |
+|----------------------|-----------------|------------|-------|------------------------------------|
+| VendorID             | UInt8           | UTINYINT   | 1     | TLC vendor codes are 1, 2, 6, 7     |
+| type                 | Enum            | ENUM       | ~0    | 'yellow' / 'green'; hive key on disk |
+| pickup_time          | Datetime('us')  | TIMESTAMP  | 8     | tpep_/lpep_ pickup, microseconds    |
+| dropoff_time         | Datetime('us')  | TIMESTAMP  | 8     |                                    |
+| pickup_loc           | Int16           | SMALLINT   | 2     | taxi zone 1..265                    |
+| dropoff_loc          | Int16           | SMALLINT   | 2     |                                    |
+| trip_distance        | Float32         | FLOAT      | 4     | miles                              |
+| fare                 | Float32         | FLOAT      | 4     | fare_amount, dollars               |
+| total_amount         | Float32         | FLOAT      | 4     | dollars                            |
+| congestion_surcharge | Float32         | FLOAT      | 4     | 0.0 when missing/null               |
+| is_imputed           | Boolean         | BOOLEAN    | 1     | true only for imputation.py's rows  |
+
+Float32 still resolves cents for amounts up to ~$160k, far above any single fare.
+`type` is not stored inside the unified files: it is the `type=` partition
+key and is materialized as an Enum when read. `is_imputed` is false for every
+TLC file; imputed months carry it as a real column, so an audit can drop them
+with `WHERE NOT is_imputed` (row groups are skipped on their min/max stats).
+"""
+
+TAXI_TYPES = ['yellow', 'green']
+DUCKDB_TAXI_TYPE = "ENUM(" + ", ".join(f"'{t}'" for t in TAXI_TYPES) + ")"
+IMPUTED_COLUMN = 'is_imputed'
+
+# Column -> (Polars dtype name, DuckDB type), in canonical order (excluding `type`).
+# Polars names are resolved lazily so DuckDB-only callers never import Polars.
+CANONICAL_SCHEMA = {
+    'VendorID': ('UInt8', 'UTINYINT'),
+    'pickup_time': ('Datetime', 'TIMESTAMP'),
+    'dropoff_time': ('Datetime', 'TIMESTAMP'),
+    'pickup_loc': ('Int16', 'SMALLINT'),
+    'dropoff_loc': ('Int16', 'SMALLINT'),
+    'trip_distance': ('Float32', 'FLOAT'),
+    'fare': ('Float32', 'FLOAT'),
+    'total_amount': ('Float32', 'FLOAT'),
+    'congestion_surcharge': ('Float32', 'FLOAT'),
+    IMPUTED_COLUMN: ('Boolean', 'BOOLEAN'),
+}
+
+# The wide schema used before the canonical one; kept for the legacy CSV
+# (WebScraping.py --legacy-csv) and the benchmarks.
+LEGACY_SCHEMA = {
+    'pickup_time': ('Datetime', 'TIMESTAMP'),
+    'dropoff_time': ('Datetime', 'TIMESTAMP'),
+    'pickup_loc': ('Int64', 'BIGINT'),
+    'dropoff_loc': ('Int64', 'BIGINT'),
+    'trip_distance': ('Float64', 'DOUBLE'),
+    'fare': ('Float64', 'DOUBLE'),
+    'total_amount': ('Float64', 'DOUBLE'),
+    'congestion_surcharge': ('Float64', 'DOUBLE'),
+}
+
+# Source (TLC) column names per taxi type -> canonical names.
+SOURCE_COLUMNS = {
+    'yellow': {
+        'tpep_pickup_datetime': 'pickup_time',
+        'tpep_dropoff_datetime': 'dropoff_time',
+        'PULocationID': 'pickup_loc',
+        'DOLocationID': 'dropoff_loc',
+        'fare_amount': 'fare',
+    },
+    'green': {
+        'lpep_pickup_datetime': 'pickup_time',
+        'lpep_dropoff_datetime': 'dropoff_time',
+        'PULocationID': 'pickup_loc',
+        'DOLocationID': 'dropoff_loc',
+        'fare_amount': 'fare',
+    },
+}
+
+
+def polars_dtype(name):
+    import polars as pl
+    # Datetimes are forced to microseconds to fix 'ns' vs 'us' mismatches across years.
+    return pl.Datetime('us') if name == 'Datetime' else getattr(pl, name)
+
+
+def polars_taxi_type():
+    import polars as pl
+    return pl.Enum(TAXI_TYPES)
+
+
+def polars_select(schema=None):
+    """Select-and-cast expressions for a renamed LazyFrame."""
+    import polars as pl
+    schema = schema or CANONICAL_SCHEMA
+    exprs = []
+    for name, (dtype, _) in schema.items():
+        col = pl.col(name)
+        if name == 'congestion_surcharge':
+            col = col.fill_null(0.0)
+        elif name == IMPUTED_COLUMN:
+            col = col.fill_null(False)
+        exprs.append(col.cast(polars_dtype(dtype)))
+    return exprs
+
+
+def duckdb_select(taxi_type, schema=None, available=None):
+    """
+    SELECT list mapping one taxi type's raw TLC columns onto the canonical
+    schema. Pass `available`, the column names of what is read (one file, or
+    a `union_by_name` glob), e.g.
+
+        cols = {row[0] for row in conn.execute(f"DESCRIBE SELECT * FROM read_parquet('{path}')").fetchall()}
+        conn.execute(f"SELECT {duckdb_select('yellow', available=cols)} FROM read_parquet('{path}')")
+
+    Canonical columns the source lacks are then read as NULL. Without it,
+    every column must exist; is_imputed is absent from every TLC file and
+    older months lack congestion_surcharge, so the bare form only serves as
+    SQL text (e.g. in logic fingerprints), not as a query over TLC files.
+    """
+    schema = schema or CANONICAL_SCHEMA
+    source = {v: k for k, v in SOURCE_COLUMNS[taxi_type].items()}
+    cols = []
+    for name, (_, sql_type) in schema.items():
+        src = source.get(name, name)
+        if available is not None and src not in available:
+            src = "NULL"
+        if name == 'congestion_surcharge':
+            src = f"COALESCE({src}, 0)"
+        elif name == IMPUTED_COLUMN:
+            src = f"COALESCE({src}, false)"
+        cols.append(f"CAST({src} AS {sql_type}) as {name}")
+    # `type` goes right after VendorID, as in the original view.
+    cols.insert(1 if 'VendorID' in schema else 0, f"'{taxi_type}'::{DUCKDB_TAXI_TYPE} as type")
+    return ",\n        ".join(cols)
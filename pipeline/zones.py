@@ -0,0 +1,84 @@
+"""
+NYC Congestion Pricing Audit - Taxi Zone Dimension
+==================================================
+`zones` table built once per connection from the TLC taxi_zone_lookup.csv:
+
+| column       | type     | notes                                        |
+|--------------|----------|----------------------------------------------|
+| location_id  | SMALLINT | primary key, 1..265                          |
+| borough      | VARCHAR  |                                              |
+| zone         | VARCHAR  |                                              |
+| service_zone | VARCHAR  | 'Yellow Zone', 'Boro Zone', 'Airports', ...  |
+| in_cbd       | BOOLEAN  | inside the Congestion Relief Zone            |
+
+Membership tests use the `in_cbd(loc)` macro, a probe into a constant
+266-slot boolean list indexed by location id, instead of splicing the zone id
+list into every query as an IN (...) literal. Like `loc IN (...)`, it is NULL
+for a NULL location so NOT in_cbd(...) filters keep their meaning. Outputs
+that need zone names LEFT JOIN `zones` on location_id.
+"""
+
+from pathlib import Path
+
+ZONE_LOOKUP_NAME = "taxi_zone_lookup.csv"
+ZONE_SLOTS = 266  # TLC location ids run 1..265; slot 0 is unused
+
+# Congestion Zone: Manhattan South of 60th St
+CONGESTION_ZONE_IDS = (
+    4, 12, 13, 24, 41, 42, 43, 45, 48, 50, 68, 74, 75, 87, 88, 90, 100, 103,
+    104, 105, 107, 113, 114, 116, 120, 125, 127, 128, 137, 140, 142, 143, 144,
+    148, 151, 152, 153, 158, 161, 162, 163, 164, 166, 170, 186, 194, 202, 209,
+    211, 212, 213, 214, 216, 217, 224, 229, 230, 231, 232, 233, 234, 235, 236,
+    237, 238, 239, 240, 241, 242, 243, 244, 245, 246, 249, 250
+)
+
+
+def cbd_slots(cbd_ids=CONGESTION_ZONE_IDS):
+    """DuckDB list literal: slot i is true when location id i is in the zone."""
+    members = set(cbd_ids)
+    return "[" + ", ".join("true" if i in members else "false" for i in range(ZONE_SLOTS)) + "]"
+
+
+def load_zones(conn, lookup_csv, cbd_ids=CONGESTION_ZONE_IDS):
+    """
+    Creates the `zones` temp table and the `in_cbd` macro on `conn`. Without
+    the lookup CSV the table still lists every location id (names NULL).
+    """
+    conn.execute(f"""
+    CREATE OR REPLACE TEMP MACRO in_cbd(loc) AS
+        CASE
+            WHEN loc BETWEEN 0 AND {ZONE_SLOTS - 1} THEN ({cbd_slots(cbd_ids)})[loc + 1]
+            WHEN loc IS NOT NULL THEN false
+        END
+    """)
+
+    lookup_csv = Path(lookup_csv)
+    if lookup_csv.exists():
+        source = f"""
+        SELECT
+            CAST(LocationID AS SMALLINT) as location_id,
+            Borough as borough,
+            Zone as zone,
+            service_zone
+        FROM read_csv('{lookup_csv.as_posix()}', header=true, all_varchar=true)
+        """
+    else:
+        print(f"  -> WARNING: {lookup_csv.name} not found; zone names will be empty.")
+        source = f"""
+        SELECT
+            CAST(i AS SMALLINT) as location_id,
+            NULL::VARCHAR as borough,
+            NULL::VARCHAR as zone,
+            NULL::VARCHAR as service_zone
+        FROM range(1, {ZONE_SLOTS}) t(i)
+        """
+    conn.execute("""
+    CREATE OR REPLACE TEMP TABLE zones (
+        location_id SMALLINT PRIMARY KEY,
+        borough VARCHAR,
+        zone VARCHAR,
+        service_zone VARCHAR,
+        in_cbd BOOLEAN
+    )
+    """)
+    conn.execute(f"INSERT INTO zones SELECT *, in_cbd(location_id) FROM ({source})")